@@ -0,0 +1,139 @@
+"""Module for restricting the cli commands to the packages affected by a range of commits.
+
+Every changed path is owned by the package whose build file (pyproject.toml, package.json, Cargo.toml, Dockerfile)
+lives in its nearest parent directory, so only the packages that own a changed path need a new version or a build.
+
+Usage:
+```
+from vega.packaging import affected
+
+changed = affected.changed_paths("origin/main..HEAD", "/path/to/repo")
+paths = affected.filter_paths(io.yield_paths("/path/to/repo", max_depth=None), changed)
+```
+"""
+import logging
+import os
+import subprocess
+
+from vega.packaging import factory
+from vega.packaging import queries
+
+logger = logging.getLogger(__name__)
+
+
+class PathTrie:
+    """Prefix tree of directories that finds the deepest stored directory containing a path."""
+
+    def __init__(self):
+        """Constructor"""
+        self.__root = {}
+        self.__value = object()
+
+    @staticmethod
+    def split(path: str) -> list[str]:
+        """Splits an absolute path into the names of its directories."""
+        return [part for part in os.path.abspath(path).split(os.path.sep) if part]
+
+    def insert(self, directory: str, value=None):
+        """Stores a value for the directory, the directory itself is stored when no value is given."""
+        node = self.__root
+        for part in self.split(directory):
+            node = node.setdefault(part, {})
+        node[self.__value] = directory if value is None else value
+
+    def nearest(self, path: str):
+        """Gets the value of the deepest stored directory that contains the path or is the path itself.
+
+        Returns:
+            The stored value or None if no stored directory contains the path.
+        """
+        node = self.__root
+        nearest = node.get(self.__value)
+        for part in self.split(path):
+            node = node.get(part)
+            if node is None:
+                break
+            nearest = node.get(self.__value, nearest)
+        return nearest
+
+
+def changed_paths(rev_range: str, directory: str) -> list[str]:
+    """Gets the absolute paths of the files changed in a range of commits, with symbolic links resolved.
+
+    Renames are reported as a deletion and an addition so that moving a file between packages affects both.
+
+    Args:
+        rev_range: commits to compare in a format git diff understands, e.g. HEAD~1..HEAD or origin/main...HEAD
+        directory: directory inside of the git repository.
+
+    Returns:
+        list[str]
+    """
+    toplevel = queries.run(["git", "rev-parse", "--show-toplevel"], cwd=directory)
+    if toplevel.returncode != 0:
+        raise RuntimeError(f"{directory} is not inside of a git repository: {toplevel.stderr.strip()}")
+    root = os.path.realpath(toplevel.stdout.strip())
+
+    result = subprocess.run(["git", "diff", "--name-only", "--no-renames", "-z", rev_range],
+                            cwd=directory, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to diff {rev_range}: {result.stderr.decode(errors='replace').strip()}")
+    return [os.path.join(root, *path.split("/")) for path in os.fsdecode(result.stdout).split("\0") if path]
+
+
+def resolve_directories(paths: list[str]) -> list[str]:
+    """Resolves the symbolic links of the directories of the paths the way git does, once per directory.
+
+    The files themselves are kept as they are since git reports a symbolic link by its own path.
+    """
+    directories = {}
+    resolved = []
+    for path in paths:
+        if not path:
+            resolved.append(path)
+            continue
+        directory, name = os.path.split(os.path.abspath(path))
+        if directory not in directories:
+            directories[directory] = os.path.realpath(directory)
+        resolved.append(os.path.join(directories[directory], name))
+    return resolved
+
+
+def filter_paths(paths, changed: list[str]) -> list[str]:
+    """Keeps the paths of the packages that own at least one of the changed paths.
+
+    Build files are kept when a changed path is nearer to their directory than to any other build file. Other files,
+    like changelogs, are kept when the package that owns them is affected, and files outside of every package are kept
+    as long as something is affected.
+
+    Args:
+        paths: paths of the files found by the cli commands.
+        changed: absolute paths of the changed files. Both sides are compared with their symbolic links resolved.
+
+    Returns:
+        list[str]
+    """
+    paths = list(paths)
+    # Symbolic links are resolved once here so the lookups in the trie stay string operations
+    resolved = resolve_directories(paths)
+    trie = PathTrie()
+    owned = []
+    for path, resolved_path in zip(paths, resolved):
+        parser_cls = factory.get_parser_cls_by_filename(os.path.basename(path)) if path else None
+        if parser_cls and parser_cls.IS_BUILD_FILE:
+            trie.insert(os.path.dirname(resolved_path))
+            owned.append(path)
+
+    if not owned:
+        return paths
+
+    affected = {trie.nearest(path) for path in resolve_directories(changed)} - {None}
+    logger.debug(f"Affected packages: {sorted(affected)}")
+    filtered = []
+    for path, resolved_path in zip(paths, resolved):
+        if not path:
+            continue
+        owner = trie.nearest(os.path.dirname(resolved_path))
+        if owner in affected or (owner is None and affected):
+            filtered.append(path)
+    return filtered
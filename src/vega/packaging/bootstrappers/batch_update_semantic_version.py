@@ -0,0 +1,172 @@
+"""Python script for updating the semantic version of many repositories at once.
+
+Jobs are read from a newline delimited json file, one job per line:
+```
+{"id": "api", "directory": "/repos/api", "subject": "#patch #updated bumped dependencies"}
+{"id": "web", "directory": "/repos/web", "subject": "#minor #added dark mode", "options": {"recursive": true}}
+```
+Options are the long names of the update_semantic_version arguments. Every job runs in a bounded process pool and
+its result is written as a line of json as soon as it finishes.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+from vega.packaging import log
+from vega.packaging.bootstrappers import update_semantic_version
+
+logger = log.get(__name__)
+
+
+def parse_args():
+    """Parses the arguments passed to this module"""
+    parser = argparse.ArgumentParser(
+        prog='Batch Update Semantic Version',
+        description='Updates the semantic version of many directories based on a file of jobs',
+    )
+    parser.add_argument("-j", "--jobs", help="newline delimited json file of jobs, - reads from stdin", required=True)
+    parser.add_argument("-o", "--output", help="file to write the newline delimited json results to, defaults to stdout")
+    parser.add_argument("-w", "--max_workers", help="number of jobs to run at the same time", type=int)
+    parser.add_argument("-v", "--verbose", help="print out debug statements",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-l", "--log_to_disk", help="saves out logs to disk",
+                        action=argparse.BooleanOptionalAction)
+    return parser.parse_args()
+
+
+def get_argv(job: dict) -> list[str]:
+    """Converts a job to the arguments of the update_semantic_version cli command.
+
+    Args:
+        job: dict with the directory, subject and optional description and options of the job.
+
+    Returns:
+        list[str]
+    """
+    argv = ["--directory", job["directory"], "--subject", job.get("subject") or job["message"]]
+    if job.get("description"):
+        argv.extend(["--description", job["description"]])
+    for name, value in (job.get("options") or {}).items():
+        if value is True:
+            argv.append(f"--{name}")
+        elif value is False:
+            argv.append(f"--no-{name}")
+        elif isinstance(value, list):
+            argv.extend([f"--{name}", *map(str, value)])
+        elif value is not None:
+            argv.extend([f"--{name}", str(value)])
+    return argv
+
+
+def run_job(job: dict) -> dict:
+    """Runs a single job, this is called from the processes of the pool.
+
+    Returns:
+        dict with the outcome and timing of the job.
+    """
+    start = time.perf_counter()
+    result = {"id": job.get("id"), "directory": job.get("directory")}
+    try:
+        args = update_semantic_version.parse_args(get_argv(job))
+        result["updated"] = update_semantic_version.run(args)
+        result["status"] = "success"
+    except SystemExit as error:
+        result.update(status="failed", error=f"Invalid options, exited with {error.code}")
+    except Exception as error:
+        result.update(status="failed", error=f"{type(error).__name__}: {error}")
+    result["duration"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def read_jobs(lines):
+    """Yields the jobs of a newline delimited json file, numbering the jobs that don't have an id.
+
+    Lines that aren't a json object are yielded as a job with the error that makes them fail, so the other jobs still
+    run.
+    """
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError(f"Expected a json object, got {type(job).__name__}")
+        except ValueError as error:
+            logger.error(f"Invalid job on line {index + 1}: {error}")
+            yield {"id": index, "error": f"{type(error).__name__}: {error}"}
+            continue
+        job.setdefault("id", index)
+        yield job
+
+
+def run_jobs(jobs, output, max_workers: int | None = None) -> list[dict]:
+    """Runs the jobs in a process pool and streams their results as they finish.
+
+    At most twice as many jobs as there are workers are queued at a time, so job files are read as the pool drains.
+
+    Args:
+        jobs: iterable of job dicts.
+        output: writable text stream for the newline delimited json results.
+        max_workers: number of processes to run the jobs in. Defaults to the number of processors.
+
+    Returns:
+        list[dict]: results of every job in the order they finished.
+    """
+    results = []
+    jobs = iter(jobs)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    def write_result(result: dict):
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        results.append(result)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        limit = max_workers * 2
+        pending = set()
+        while True:
+            for job in jobs:
+                if job.get("error"):
+                    # Jobs that couldn't be read fail without running
+                    write_result({"id": job.get("id"), "directory": None, "status": "failed", "error": job["error"],
+                                  "duration": 0})
+                    continue
+                pending.add(executor.submit(run_job, job))
+                if len(pending) >= limit:
+                    break
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                write_result(future.result())
+    return results
+
+
+def main():
+    """Main function to call in this bootstrapper"""
+    args = parse_args()
+
+    log.setup("batch_update_semantic_version", verbose=args.verbose, write_to_disk=args.log_to_disk)
+
+    start = time.perf_counter()
+    jobs_handle = sys.stdin if args.jobs == "-" else open(args.jobs, "r", encoding="utf-8")
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        results = run_jobs(read_jobs(jobs_handle), output, max_workers=args.max_workers)
+    finally:
+        if jobs_handle is not sys.stdin:
+            jobs_handle.close()
+        if output is not sys.stdout:
+            output.close()
+
+    failed = [result for result in results if result["status"] != "success"]
+    logger.info(f"Ran {len(results)} jobs in {time.perf_counter() - start:.2f} seconds, {len(failed)} failed")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,25 @@ This supports any file that has had a parser made for it.
 """
 import os
 import argparse
+import functools
 
+from vega.packaging import affected
 from vega.packaging import const
+from vega.packaging import decorators
 from vega.packaging import factory
+from vega.packaging import graph
 from vega.packaging import io
 from vega.packaging import log
 from vega.packaging import platforms
+from vega.packaging import queries
+from vega.packaging import scheduler
 from vega.packaging.parsers.changelog import Changelog
 
 logger = log.get(__name__)
 
+# Docker builds already use every core of the machine
+DEFAULT_JOB_LIMITS = {const.BuildTypes.DOCKER: 1}
+
 
 def parse_args():
     """Parse command-line arguments for the build and publish script.
@@ -29,17 +38,30 @@ def parse_args():
         description='Builds and publishes the packages to their respective repositories',
     )
     parser.add_argument("-d", "--directory", help="directory to look for files to update", default=os.getcwd())
+    parser.add_argument("-md", "--max_depth", help="levels of subdirectories to look for files in", type=int, default=0)
+    parser.add_argument("-rc", "--recursive", help="look for files in every subdirectory that isn't pruned or gitignored",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-wt", "--walk_threads", help="number of threads to look for files in subdirectories with", type=int)
+    parser.add_argument("-ds", "--discovery", help="look for files by walking the directory or in the files tracked by git",
+                        choices=io.DISCOVERY_BACKENDS, default="filesystem")
+    parser.add_argument("-af", "--affected", help="only process the packages changed in this git revision range, e.g. origin/main...HEAD")
     parser.add_argument("-p", "--pypi_registry", help="registry to publish python package to")
     parser.add_argument("-n", "--npm_registry", help="registry to publish npm packages to")
     parser.add_argument("-r", "--docker_registry", help="registry to publish docker images to")
     parser.add_argument("-c", "--cargo_registry", help="named crates.io registry (optional)")
     parser.add_argument("-pp", "--pyproject_path", help="path to the pyproject.toml file")
+    parser.add_argument("-dt", "--docker_tags", help="alias tags to push with docker images besides the semantic version",
+                        nargs="+", choices=["latest", "major", "minor"])
+    parser.add_argument("-pf", "--promote_from", help="registry to copy already published docker images from instead of rebuilding them")
     parser.add_argument("-pb", "--publish", help="publish packages to their registries",
                         action=argparse.BooleanOptionalAction)
     parser.add_argument("-rl", "--release", help="create a release on the given platform; omit to skip, pass without a value to default to github, or pass a provider name (e.g. --release gitlab)",
                         nargs="?", const="github", default=None)
     parser.add_argument("-co", "--compile_only", help="build cross-platform release artifacts without creating a release",
                         action=argparse.BooleanOptionalAction)
+    parser.add_argument("-j", "--jobs", help="number of packages to build and publish at the same time", type=int, default=4)
+    parser.add_argument("-jl", "--job_limits", help="number of packages of a build type to work on at the same time, e.g. docker=1 python=4",
+                        nargs="+", type=parse_job_limit)
     parser.add_argument("-v", "--verbose", help="print out debug statements",
                         action=argparse.BooleanOptionalAction)
     parser.add_argument("-l", "--log_to_disk", help="saves out logs to disk",
@@ -47,6 +69,7 @@ def parse_args():
     return parser.parse_args()
 
 
+@decorators.session
 def build_and_publish(
     paths: list[str],
     repositories: dict | None = None,
@@ -54,6 +77,11 @@ def build_and_publish(
     release: bool = False,
     release_provider: str = "github",
     compile_only: bool = False,
+    promote_from: str | None = None,
+    docker_tags: list[str] | None = None,
+    max_workers: int = 4,
+    job_limits: dict | None = None,
+    publish_queue: int | None = None,
 ) -> bool:
     """Build and optionally publish or release packages.
 
@@ -72,6 +100,13 @@ def build_and_publish(
         release: Whether to create a release on the release provider.
         release_provider: Name of the release provider (e.g., "github", "gitlab").
         compile_only: Whether to build release artifacts without creating a release.
+        promote_from: Registry to copy Docker images from, e.g. a staging registry. Docker images are promoted
+            through the registry API instead of being rebuilt and pushed.
+        docker_tags: Alias tags to apply to Docker images besides the semantic version ("latest", "major", "minor").
+        max_workers: Number of packages to build, publish or compile at the same time.
+        job_limits: Number of packages of each BuildTypes to work on at the same time. Defaults to DEFAULT_JOB_LIMITS.
+        publish_queue: Number of packages that can be built or building while waiting to be published.
+            Defaults to max_workers.
 
     Returns:
         True if any operation was performed, False if no action was requested
@@ -91,30 +126,50 @@ def build_and_publish(
         if registry is None and file_parser.BUILD_TYPE != const.BuildTypes.RUST:
             continue
         file_parser.registry = registry
+        if docker_tags and file_parser.BUILD_TYPE == const.BuildTypes.DOCKER:
+            file_parser.tag_policy = docker_tags
         packaging_files.append(file_parser)
 
     packaging_files.sort(key=lambda file_parser: file_parser.PRIORITY)
+    # Packages are scheduled after the local packages they depend on, every package of a level can run in parallel
+    packages = graph.PackageGraph(packaging_files)
+    scheduled = [file_parser for level in packages.levels() for file_parser in level]
 
+    jobs = scheduler.Scheduler(max_workers=max_workers,
+                               limits=DEFAULT_JOB_LIMITS if job_limits is None else job_limits,
+                               queues={"publish": publish_queue or max_workers})
     if compile_only:
-        for file_parser in packaging_files:
+        compiles = {}
+        for file_parser in scheduled:
             if file_parser.RELEASE_PATH is not None:
-                logger.info(f"Compiling release artifacts for {file_parser.path}")
-                file_parser.release()
+                compiles[file_parser] = jobs.add(
+                    f"compile {file_parser.path}", file_parser.release, resource=file_parser.BUILD_TYPE,
+                    dependencies=get_task_names(compiles, packages.dependencies(file_parser))).name
+        run_jobs(jobs)
         return True
 
-    for file_parser in packaging_files:
-        logger.info(f"Building {file_parser.path}")
-        file_parser.build()
-
-    if publish:
-        for file_parser in packaging_files:
-            logger.info(f"Publishing {file_parser.path}")
-            file_parser.publish()
+    builds, publishes = {}, {}
+    for file_parser in scheduled:
+        if promote_from and file_parser.BUILD_TYPE == const.BuildTypes.DOCKER:
+            jobs.add(f"promote {file_parser.path}", functools.partial(file_parser.promote, promote_from),
+                     resource=file_parser.BUILD_TYPE)
+            continue
+        dependencies = packages.dependencies(file_parser)
+        # Each package moves on to its publish as soon as it's built, builds wait while the publish queue is full
+        builds[file_parser] = jobs.add(f"build {file_parser.path}", file_parser.build, resource=file_parser.BUILD_TYPE,
+                                       dependencies=get_task_names(builds, dependencies),
+                                       produces="publish" if publish else None).name
+        if publish:
+            # Packages are published after the local packages they depend on so their dependencies can be installed.
+            # Publishes have their own resource so uploads overlap with the next build of the same type
+            publishes[file_parser] = jobs.add(
+                f"publish {file_parser.path}", file_parser.publish,
+                dependencies=[builds[file_parser], *get_task_names(publishes, dependencies)],
+                resource=("publish", file_parser.BUILD_TYPE), consumes="publish").name
 
     if release:
         cwd = os.path.dirname(packaging_files[0].path) if packaging_files else os.getcwd()
         release_platform = platforms.get(release_provider, cwd)
-        since = release_platform.last_release
 
         changelog = None
         for path in paths:
@@ -123,23 +178,55 @@ def build_and_publish(
                 changelog = file_parser
                 break
 
-        notes = changelog.changes(since=since) if changelog else ""
-        version = str(packaging_files[0].version) if packaging_files else (str(changelog.version) if changelog else "")
+        def get_release_notes() -> str:
+            since = release_platform.last_release
+            return changelog.changes(since=since) if changelog else ""
 
-        release_files = []
-        for file_parser in packaging_files:
-            if file_parser.RELEASE_PATH is not None:
-                release_dir = os.path.join(os.path.dirname(file_parser.path), file_parser.RELEASE_PATH)
-                if os.path.isdir(release_dir):
-                    for dirpath, _, filenames in os.walk(release_dir):
-                        for filename in filenames:
-                            release_files.append(os.path.join(dirpath, filename))
+        def create_release():
+            version = str(packaging_files[0].version) if packaging_files else (str(changelog.version) if changelog else "")
+
+            release_files = []
+            for file_parser in packaging_files:
+                if file_parser.RELEASE_PATH is not None:
+                    release_dir = os.path.join(os.path.dirname(file_parser.path), file_parser.RELEASE_PATH)
+                    if os.path.isdir(release_dir):
+                        for dirpath, _, filenames in os.walk(release_dir):
+                            for filename in filenames:
+                                release_files.append(os.path.join(dirpath, filename))
+
+            release_platform.create(version, notes.result, files=release_files or None)
+
+        # The notes are gathered while the packages build, the release waits for every package to be published
+        notes = jobs.add("release notes", get_release_notes)
+        jobs.add("release", create_release, dependencies=[task.name for task in jobs.tasks])
 
-        release_platform.create(version, notes, files=release_files or None)
+    run_jobs(jobs)
 
     return True
 
 
+def get_task_names(tasks: dict, parsers: list) -> list[str]:
+    """Names of the tasks already scheduled for the parsers, dependencies in a cycle aren't scheduled yet."""
+    return [tasks[file_parser] for file_parser in parsers if file_parser in tasks]
+
+
+def run_jobs(jobs: scheduler.Scheduler):
+    """Runs the scheduled jobs, logging their summary and raising the error of the first job that failed."""
+    summary = jobs.run()
+    if summary.tasks:
+        logger.info(f"Summary:\n{summary}")
+    summary.raise_for_failures()
+
+
+def parse_job_limit(value: str) -> tuple:
+    """Parses a job limit in the build_type=count format, e.g. docker=1"""
+    build_type, _, count = value.partition("=")
+    try:
+        return const.BuildTypes(build_type.strip().lower()), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid job limit {value}, expected build_type=count e.g. docker=1")
+
+
 def main() -> None:
     """Execute the build and publish workflow from command-line arguments.
 
@@ -164,7 +251,13 @@ def main() -> None:
         repositories[const.BuildTypes.RUST] = args.cargo_registry
 
     explicit_paths = [args.pyproject_path]
-    filepath_generator = io.yield_paths(args.directory, explicit_paths)
+    filepath_generator = io.yield_paths(args.directory, explicit_paths,
+                                        max_depth=None if args.recursive else args.max_depth,
+                                        threads=args.walk_threads,
+                                        discovery=args.discovery)
+    if args.affected:
+        changed = affected.changed_paths(args.affected, args.directory)
+        filepath_generator = affected.filter_paths(filepath_generator, changed)
 
     build_and_publish(
         list(filepath_generator),
@@ -173,8 +266,14 @@ def main() -> None:
         release=args.release is not None,
         release_provider=args.release or "github",
         compile_only=args.compile_only or False,
+        promote_from=args.promote_from,
+        docker_tags=args.docker_tags,
+        max_workers=args.jobs,
+        job_limits={**DEFAULT_JOB_LIMITS, **dict(args.job_limits)} if args.job_limits else None,
     )
 
+    logger.info(f"External query cache: {queries.stats()}")
+
 
 if __name__ == "__main__":
     main()
@@ -4,18 +4,31 @@ This supports any file that has had a parser made for it.
 """
 import os
 import argparse
+import concurrent.futures
 
 from vega.packaging import commits
+from vega.packaging import decorators
+from vega.packaging import envfiles
 from vega.packaging import factory
 from vega.packaging import io
 from vega.packaging import log
+from vega.packaging import affected
 from vega.packaging import const
+from vega.packaging import graph
+from vega.packaging import propagation
+from vega.packaging import queries
+from vega.packaging import sessions
+from vega.packaging import transactions
 
 logger = log.get(__name__)
 
 
-def parse_args():
-    """Parses the arguments passed to this module"""
+def parse_args(argv: list[str] | None = None):
+    """Parses the arguments passed to this module
+
+    Args:
+        argv: arguments to parse. Defaults to the arguments of the process.
+    """
     parser = argparse.ArgumentParser(
         prog='Update Semantic Version',
         description='Updates the semantic version of the given files based on a commit message',
@@ -23,6 +36,20 @@ def parse_args():
     parser.add_argument("-s", "--subject", help="subject of the message to parse for the changelog", required=True)
     parser.add_argument("-m", "--description", help="description of the message to parse for the changelog")
     parser.add_argument("-d", "--directory", help="directory to look for files to update", default=os.getcwd())
+    parser.add_argument("-md", "--max_depth", help="levels of subdirectories to look for files in", type=int, default=0)
+    parser.add_argument("-rc", "--recursive", help="look for files in every subdirectory that isn't pruned or gitignored",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-wt", "--walk_threads", help="number of threads to look for files in subdirectories with", type=int)
+    parser.add_argument("-ds", "--discovery", help="look for files by walking the directory or in the files tracked by git",
+                        choices=io.DISCOVERY_BACKENDS, default="filesystem")
+    parser.add_argument("-pw", "--parse_workers", help="number of threads to parse the files found with", type=int)
+    parser.add_argument("-lf", "--large_file_size", help="parse the files of at least this many bytes in a pool of processes",
+                        type=int)
+    parser.add_argument("-af", "--affected", help="only process the packages changed in this git revision range, e.g. origin/main...HEAD")
+    parser.add_argument("-in", "--independent", help="version every package on its own instead of matching the first file",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-pg", "--propagate", help="bump the local packages that depend on the updated packages too",
+                        action=argparse.BooleanOptionalAction)
     parser.add_argument("-cp", "--changelog_path", help="path to the changelog markdown file to update")
     parser.add_argument("-pp", "--pyproject_path", help="path to the pyproject to update")
     parser.add_argument("-rp", "--react_package_path", help="path to the react package.json file to update")
@@ -35,32 +62,183 @@ def parse_args():
                         action=argparse.BooleanOptionalAction)
     parser.add_argument("-l", "--log_to_disk", help="saves out logs to disk",
                         action=argparse.BooleanOptionalAction)
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def parse_file(path: str):
+    """Parses a file from a process of the pool of get_parsers_dict, the content is sent back to the run."""
+    return factory.create_parser(path).read()
+
+
+def prefetch(file_parser):
+    """Parses a file ahead of time, errors are left to be raised once the content is needed."""
+    try:
+        file_parser.prefetch()
+    except Exception as error:
+        logger.debug(f"Failed to parse {file_parser.path} ahead of time: {error}")
+
+
+def get_parsers_dict(paths: list[str], get_parser=None, max_workers: int | None = None,
+                     large_file_size: int | None = None) -> dict:
+    """Gets the parsers of the paths and parses their files at the same time before they're updated.
+
+    Args:
+        paths: paths of the files to parse.
+        get_parser: callable that gets the parser of a path. Defaults to factory.get_parser_from_path
+        max_workers: number of threads to parse the files with.
+        large_file_size: files of at least this many bytes are parsed in a pool of processes instead of threads,
+            so parsing them doesn't hold up the other threads. None parses every file on threads.
 
+    Returns:
+        dict with the parsers ordered by their PRIORITY and the build files grouped by BUILD_TYPE
+    """
+    get_parser = get_parser or factory.get_parser_from_path
+
+    def load(path: str):
+        file_parser = get_parser(path)
+        if not file_parser or (not file_parser.exists and not file_parser.AUTOCREATE):
+            return None, False
+        large = (large_file_size is not None and file_parser.exists and
+                 os.path.getsize(file_parser.path) >= large_file_size)
+        if not large:
+            prefetch(file_parser)
+        return file_parser, large
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = list(executor.map(sessions.bind(load), paths))
+    large = [file_parser for file_parser, is_large in loaded if is_large]
+    if large:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(parse_file, file_parser.path): file_parser for file_parser in large}
+            for future, file_parser in futures.items():
+                try:
+                    file_parser.prefetch(future.result())
+                except Exception as error:
+                    logger.debug(f"Failed to parse {file_parser.path} ahead of time: {error}")
 
-def get_parsers_dict(paths: list[str]) -> dict:
     parsers_dict = {"builds":{},
                     "ordered": []}
-    
-    for path in paths:
-        file_parser = factory.get_parser_from_path(path)
-        if not file_parser or (not file_parser.exists and not file_parser.AUTOCREATE):
+    for file_parser, _ in loaded:
+        if file_parser is None:
             continue
         parsers_dict["ordered"].append(file_parser)
         if file_parser.BUILD_TYPE is not None:
             parsers_dict["builds"].setdefault(file_parser.BUILD_TYPE, []).append(file_parser)
 
-    # Sort by Priority
+    # Sort by Priority, the sort is stable so files of the same priority keep the order they were found in
     parsers_dict["ordered"].sort(key=lambda file_parser: file_parser.PRIORITY)
 
     return parsers_dict
 
-def update_semantic_version(message_str: str, paths: list[str] | None = None, match=True, parsers: dict=None):
+def get_units(parsers: list) -> tuple[list[list], list]:
+    """Groups the files into package units that are versioned on their own.
+
+    A unit is made of the build files with a version in a directory and the changelog next to them.
+
+    Args:
+        parsers: parsers of the files, in the order they get updated.
+
+    Returns:
+        tuple with the list of units and the list of the files that don't belong to any unit.
+    """
+    units = {}
+    for file_parser in parsers:
+        if file_parser.IS_BUILD_FILE and file_parser.HAS_VERSION:
+            units.setdefault(file_parser.directory, []).append(file_parser)
+    others = []
+    for file_parser in parsers:
+        if file_parser.NAME == "Changelog" and file_parser.directory in units:
+            units[file_parser.directory].append(file_parser)
+        elif file_parser not in units.get(file_parser.directory, []):
+            others.append(file_parser)
+    return list(units.values()), others
+
+
+def get_unit_names(unit: list) -> set[str]:
+    """Gets the names a unit can be scoped by in a commit message, the name of its packages and of its directory."""
+    names = {os.path.basename(unit[0].directory)}
+    for file_parser in unit:
+        if not file_parser.IS_BUILD_FILE:
+            continue
+        try:
+            names.add(file_parser.package)
+        except (KeyError, TypeError):
+            pass
+    return names
+
+
+def update_independent(commit_message: commits.CommitMessage, parsers: dict, max_workers: int | None = None):
+    """Updates every package unit on its own, with the bump of the hashtags scoped to it. See get_units
+
+    The units are updated at the same time, the files of a unit match the version of its first file. The files that
+    don't belong to a unit match the version of the first file found.
+
+    Args:
+        commit_message: the message to update the files with.
+        parsers: parsers of the files to update as returned by get_parsers_dict.
+        max_workers: number of units to update at the same time.
+    """
+    units, others = get_units(parsers["ordered"])
+    package_graph = parsers.get("graph")
+    updates = []
+    for unit in units:
+        unit_message = commit_message.scoped(get_unit_names(unit))
+        if unit_message.semantic_version_bump is None:
+            logger.debug(f"Skipping {unit[0].directory}, the message doesn't bump it")
+            continue
+        updates.append((unit, unit_message, get_start_version(unit[0])))
+
+    if package_graph is not None:
+        messages = {file_parser: unit_message for unit, unit_message, _ in updates
+                    for file_parser in unit if file_parser in package_graph}
+        propagated = propagation.apply(package_graph, commit_message, list(messages), messages=messages)
+        # The units bumped only because they depend on an updated package get their other files, like the
+        # changelog, updated with the same message and version as their build file
+        seeded = {id(unit) for unit, _, _ in updates}
+        for unit in units:
+            file_parser = next((file_parser for file_parser in unit if file_parser in propagated), None)
+            if file_parser is not None and id(unit) not in seeded:
+                updates.append((unit, propagated[file_parser][1], get_start_version(file_parser)))
+
+    def update_unit(unit: list, unit_message: commits.CommitMessage, semantic_version):
+        for file_parser in unit:
+            if package_graph is not None and file_parser in package_graph:
+                continue
+            file_parser.update(unit_message, semantic_version)
+            logger.info(f"Updated {file_parser.path} with revision number {file_parser.version}")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Consume the results so the errors of the units are raised
+        list(executor.map(sessions.bind(lambda update: update_unit(*update)), updates))
+
+    if commit_message.semantic_version_bump is None:
+        return
+    semantic_version = get_start_version(parsers["ordered"][0])
+    for file_parser in others:
+        if package_graph is not None and file_parser in package_graph:
+            continue
+        file_parser.update(commit_message, semantic_version)
+        logger.info(f"Updated {file_parser.path} with revision number {file_parser.version}")
+
+
+def get_start_version(file_parser) -> str:
+    """Gets the version of a file before it was updated."""
+    version_value = file_parser.version
+    return version_value.start_value() if hasattr(version_value, "start_value") else version_value
+
+
+def update_semantic_version(message_str: str, paths: list[str] | None = None, match=True, parsers: dict=None,
+                            independent=False, max_workers: int | None = None):
     """Updates the semantic version of the provided file paths, if they are supported, based on the contents of the message string.
 
     Args:
         message_str: string to be parsed to determine how to update the semantic version
         paths: list of files whose files should be updated.
+        match: bump every file from the version of the first file.
+        parsers: parsers of the files to update as returned by get_parsers_dict. When it has a package graph the
+            local packages that depend on the updated build files get a patch bump, see vega.packaging.propagation
+        independent: version every package unit on its own instead of matching the first file, see update_independent
+        max_workers: number of package units to update at the same time when they are independent.
     """
     # Parse commit message
     commit_message = commits.CommitMessage(message_str)
@@ -73,12 +251,22 @@ def update_semantic_version(message_str: str, paths: list[str] | None = None, ma
     if not parsers["ordered"]:
         return False
 
+    if independent:
+        update_independent(commit_message, parsers, max_workers=max_workers)
+        return True
+
     semantic_version = None
     if match:
-        version_value = parsers["ordered"][0].version
-        semantic_version = version_value.start_value() if hasattr(version_value, "start_value") else version_value
+        semantic_version = get_start_version(parsers["ordered"][0])
+
+    package_graph = parsers.get("graph")
+    if package_graph is not None:
+        seeds = [file_parser for file_parser in parsers["ordered"] if file_parser in package_graph]
+        propagation.apply(package_graph, commit_message, seeds, semantic_version)
 
     for packaging_file in parsers["ordered"]:
+        if package_graph is not None and packaging_file in package_graph:
+            continue
         packaging_file.update(commit_message, semantic_version)
         logger.info(f"Updated {packaging_file.path} with revision number {packaging_file.version}")
     return True
@@ -92,12 +280,46 @@ def main():
     # Setup logging
     log.setup("update_semantic_version", verbose=args.verbose, write_to_disk=args.log_to_disk)
 
+    run(args)
+
+
+@decorators.session
+def run(args, get_parser=None) -> bool:
+    """Updates the files found for the parsed cli arguments.
+
+    Args:
+        args: arguments parsed by parse_args.
+        get_parser: callable that gets the parser of a path. Defaults to factory.get_parser_from_path
+
+    Returns:
+        bool: True if the commit message wasn't ignored.
+    """
     # Add explicitly set paths in args
     explicit_paths = [args.pyproject_path, args.changelog_path, args.react_package_path, args.cargo_path, args.dockerfile_path]
     if args.github_env:
         explicit_paths.append(os.environ.get("GITHUB_ENV", None))
 
-    parsers_dict = get_parsers_dict(io.yield_paths(args.directory, explicit_paths))
+    filepath_generator = io.yield_paths(args.directory, explicit_paths,
+                                        max_depth=None if args.recursive else args.max_depth,
+                                        threads=args.walk_threads,
+                                        discovery=args.discovery)
+    package_graph = None
+    if args.propagate:
+        # The packages depending on the updated ones may not be affected themselves, so the graph is made from every
+        # file found and the updated files share its parsers
+        get_parser = get_parser or factory.get_parser_from_path
+        discovered = {path: get_parser(path) for path in filepath_generator}
+        package_graph = graph.PackageGraph([file_parser for file_parser in discovered.values()
+                                            if file_parser and file_parser.exists])
+        filepath_generator = list(discovered)
+        get_parser = discovered.get
+    if args.affected:
+        changed = affected.changed_paths(args.affected, args.directory)
+        filepath_generator = affected.filter_paths(filepath_generator, changed)
+    parsers_dict = get_parsers_dict(filepath_generator, get_parser=get_parser, max_workers=args.parse_workers,
+                                    large_file_size=args.large_file_size)
+    if package_graph is not None:
+        parsers_dict["graph"] = package_graph
     
     # Docker files are special in the sense that we need to track the tag on the repository to figure out 
     # the version of the latest image. It isn't stored in the dockerfile itself. 
@@ -113,17 +335,28 @@ def main():
                 file_parser.builds = build_types
                 break
 
+    messages = list(filter(None, [args.subject, args.description]))
+    if args.independent:
+        # A single message bumps every unit once, so every file is written once
+        messages = ["\n\n".join(messages)]
+
     ignored = True
-    for message in filter(None, [args.subject, args.description]):
-        logger.debug(f"Parsing commit message: {message}")
-        message_parsed = update_semantic_version(message, parsers=parsers_dict)
-        if message_parsed:
-            ignored = False
+    # Every file is written at once when the transaction exits, workflow command files are appended to once after
+    # every message is parsed
+    with transactions.transaction(), envfiles.batch():
+        for message in messages:
+            logger.debug(f"Parsing commit message: {message}")
+            message_parsed = update_semantic_version(message, parsers=parsers_dict, independent=args.independent)
+            if message_parsed:
+                ignored = False
 
     if ignored:
         message = "\n\n".join([args.subject, args.description])
         logger.warning(f"Ignoring Commit:\n\t{message}")
 
+    logger.info(f"External query cache: {queries.stats()}")
+    return not ignored
+
 
 if __name__ == "__main__":
     main()
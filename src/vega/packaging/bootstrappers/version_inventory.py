@@ -0,0 +1,76 @@
+"""Python script for listing the version of every packaging file of a tree and the files that disagree.
+
+This supports any file that has had a parser made for it.
+"""
+import argparse
+import os
+import sys
+
+from vega.packaging import decorators
+from vega.packaging import inventory
+from vega.packaging import io
+from vega.packaging import log
+
+logger = log.get(__name__)
+
+
+def parse_args(argv: list[str] | None = None):
+    """Parses the arguments passed to this module
+
+    Args:
+        argv: arguments to parse. Defaults to the arguments of the process.
+    """
+    parser = argparse.ArgumentParser(
+        prog='Version Inventory',
+        description='Lists the version of every packaging file and the package units whose files disagree',
+    )
+    parser.add_argument("-d", "--directory", help="directory to look for files in", default=os.getcwd())
+    parser.add_argument("-md", "--max_depth", help="levels of subdirectories to look for files in", type=int, default=0)
+    parser.add_argument("-rc", "--recursive", help="look for files in every subdirectory that isn't pruned or gitignored",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-wt", "--walk_threads", help="number of threads to look for files in subdirectories with", type=int)
+    parser.add_argument("-ds", "--discovery", help="look for files by walking the directory or in the files tracked by git",
+                        choices=io.DISCOVERY_BACKENDS, default="filesystem")
+    parser.add_argument("-w", "--max_workers", help="number of threads to read the versions with", type=int)
+    parser.add_argument("-f", "--format", help="output format", choices=["table", "json"], default="table")
+    parser.add_argument("-c", "--check", help="exit with 1 when the files of a package unit disagree",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-v", "--verbose", help="print out debug statements",
+                        action=argparse.BooleanOptionalAction)
+    parser.add_argument("-l", "--log_to_disk", help="saves out logs to disk",
+                        action=argparse.BooleanOptionalAction)
+    return parser.parse_args(argv)
+
+
+@decorators.session
+def run(args, output=None) -> int:
+    """Writes the inventory of the files found for the parsed cli arguments.
+
+    Args:
+        args: arguments parsed by parse_args.
+        output: file to write the inventory to. Defaults to stdout.
+
+    Returns:
+        int: exit code of the command.
+    """
+    output = output or sys.stdout
+    paths = io.yield_paths(args.directory, max_depth=None if args.recursive else args.max_depth,
+                           threads=args.walk_threads, discovery=args.discovery)
+    entries = inventory.collect(paths, max_workers=args.max_workers)
+    if args.format == "json":
+        output.write(inventory.to_json(entries) + "\n")
+    else:
+        color = hasattr(output, "isatty") and output.isatty()
+        output.write(inventory.format_table(entries, root=args.directory, color=color) + "\n")
+    return 1 if args.check and inventory.get_drift(entries) else 0
+
+
+def main():
+    """Main function to call in this bootstrapper"""
+    args = parse_args()
+    log.setup("version_inventory", verbose=args.verbose, write_to_disk=args.log_to_disk)
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
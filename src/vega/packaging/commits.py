@@ -2,6 +2,7 @@
 
 This module uses features of the enum module only available in python 3.12 and higher
 """
+import copy
 import logging
 import datetime
 import enum
@@ -13,7 +14,13 @@ logger = logging.getLogger(__name__)
 
 
 class CommitMessage:
-    """Parses a commit message from a version control system."""
+    """Parses a commit message from a version control system.
+
+    Hashtags can be scoped to the packages with the given name, e.g. "#patch #minor(api)" is a minor bump for the api
+    package and a patch bump for the other packages, see scoped.
+    """
+    # Hashtag scoped to a package, e.g. #minor(api) or #major(@acme/ui)
+    SCOPED_TAG_REGEX = re.compile(r"#(?P<tag>[a-z0-9]+)\((?P<scope>[^()\s]+)\)")
 
     def __init__(self, message: str, date: str = None, auto_parse: bool = True, default_bump: const.Versions = None):
         """Constructor
@@ -30,10 +37,12 @@ class CommitMessage:
         self._bump = default_bump
 
         self.semantic_version_bump = None
+        self.scoped_bumps = {}
         self.publish_tags = None
         self.publish = False
         self.release = False
         self.changes = {}
+        self.__unscoped_bump = None
 
         if auto_parse:
             self.parse()
@@ -65,17 +74,23 @@ class CommitMessage:
         key = None
 
         # Parse the message to determine the values to add to the changelog dict
-        message_sections = re.split("(#[a-z0-9]+)", self.__message)
+        message_sections = re.split(r"(#[a-z0-9]+(?:\([^()\s]+\))?)", self.__message)
         for message_section in message_sections:
 
             if message_section.startswith("#"):
                 key = None
-                tag = message_section[1:].upper()
+                scoped_tag = self.SCOPED_TAG_REGEX.fullmatch(message_section)
+                scope = scoped_tag.group("scope").lower() if scoped_tag else None
+                tag = scoped_tag.group("tag").upper() if scoped_tag else message_section[1:].upper()
                 tag_enum = (getattr(const.Versions, tag, None) or
                             getattr(const.Changes, tag.upper(), None) or
                             getattr(const.WorkflowTypes, tag.upper(), None))
 
-                if isinstance(tag_enum, const.Versions) and (self.semantic_version_bump is None or tag_enum.value < self.semantic_version_bump.value):
+                if isinstance(tag_enum, const.Versions) and scope:
+                    if scope not in self.scoped_bumps or tag_enum.value < self.scoped_bumps[scope].value:
+                        self.scoped_bumps[scope] = tag_enum
+
+                elif isinstance(tag_enum, const.Versions) and (self.semantic_version_bump is None or tag_enum.value < self.semantic_version_bump.value):
                     self.semantic_version_bump = tag_enum
 
                 elif isinstance(tag_enum, const.Changes):
@@ -92,10 +107,34 @@ class CommitMessage:
             if key is not None and message_section:
                 self.changes.setdefault(key, []).append(message_section.strip())
 
+        self.__unscoped_bump = self.semantic_version_bump
+        # Files that aren't versioned per package get the biggest bump of the message
+        for scoped_bump in self.scoped_bumps.values():
+            if self.semantic_version_bump is None or scoped_bump.value < self.semantic_version_bump.value:
+                self.semantic_version_bump = scoped_bump
+
         # Fall back to default bump if no version tag was found
         if self.semantic_version_bump is None:
             self.semantic_version_bump = self._bump
 
+    def scoped(self, names) -> "CommitMessage":
+        """Gets the message for a package, with the biggest bump of the hashtags without a scope and of the hashtags
+        scoped to any of the names of the package.
+
+        Args:
+            names: names the package can be scoped by, compared without case.
+
+        Returns:
+            CommitMessage whose semantic_version_bump is None when nothing bumps the package.
+        """
+        names = {name.lower() for name in names if name}
+        bumps = [bump for scope, bump in self.scoped_bumps.items() if scope in names]
+        if self.__unscoped_bump is not None:
+            bumps.append(self.__unscoped_bump)
+        message = copy.copy(self)
+        message.semantic_version_bump = min(bumps, key=lambda bump: bump.value) if bumps else self._bump
+        return message
+
     def markdown(self, semantic_version) -> str:
         """Converts the changelog dict into a markdown string that follows the Keep A Changelog Format."""
         # Add new header section for the latest updates
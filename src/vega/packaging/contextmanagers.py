@@ -1,5 +1,11 @@
 """Context managers for directory and path management."""
 import os
+import threading
+
+from vega.packaging import processes
+
+# The working directory is shared by every thread of the process
+_CHDIR_LOCK = threading.RLock()
 
 
 class WorkingDirectory:
@@ -7,6 +13,8 @@ class WorkingDirectory:
 
     Saves the current working directory on entry, changes to the target directory,
     and restores the original directory on exit (even if an exception occurs).
+    Threads wait for each other to leave the context since the working directory is process wide, prefer
+    ExecutionContext for code that can run concurrently.
 
     Example:
         >>> with WorkingDirectory("/path/to/project"):
@@ -27,10 +35,10 @@ class WorkingDirectory:
                 directory is used as the target. If False, path is treated as
                 the target directory directly. Defaults to True.
         """
-        self.__path = os.getcwd()
+        self.__path = None
         if is_file:
             path = os.path.dirname(path)
-        self.__target_path = path or self.__path
+        self.__target_path = path
 
     def __enter__(self) -> str:
         """Enter the context and change to the target directory.
@@ -38,7 +46,14 @@ class WorkingDirectory:
         Returns:
             The target directory path.
         """
-        os.chdir(self.__target_path)
+        _CHDIR_LOCK.acquire()
+        try:
+            self.__path = os.getcwd()
+            self.__target_path = self.__target_path or self.__path
+            os.chdir(self.__target_path)
+        except BaseException:
+            _CHDIR_LOCK.release()
+            raise
         return self.__target_path
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
@@ -52,5 +67,52 @@ class WorkingDirectory:
         Returns:
             False to propagate any exception, True to suppress it.
         """
-        os.chdir(self.__path)
-        return False
\ No newline at end of file
+        try:
+            os.chdir(self.__path)
+        finally:
+            _CHDIR_LOCK.release()
+        return False
+
+
+class ExecutionContext:
+    """Directory that commands run from and relative paths resolve against, without changing the process wide
+    working directory.
+
+    Unlike WorkingDirectory it's safe to use from several threads at the same time.
+
+    Example:
+        >>> context = ExecutionContext("/path/to/project/Cargo.toml", is_file=True)
+        >>> processes.run(context.command(["cargo", "package"]))
+        >>> os.listdir(context.resolve("target/package"))
+    """
+
+    def __init__(self, path: str, is_file: bool = True):
+        """Initialize the ExecutionContext.
+
+        Args:
+            path: The target directory path, or a file path if is_file=True.
+            is_file: If True, path is treated as a file path and the parent
+                directory is used as the target. Defaults to True.
+        """
+        if is_file:
+            path = os.path.dirname(path)
+        self.__cwd = os.path.abspath(path or os.getcwd())
+
+    @property
+    def cwd(self) -> str:
+        """Absolute path of the directory commands run from."""
+        return self.__cwd
+
+    def resolve(self, *parts: str) -> str:
+        """Resolves a path relative to the directory of this context, absolute paths are returned as they are."""
+        return os.path.normpath(os.path.join(self.__cwd, *parts))
+
+    def command(self, argv: list[str], **kwargs) -> processes.Command:
+        """Creates a command that runs from the directory of this context. See processes.Command"""
+        return processes.Command(argv, cwd=self.__cwd, **kwargs)
+
+    def __enter__(self) -> "ExecutionContext":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        return False
@@ -0,0 +1,218 @@
+"""Module for running update_semantic_version from a long lived process that keeps its state warm.
+
+The daemon keeps the parser registry imported and the parsed manifests and changelogs in the content cache of the
+sessions module, so they are reused until the files change on disk. Every request gets new parsers, so nothing set on
+a parser by one request, like its version or registry, leaks into the next one. Thin clients send their arguments, working
+directory and environment over a Unix socket as a line of json and get the output and exit code back the same way.
+When no daemon is running the client runs the normal cli command instead.
+
+Usage:
+```
+vega_packaging_daemon &
+update_semantic_version_client --subject "#patch #fixed good vibes"
+```
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+
+def get_socket_path() -> str:
+    """Path of the socket the daemon listens on, set with the PACKAGING_DAEMON_SOCKET environment variable."""
+    if os.environ.get("PACKAGING_DAEMON_SOCKET"):
+        return os.environ["PACKAGING_DAEMON_SOCKET"]
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(directory, f"vega-packaging-{user}.sock")
+
+
+def request(payload: dict, socket_path: str | None = None, timeout: float | None = None) -> dict | None:
+    """Sends a request to the daemon.
+
+    Args:
+        payload: json serializable request.
+        socket_path: path of the socket of the daemon. Defaults to get_socket_path()
+        timeout: seconds to wait for the response.
+
+    Returns:
+        dict with the response, or None if no daemon is listening so the caller can do the work itself.
+    """
+    socket_path = socket_path or get_socket_path()
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        # Stale socket of a daemon that isn't running anymore
+        connection.close()
+        return None
+
+    # Failures past this point aren't retried locally since the daemon may have already updated files
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(payload).encode("utf-8") + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        raise RuntimeError(f"The daemon at {socket_path} closed the connection without responding")
+    return json.loads(line)
+
+
+@contextlib.contextmanager
+def client_environment(cwd: str, env: dict):
+    """Runs the block from the directory and with the environment of the client."""
+    previous_cwd, previous_env = os.getcwd(), dict(os.environ)
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(previous_env)
+        os.chdir(previous_cwd)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """Handles the json line requests of a client connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as error:
+                logger.exception("Failed to handle request")
+                response = {"exit_code": 1, "output": f"{type(error).__name__}: {error}\n"}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """Unix socket server that runs the requests of its clients one at a time.
+
+    Requests change the working directory and the environment of the process, so they are never handled
+    concurrently.
+    """
+
+    def __init__(self, socket_path: str | None = None, idle_timeout: float | None = None):
+        """Constructor
+
+        Args:
+            socket_path: path of the socket to listen on. Defaults to get_socket_path()
+            idle_timeout: seconds without requests after which the server stops. Runs forever when None.
+        """
+        from vega.packaging import factory
+
+        self.socket_path = socket_path or get_socket_path()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        super().__init__(self.socket_path, DaemonHandler)
+        self.timeout = idle_timeout
+        self.running = False
+        # Importing every parser up front keeps the first request as fast as the following ones
+        factory.import_parsers()
+
+    def dispatch(self, payload: dict) -> dict:
+        """Runs a request and returns its response."""
+        command = payload.get("command", "update_semantic_version")
+        if command == "ping":
+            return {"exit_code": 0, "output": ""}
+        if command == "stats":
+            from vega.packaging import sessions
+            return {"exit_code": 0, "output": "", "contents": sessions.CONTENTS.stats()}
+        if command == "shutdown":
+            self.running = False
+            return {"exit_code": 0, "output": ""}
+        if command != "update_semantic_version":
+            return {"exit_code": 2, "output": f"Unknown command {command}\n"}
+        return self.update_semantic_version(payload.get("argv", []), payload.get("cwd") or os.getcwd(),
+                                            payload.get("env") or {})
+
+    def update_semantic_version(self, argv: list[str], cwd: str, env: dict) -> dict:
+        """Runs the update_semantic_version cli command with the arguments of a client."""
+        from vega.packaging import queries
+        from vega.packaging.bootstrappers import update_semantic_version
+
+        output = io.StringIO()
+        handler = logging.StreamHandler(output)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%m/%d/%Y %I:%M:%S %p"))
+        root_logger = logging.getLogger()
+        previous_level = root_logger.level
+        root_logger.addHandler(handler)
+        exit_code = 0
+        try:
+            with client_environment(cwd, env), contextlib.redirect_stdout(output), \
+                    contextlib.redirect_stderr(output):
+                # Queries like the last release are only valid for the duration of a run
+                queries.clear()
+                try:
+                    args = update_semantic_version.parse_args(argv)
+                except SystemExit as error:
+                    return {"exit_code": error.code or 0, "output": output.getvalue()}
+                root_logger.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+                update_semantic_version.run(args)
+        except Exception:
+            logging.getLogger(update_semantic_version.__name__).exception("update_semantic_version failed")
+            exit_code = 1
+        finally:
+            root_logger.removeHandler(handler)
+            root_logger.setLevel(previous_level)
+        return {"exit_code": exit_code, "output": output.getvalue()}
+
+    def handle_timeout(self):
+        logger.info(f"No requests for {self.timeout} seconds, stopping")
+        self.running = False
+
+    def serve(self):
+        """Handles requests until the server is shut down or idles for longer than its timeout."""
+        self.running = True
+        try:
+            while self.running:
+                self.handle_request()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def main():
+    """Starts the daemon"""
+    from vega.packaging import log
+
+    parser = argparse.ArgumentParser(
+        prog='Vega Packaging Daemon',
+        description='Keeps update_semantic_version warm for the clients of a Unix socket',
+    )
+    parser.add_argument("-s", "--socket", help="path of the socket to listen on", default=get_socket_path())
+    parser.add_argument("-it", "--idle_timeout", help="seconds without requests after which the daemon stops",
+                        type=float)
+    parser.add_argument("-v", "--verbose", help="print out debug statements",
+                        action=argparse.BooleanOptionalAction)
+    args = parser.parse_args()
+
+    log.setup("vega_packaging_daemon", verbose=args.verbose, write_to_disk=False)
+    server = DaemonServer(args.socket, idle_timeout=args.idle_timeout)
+    logger.info(f"Listening on {server.socket_path}")
+    server.serve()
+
+
+def client_main():
+    """Runs update_semantic_version through the daemon, or in this process if no daemon is running"""
+    response = request({"command": "update_semantic_version", "argv": sys.argv[1:], "cwd": os.getcwd(),
+                        "env": dict(os.environ)})
+    if response is None:
+        from vega.packaging.bootstrappers import update_semantic_version
+        update_semantic_version.main()
+        return
+    sys.stderr.write(response.get("output", ""))
+    sys.exit(response.get("exit_code", 0))
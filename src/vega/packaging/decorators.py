@@ -1,12 +1,27 @@
 """Decorators for packaging related operations."""
+import functools
+
+from vega.packaging import sessions
+from vega.packaging import transactions
 
 
 def autocreate(func):
-    """Decorator for auto creating a file if it doesn't exist """
+    """Decorator for auto creating a file if it doesn't exist, a file created in the active transaction exists"""
     def wrapper(instance, *args, **kwargs):
-        if not instance.exists and instance.AUTOCREATE:
+        if instance.exists or transactions.staged(instance.path):
+            pass
+        elif instance.AUTOCREATE:
             instance.create()
-        elif not instance.exists:
+        else:
             raise FileNotFoundError(f"{instance.path} not found on disk.")
         return func(instance, *args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def session(func):
+    """Decorator for running a function in its own sessions.Session, so each file gets a single parser"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with sessions.Session():
+            return func(*args, **kwargs)
+    return wrapper
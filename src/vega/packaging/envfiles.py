@@ -0,0 +1,136 @@
+"""Module for reading and writing GitHub workflow command files such as the GITHUB_ENV and GITHUB_OUTPUT files.
+
+These files are shared by every step of a workflow and only ever appended to, the last value set for a key wins.
+
+Usage:
+```
+from vega.packaging import envfiles
+
+with envfiles.batch():
+    envfiles.write(os.environ["GITHUB_ENV"], {"SEMANTIC_VERSION": "1.0.0"})
+    envfiles.write(os.environ["GITHUB_OUTPUT"], {"SEMANTIC_VERSION": "1.0.0"})
+# Both files are appended to once when the batch exits
+```
+"""
+import contextlib
+import os
+import threading
+import uuid
+
+from vega.packaging import transactions
+
+
+def read(path: str) -> dict:
+    """Reads the key value pairs of a workflow command file.
+
+    Supports both the KEY=value syntax and the multiline KEY<<DELIMITER syntax.
+
+    Args:
+        path: path to the file to read.
+
+    Returns:
+        dict
+    """
+    content = {}
+    with open(path, "r", encoding="utf-8") as handle:
+        lines = iter(handle.read().splitlines())
+    for line in lines:
+        if "=" in line and ("<<" not in line or line.index("=") < line.index("<<")):
+            # The first = is the separator for the key value pair
+            key, value = line.split("=", 1)
+            content[key.strip()] = value
+        elif "<<" in line:
+            key, delimiter = line.split("<<", 1)
+            value = []
+            for value_line in lines:
+                if value_line == delimiter:
+                    break
+                value.append(value_line)
+            content[key.strip()] = "\n".join(value)
+    return content
+
+
+def format_entry(key: str, value) -> str:
+    """Formats a key value pair, using the multiline syntax when the value spans several lines."""
+    value = str(value)
+    if "\n" not in value:
+        return f"{key}={value}\n"
+    delimiter = f"ghadelimiter_{uuid.uuid4()}"
+    return f"{key}<<{delimiter}\n{value}\n{delimiter}\n"
+
+
+class EnvFileWriter:
+    """Stages the values set on workflow command files and appends them to the files in a single flush."""
+
+    def __init__(self):
+        """Constructor"""
+        self.__pending = {}
+        self.__depth = 0
+        self.__lock = threading.RLock()
+
+    @property
+    def batching(self) -> bool:
+        """Are writes being held until the end of a batch"""
+        return self.__depth > 0
+
+    def update(self, path: str, values: dict):
+        """Stages values to append to the file at the given path."""
+        with self.__lock:
+            self.__pending.setdefault(path, {}).update(values)
+
+    def flush(self):
+        """Appends every staged value to its file with one write per file."""
+        with self.__lock:
+            pending, self.__pending = self.__pending, {}
+        for path, values in pending.items():
+            if not values:
+                continue
+            entries = "".join(format_entry(key, value) for key, value in values.items())
+            # Make sure the first entry doesn't get merged with a last line that is missing its line break
+            if os.path.exists(path) and os.path.getsize(path):
+                with open(path, "rb") as handle:
+                    handle.seek(-1, os.SEEK_END)
+                    if handle.read(1) != b"\n":
+                        entries = f"\n{entries}"
+            # Appends are part of the transaction of the run when there is one
+            transactions.append(path, entries)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Holds every write until the outermost batch exits."""
+        with self.__lock:
+            self.__depth += 1
+        try:
+            yield self
+        finally:
+            with self.__lock:
+                self.__depth -= 1
+                done = not self.__depth
+            if done:
+                self.flush()
+
+
+# Writer shared by the whole process
+WRITER = EnvFileWriter()
+
+
+def write(path: str, values: dict):
+    """Appends values to a workflow command file, or stages them if a batch is active.
+
+    Args:
+        path: path to the file, e.g. the value of the GITHUB_ENV environment variable.
+        values: key value pairs to set.
+    """
+    WRITER.update(path, values)
+    if not WRITER.batching:
+        WRITER.flush()
+
+
+def batch():
+    """Context manager that flushes every write made within it to disk at once."""
+    return WRITER.batch()
+
+
+def output_path() -> str | None:
+    """Path of the file that sets the outputs of the current workflow step, if running in a workflow."""
+    return os.environ.get("GITHUB_OUTPUT") or None
@@ -2,14 +2,23 @@
 """Module with logic to help implement factory pattern logic in a program"""
 # There was an issue using importlib.util but importing directly resolves the problem
 from importlib import util as importlib_util
+from importlib import metadata as importlib_metadata
+import importlib
+import json
+import logging
 import os
 import platform
+import re
 
 import sys
 import types
 import typing
 import functools
 
+from vega.packaging import sessions
+
+logger = logging.getLogger(__name__)
+
 
 # TODO: Add regex argument to help filter out additional modules for importing
 def resolve_import_name(path: str):
@@ -83,12 +92,10 @@ def import_modules_from_directory(path: str, depth=0):
     ```
     """
     modules = []
+    # os.walk already descends into the subdirectories so they must not be imported recursively as well
     for root, directories, files in os.walk(path):
-        for directory_path in directories:
-            import_path = os.path.join(root, directory_path)
-            modules.extend(import_modules_from_directory(import_path, depth=depth + 1))
-
-        for file_path in files:
+        directories[:] = sorted(directory for directory in directories if directory != "__pycache__")
+        for file_path in sorted(files):
             if not file_path.endswith(".py"):
                 continue
             import_path = os.path.join(root, file_path)
@@ -102,42 +109,314 @@ def get_subclasses(cls: object) -> typing.List[object]:
 
 
 # End of duplicate code from vega.core
+PARSERS_ENTRY_POINT_GROUP = "vega.packaging.parsers"
+PARSERS_MANIFEST = "parsers.json"
+
+
+class ParserEntry:
+    """Declares a parser class without importing it until a file that it parses is found."""
+
+    def __init__(self, name: str, pattern: str, module: str, attribute: str, flags: int = re.I):
+        """Constructor
+
+        Args:
+            name: name of the parser.
+            pattern: regex pattern matched against filenames, the same as the FILENAME_REGEX of the parser class.
+            module: import name of the module, or path to the python file, that defines the parser class.
+            attribute: name of the parser class in the module.
+            flags: regex flags for the pattern.
+        """
+        self.name = name
+        self.pattern = pattern
+        self.module = module
+        self.attribute = attribute
+        self.regex = re.compile(pattern, flags)
+        self.__cls = None
+
+    @classmethod
+    def from_cls(cls, parser_cls, module: str | None = None) -> "ParserEntry":
+        """Creates an entry for a parser class that is already imported.
+
+        Args:
+            parser_cls: the parser class.
+            module: import name or path of the module that defines the class. Defaults to the module of the class.
+        """
+        entry = cls(parser_cls.NAME or parser_cls.__name__, parser_cls.FILENAME_REGEX.pattern,
+                    module or parser_cls.__module__, parser_cls.__name__, parser_cls.FILENAME_REGEX.flags)
+        entry.__cls = parser_cls
+        return entry
+
+    def to_dict(self) -> dict:
+        """Serializes the declaration of the entry."""
+        return {"name": self.name, "pattern": self.pattern, "module": self.module, "class": self.attribute,
+                "flags": self.regex.flags}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ParserEntry":
+        """Creates an entry from its serialized declaration."""
+        return cls(data["name"], data["pattern"], data["module"], data["class"], data.get("flags", re.I))
+
+    def load(self):
+        """Imports the module of the parser and returns the parser class."""
+        if self.__cls is None:
+            if self.module.lower().endswith(".py"):
+                module = import_module_from_path(self.module)
+            else:
+                module = importlib.import_module(self.module)
+            self.__cls = getattr(module, self.attribute)
+            regex = getattr(self.__cls, "FILENAME_REGEX", None)
+            # Files are dispatched with the declared pattern, a parser whose regex changed stops receiving its files
+            if regex is not None and regex.pattern != self.pattern:
+                logger.warning(f"{self.name} is declared for {self.pattern!r} but {self.attribute}.FILENAME_REGEX is "
+                               f"{regex.pattern!r}, its declaration needs to be updated")
+        return self.__cls
+
+    def __repr__(self):
+        return f"ParserEntry({self.name!r}, {self.pattern!r}, {self.module!r}, {self.attribute!r})"
+
+
+# Parsers that ship with this package, they must match the FILENAME_REGEX of their classes.
+BUILTIN_PARSERS = [
+    ParserEntry("PyProject", "pyproject.toml", "vega.packaging.parsers.pyproject", "PyProject"),
+    ParserEntry("Cargo", "cargo.toml", "vega.packaging.parsers.cargo", "Cargo"),
+    ParserEntry("ReactPackage", "package.json", "vega.packaging.parsers.react_package", "ReactPackage"),
+    ParserEntry("DockerFile", "dockerfile", "vega.packaging.parsers.docker", "DockerFile"),
+    ParserEntry("Changelog", "CHANGELOG.md", "vega.packaging.parsers.changelog", "Changelog"),
+    ParserEntry("GitEnv", "set_env_[a-z0-9-]+", "vega.packaging.parsers.githubenv", "GitEnv"),
+]
+
+
+def get_plugin_directories() -> list[str]:
+    """Gets the directories set on the PACKAGING_FILE_PARSERS environment variable."""
+    if "PACKAGING_FILE_PARSERS" not in os.environ:
+        return []
+    # Windows uses ; separators for paths in their environment variables while Unix based OS uses :
+    separator = ";" if platform.system() == "Windows" else ":"
+    return [directory for directory in os.environ["PACKAGING_FILE_PARSERS"].split(separator) if directory]
+
+
+def get_entry_point_parsers() -> list[ParserEntry]:
+    """Gets the parsers declared by installed packages through the vega.packaging.parsers entry point group.
+
+    The name of each entry point is the filename pattern of the parser and its value the module:Class to load.
+    """
+    entries = []
+    for entry_point in importlib_metadata.entry_points(group=PARSERS_ENTRY_POINT_GROUP):
+        module, _, attribute = entry_point.value.partition(":")
+        entries.append(ParserEntry(attribute, entry_point.name, module.strip(), attribute.strip()))
+    return entries
+
+
+def get_discovery_cache_path() -> str | None:
+    """Gets the path to the on disk cache of the parsers discovered in plugin directories.
+
+    Defaults to vega-packaging/parsers.json in the user cache directory. It can be set with the
+    PACKAGING_PARSERS_CACHE environment variable, setting the variable to an empty value disables the cache.
+    """
+    if "PACKAGING_PARSERS_CACHE" in os.environ:
+        return os.environ["PACKAGING_PARSERS_CACHE"] or None
+    cache_directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_directory, "vega-packaging", "parsers.json")
+
+
+def read_discovery_cache(path: str) -> dict:
+    """Reads the discovery cache, an unreadable cache is treated as empty."""
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_discovery_valid(record: dict) -> bool:
+    """Checks if the directories and files of a discovery cache record are unchanged on disk.
+
+    Adding, removing or renaming a file changes the modification time of its directory, so only the recorded paths
+    need to be checked and the plugin tree doesn't have to be walked again.
+    """
+    try:
+        for path, mtime_ns in record["directories"].items():
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        for path, (mtime_ns, size) in record["files"].items():
+            stat = os.stat(path)
+            if stat.st_mtime_ns != mtime_ns or stat.st_size != size:
+                return False
+    except (OSError, KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def write_discovery_cache(path: str, directory: str, entries: list[ParserEntry]):
+    """Records the parsers of a plugin directory along with the stats of the files they were discovered from."""
+    record = {"directories": {}, "files": {}, "entries": [entry.to_dict() for entry in entries]}
+    for root, directories, files in os.walk(directory):
+        directories[:] = [each for each in directories if each != "__pycache__"]
+        record["directories"][root] = os.stat(root).st_mtime_ns
+        for filename in files:
+            stat = os.stat(os.path.join(root, filename))
+            record["files"][os.path.join(root, filename)] = [stat.st_mtime_ns, stat.st_size]
+
+    cache = read_discovery_cache(path)
+    cache[directory] = record
+    # The cache may be shared by several runners, replacing it atomically prevents others from reading partial data
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(cache, handle)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def get_directory_parsers(directory: str) -> list[ParserEntry]:
+    """Gets the parsers of a plugin directory.
+
+    Directories with a parsers.json manifest, a list of {"name", "pattern", "module", "class"} objects where module is
+    a path relative to the directory, are loaded lazily. Every python module of directories without a manifest is
+    imported to discover the parser classes they define, the classes found are recorded in the discovery cache so
+    unchanged directories are loaded lazily on the next runs.
+    """
+    manifest_path = os.path.join(directory, PARSERS_MANIFEST)
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as handle:
+            manifest = json.load(handle)
+        return [ParserEntry(entry.get("name", entry["class"]), entry["pattern"],
+                            os.path.join(directory, entry["module"]), entry["class"])
+                for entry in manifest]
+
+    directory = os.path.abspath(directory)
+    cache_path = get_discovery_cache_path()
+    if cache_path:
+        record = read_discovery_cache(cache_path).get(directory)
+        if record and is_discovery_valid(record):
+            return [ParserEntry.from_dict(entry) for entry in record["entries"]]
+
+    root_cls = importlib.import_module("vega.packaging.parsers.abstract_parser").AbstractFileParser
+    entries = []
+    for module in import_modules_from_directory(directory):
+        for value in vars(module).values():
+            if (isinstance(value, type) and issubclass(value, root_cls) and value is not root_cls
+                    and value.__module__ == module.__name__ and value.FILENAME_REGEX is not None):
+                entries.append(ParserEntry.from_cls(value, module.__file__))
+
+    if cache_path:
+        # Recorded after importing since importing creates the __pycache__ directories
+        write_discovery_cache(cache_path, directory, entries)
+    return entries
+
+
 @functools.cache
-def import_parsers() -> list:
-    """Imports the file parsers into memory to allow them to be dynamically discovered"""
-    modules = []
-    discoverable_paths = [os.path.join(os.path.dirname(__file__), "parsers")]
-    if "PACKAGING_FILE_PARSERS" in os.environ:
-        if platform.system() == "Windows":
-            # Widnows uses ; separators for paths in their environment variables
-            discoverable_paths.extend(os.environ["PACKAGING_FILE_PARSERS"].split(";"))
-        else:
-            # Unix based OS uses : separators for paths in their environment variables
-            discoverable_paths.extend(os.environ["PACKAGING_FILE_PARSERS"].split(":"))
-    for directory in discoverable_paths:
-        modules.extend(import_modules_from_directory(directory))
-    return modules
+def get_parser_entries() -> list[ParserEntry]:
+    """Gets the declared parsers, in the order they take precedence, without importing them."""
+    entries = list(BUILTIN_PARSERS)
+    entries.extend(get_entry_point_parsers())
+    for directory in get_plugin_directories():
+        entries.extend(get_directory_parsers(directory))
+    return entries
+
+
+class DispatchIndex:
+    """Index that resolves which parser entry handles a filename without trying every pattern in turn.
+
+    Patterns that are plain filenames are stored in a hash map, every other pattern is combined into a single
+    alternation regex. Patterns must match the whole filename, so backup files such as package.json.bak are not
+    claimed, and when several entries match the one declared first takes precedence.
+    """
+    LITERAL_REGEX = re.compile(r"[\w\- ]+(?:\.[\w\- ]+)*")
+    INLINE_FLAGS = {re.I: "i", re.M: "m", re.S: "s", re.X: "x"}
+
+    def __init__(self, entries: list[ParserEntry]):
+        """Constructor
+
+        Args:
+            entries: parser entries in the order they take precedence.
+        """
+        self.__entries = list(entries)
+        self.__exact = {}
+        self.__exact_casefold = {}
+        self.__standalone = []
+        alternatives = []
+        for index, entry in enumerate(self.__entries):
+            ignore_case = bool(entry.regex.flags & re.I)
+            if self.LITERAL_REGEX.fullmatch(entry.pattern):
+                names = self.__exact_casefold if ignore_case else self.__exact
+                names.setdefault(entry.pattern.casefold() if ignore_case else entry.pattern, index)
+            elif entry.pattern.startswith("(?") or re.search(r"\(\?P|\\[0-9]", entry.pattern):
+                # Global inline flags, named groups and back references can't be nested in the combined regex
+                self.__standalone.append(index)
+            else:
+                flags = "".join(value for flag, value in self.INLINE_FLAGS.items() if entry.regex.flags & flag)
+                group = f"(?{flags}:{entry.pattern})" if flags else f"(?:{entry.pattern})"
+                alternatives.append(f"(?P<entry{index}>{group})")
+        self.__regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def get(self, filename: str) -> ParserEntry | None:
+        """Gets the parser entry for the filename.
+
+        Args:
+            filename: name of the file without its directory.
+
+        Returns:
+            ParserEntry or None if no parser handles the file
+        """
+        candidates = [self.__exact.get(filename), self.__exact_casefold.get(filename.casefold())]
+        regex = self.__regex.fullmatch(filename) if self.__regex else None
+        if regex:
+            candidates.append(int(regex.lastgroup[len("entry"):]))
+        for index in self.__standalone:
+            if self.__entries[index].regex.fullmatch(filename):
+                candidates.append(index)
+                break
+        candidates = [index for index in candidates if index is not None]
+        return self.__entries[min(candidates)] if candidates else None
 
 
 @functools.cache
+def get_dispatch_index() -> DispatchIndex:
+    """Gets the dispatch index of the declared parsers, built once per registry load."""
+    return DispatchIndex(get_parser_entries())
+
+
+def reload_parsers():
+    """Discards the declared parsers so the registry and its dispatch index get loaded again."""
+    get_parser_entries.cache_clear()
+    get_dispatch_index.cache_clear()
+
+
+def import_parsers() -> list:
+    """Imports every declared file parser into memory and returns their classes"""
+    return [entry.load() for entry in get_parser_entries()]
+
+
 def get_parser_cls_by_filename(filename):
-    """Gets the correct parser based on the filename given"""
-    import_parsers()
-    root_cls = sys.modules["vega.packaging.parsers.abstract_parser"].AbstractFileParser
-    for cls in get_subclasses(root_cls):
-        if cls.FILENAME_REGEX.match(filename):
-            return cls
+    """Gets the correct parser based on the filename given, only importing the parser that matches"""
+    entry = get_dispatch_index().get(filename)
+    if entry:
+        return entry.load()
 
 
 def get_parser_from_path(path: str):
     """Gets the parser object for the given file path.
 
+    While a sessions.Session is active the same parser is returned for the same path.
+
     Args:
         path: path to the file to parse
 
     Returns:
         vega.packaging.parser.abstract_parser.AbstractParser
     """
+    session = sessions.current()
+    if session is not None:
+        return session.get_parser(path, create_parser)
+    return create_parser(path)
+
+
+def create_parser(path: str):
+    """Creates a new parser object for the given file path. See get_parser_from_path"""
     _, filename = os.path.split(path)
     parser_cls = get_parser_cls_by_filename(filename)
     if parser_cls:
@@ -0,0 +1,132 @@
+"""Module for ordering the local packages of a repository by the dependencies between them.
+
+Packages depend on each other through path dependencies (uv and poetry sources, file: requirements, Cargo path
+dependencies, npm file: dependencies), through workspaces (uv, Cargo and npm workspaces) and through the files a
+Dockerfile copies from the other packages of its build context. The graph groups the packages into levels where every
+package only depends on packages of earlier levels, so all the packages of a level can be built at the same time.
+
+Usage:
+```
+from vega.packaging import factory, graph
+
+packages = graph.PackageGraph([factory.get_parser_from_path(path) for path in paths])
+for level in packages.levels():
+    print([file_parser.path for file_parser in level])
+```
+"""
+import logging
+import os
+
+from vega.packaging import affected
+
+logger = logging.getLogger(__name__)
+
+
+class PackageGraph:
+    """Dependencies between the build files of local packages."""
+
+    def __init__(self, parsers):
+        """Constructor
+
+        Args:
+            parsers: parsers of the files to order, the files that aren't build files are left out.
+        """
+        self.__parsers = [file_parser for file_parser in parsers
+                          if file_parser is not None and file_parser.IS_BUILD_FILE]
+        self.__owners = {}
+        self.__trie = affected.PathTrie()
+        for file_parser in self.__parsers:
+            self.__owners.setdefault(file_parser.directory, []).append(file_parser)
+            self.__trie.insert(file_parser.directory)
+        self.__names = {}
+        self.__dependencies = {file_parser: self.__resolve(file_parser) for file_parser in self.__parsers}
+        self.__dependents = {file_parser: [] for file_parser in self.__parsers}
+        for file_parser, dependencies in self.__dependencies.items():
+            for dependency in dependencies:
+                self.__dependents[dependency].append(file_parser)
+
+    def __contains__(self, file_parser) -> bool:
+        return file_parser in self.__dependencies
+
+    @property
+    def parsers(self) -> list:
+        """The build files of the graph in the order they were given"""
+        return list(self.__parsers)
+
+    def dependencies(self, file_parser) -> list:
+        """The packages of the graph the package of the file depends on"""
+        return list(self.__dependencies[file_parser])
+
+    def dependents(self, file_parser) -> list:
+        """The packages of the graph that depend on the package of the file"""
+        return list(self.__dependents[file_parser])
+
+    def __get_by_name(self, build_type, name: str) -> list:
+        """Gets the packages of a build type with the name, indexing the names of a build type the first time."""
+        if build_type not in self.__names:
+            index = {}
+            for file_parser in self.__parsers:
+                if file_parser.BUILD_TYPE != build_type:
+                    continue
+                try:
+                    package = file_parser.package
+                except (KeyError, TypeError):
+                    # Manifests that don't define a package, e.g. the root of a virtual workspace
+                    continue
+                if package:
+                    index.setdefault(file_parser.normalize_package_name(package), []).append(file_parser)
+            self.__names[build_type] = index
+        return self.__names[build_type].get(name, [])
+
+    def __resolve(self, file_parser) -> list:
+        """Finds the packages of the graph that a package depends on."""
+        dependencies = []
+        for path in file_parser.local_dependencies:
+            owner = self.__trie.nearest(path)
+            if owner is None:
+                continue
+            # A path outside of the packages of the graph is owned by a parent package, e.g. the root of a workspace,
+            # which isn't a dependency unless the path is the parent package itself
+            if owner not in (path, file_parser.directory) and \
+                    os.path.commonpath([owner, file_parser.directory]) == owner:
+                continue
+            dependencies.extend(self.__owners[owner])
+        for name in file_parser.workspace_dependencies:
+            dependencies.extend(self.__get_by_name(file_parser.BUILD_TYPE, file_parser.normalize_package_name(name)))
+
+        unique = []
+        for dependency in dependencies:
+            if dependency is not file_parser and dependency not in unique:
+                unique.append(dependency)
+        if unique:
+            logger.debug(f"{file_parser.path} depends on {[dependency.path for dependency in unique]}")
+        return unique
+
+    def levels(self) -> list[list]:
+        """Groups the packages so that every package only depends on the packages of the previous groups.
+
+        Packages keep the order they were given in within a group. Packages that depend on each other in a cycle
+        can't be ordered and are put together in a last group.
+
+        Returns:
+            list of lists of parsers
+        """
+        order = {file_parser: index for index, file_parser in enumerate(self.__parsers)}
+        remaining = {file_parser: len(dependencies) for file_parser, dependencies in self.__dependencies.items()}
+        level = [file_parser for file_parser in self.__parsers if not remaining[file_parser]]
+        levels = []
+        while level:
+            levels.append(level)
+            ready = []
+            for file_parser in level:
+                for dependent in self.__dependents[file_parser]:
+                    remaining[dependent] -= 1
+                    if not remaining[dependent]:
+                        ready.append(dependent)
+            level = sorted(ready, key=order.get)
+
+        cycle = [file_parser for file_parser in self.__parsers if remaining[file_parser]]
+        if cycle:
+            logger.warning(f"Packages depend on each other in a cycle: {', '.join(p.path for p in cycle)}")
+            levels.append(cycle)
+        return levels
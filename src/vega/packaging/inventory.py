@@ -0,0 +1,140 @@
+"""Module for taking an inventory of the versions of the files of a tree and finding the files that disagree.
+
+Only the version of every file is read, through the read_version fast path of its parser, and the files are read from
+a pool of threads. The files of a directory make up a package unit, e.g. a pyproject.toml and the CHANGELOG.md next
+to it, and a unit drifts when its files don't agree on the version.
+
+Usage:
+```
+from vega.packaging import inventory, io
+
+entries = inventory.collect(io.yield_paths("/path/to/repo", max_depth=None))
+print(inventory.format_table(entries, root="/path/to/repo"))
+```
+"""
+import concurrent.futures
+import json
+import logging
+import os
+
+from vega.packaging import factory
+from vega.packaging import sessions
+
+logger = logging.getLogger(__name__)
+
+# ANSI escape codes used to highlight the drifting files in a terminal
+HIGHLIGHT = "\033[1;31m"
+RESET = "\033[0m"
+
+
+class InventoryEntry:
+    """Version of a file of the inventory."""
+
+    def __init__(self, path: str, parser: str, version: str | None = None, error: str | None = None):
+        """Constructor
+
+        Args:
+            path: path to the file.
+            parser: name of the parser of the file.
+            version: version read from the file, None if it couldn't be read.
+            error: why the version couldn't be read.
+        """
+        self.path = path
+        self.parser = parser
+        self.version = version
+        self.error = error
+
+    @property
+    def unit(self) -> str:
+        """The package unit of the file, the directory it's in"""
+        return os.path.dirname(self.path)
+
+    def to_dict(self) -> dict:
+        return {"path": self.path, "parser": self.parser, "unit": self.unit, "version": self.version,
+                "error": self.error}
+
+    def __repr__(self):
+        return f"InventoryEntry({self.path!r}, version={self.version!r})"
+
+
+def read(file_parser) -> InventoryEntry:
+    """Reads the version of a file, the errors are kept in the entry instead of being raised."""
+    entry = InventoryEntry(file_parser.path, type(file_parser).__name__)
+    try:
+        entry.version = file_parser.read_version()
+    except Exception as error:
+        logger.warning(f"Failed to read the version of {file_parser.path}: {error}")
+        entry.error = f"{type(error).__name__}: {error}"
+    return entry
+
+
+def collect(paths, get_parser=None, max_workers: int | None = None) -> list[InventoryEntry]:
+    """Reads the version of every file with a versioned parser.
+
+    Args:
+        paths: paths of the files, e.g. from io.yield_paths.
+        get_parser: callable that gets the parser of a path. Defaults to factory.get_parser_from_path
+        max_workers: number of threads to read the files with.
+
+    Returns:
+        list of entries in the order of the paths.
+    """
+    get_parser = get_parser or factory.get_parser_from_path
+    parsers = []
+    for path in paths:
+        file_parser = get_parser(path)
+        # Files without a version, e.g. Dockerfiles, would have to query their registry
+        if file_parser and file_parser.HAS_VERSION and file_parser.exists:
+            parsers.append(file_parser)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(sessions.bind(read), parsers))
+
+
+def get_drift(entries: list[InventoryEntry]) -> dict[str, list[InventoryEntry]]:
+    """Finds the package units whose files don't agree on the version.
+
+    Returns:
+        dict of the directories of the drifting units to their entries.
+    """
+    units = {}
+    for entry in entries:
+        if entry.version is not None:
+            units.setdefault(entry.unit, []).append(entry)
+    return {unit: unit_entries for unit, unit_entries in units.items()
+            if len({entry.version for entry in unit_entries}) > 1}
+
+
+def to_json(entries: list[InventoryEntry]) -> str:
+    """Converts the entries to json, with the drifting units under the drift key."""
+    drift = get_drift(entries)
+    return json.dumps({"files": [entry.to_dict() for entry in entries],
+                       "drift": {unit: sorted({entry.version for entry in unit_entries})
+                                 for unit, unit_entries in drift.items()}}, indent=2)
+
+
+def format_table(entries: list[InventoryEntry], root: str | None = None, color: bool = False) -> str:
+    """Formats the entries as a table where the files of drifting units are marked with a !.
+
+    Args:
+        entries: entries to format.
+        root: directory the paths are shown relative to.
+        color: highlight the drifting files with ANSI colors.
+
+    Returns:
+        str
+    """
+    drift = get_drift(entries)
+    rows = [("", "PATH", "PARSER", "VERSION")]
+    for entry in entries:
+        path = os.path.relpath(entry.path, root) if root else entry.path
+        rows.append(("!" if entry.unit in drift else "", path, entry.parser, entry.version or f"({entry.error})"))
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    lines = []
+    for index, row in enumerate(rows):
+        line = "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        if color and index and row[0]:
+            line = f"{HIGHLIGHT}{line}{RESET}"
+        lines.append(line)
+    if drift:
+        lines.append(f"\n{len(drift)} package unit(s) with files that disagree on the version")
+    return "\n".join(lines)
@@ -1,30 +1,301 @@
 import os
+import re
 import platform
 import logging 
+import subprocess
+import concurrent.futures
+
+from vega.packaging import factory
 
 logger = logging.getLogger(__name__)
 
+# Directories that hold dependencies or build outputs instead of source files
+PRUNED_DIRECTORIES = (".git", "node_modules", "target", ".venv", "dist")
+# Sources yield_paths can discover files from
+DISCOVERY_BACKENDS = ("filesystem", "git")
+
+
+class IgnorePatterns:
+    """Matches relative paths against .gitignore/.dockerignore style patterns.
+
+    Patterns are evaluated in order and the last matching pattern wins, so negated patterns (`!pattern`) can
+    re-include paths excluded by an earlier pattern. A pattern that matches a directory also matches everything
+    inside of it.
+    """
+
+    def __init__(self, patterns: list[str] | None = None, anchored: bool = False):
+        """Constructor
+
+        Args:
+            patterns: lines of an ignore file.
+            anchored: treat every pattern as relative to the root like .dockerignore does. When False, patterns
+                without a slash match at any depth like .gitignore does.
+        """
+        self.__rules = []
+        for pattern in patterns or []:
+            rule = self.__compile(pattern, anchored)
+            if rule:
+                self.__rules.append(rule)
+
+    @classmethod
+    def from_file(cls, path: str, anchored: bool = False) -> "IgnorePatterns":
+        """Creates the patterns from an ignore file, returns an empty set of patterns if the file is missing."""
+        if not os.path.isfile(path):
+            return cls([], anchored)
+        with open(path, "r", encoding="utf-8") as handle:
+            return cls(handle.read().splitlines(), anchored)
+
+    @staticmethod
+    def __compile(pattern: str, anchored: bool):
+        """Converts a single ignore pattern to a (regex, negated, directory_only) tuple."""
+        pattern = pattern.strip()
+        if not pattern or pattern.startswith("#"):
+            return None
+        negated = pattern.startswith("!")
+        pattern = pattern.lstrip("!")
+        directory_only = pattern.endswith("/")
+        pattern = pattern.strip("/") if anchored else pattern.rstrip("/")
+        if pattern.startswith("/"):
+            anchored, pattern = True, pattern.lstrip("/")
+        elif "/" in pattern:
+            anchored = True
+        if not pattern:
+            return None
+
+        regex, index = [], 0
+        while index < len(pattern):
+            char = pattern[index]
+            if pattern.startswith("**/", index):
+                regex.append("(?:.*/)?")
+                index += 2
+            elif pattern.startswith("**", index):
+                regex.append(".*")
+                index += 1
+            elif char == "*":
+                regex.append("[^/]*")
+            elif char == "?":
+                regex.append("[^/]")
+            elif char == "[" and "]" in pattern[index + 1:]:
+                end = pattern.index("]", index + 1)
+                characters = pattern[index + 1:end]
+                if characters.startswith("!"):
+                    characters = f"^{characters[1:]}"
+                regex.append(f"[{characters}]")
+                index = end
+            else:
+                regex.append(re.escape(char))
+            index += 1
+
+        prefix = "" if anchored else "(?:.*/)?"
+        return re.compile(prefix + "".join(regex)), negated, directory_only
+
+    def __bool__(self) -> bool:
+        return bool(self.__rules)
+
+    @property
+    def can_prune(self) -> bool:
+        """Can ignored directories be skipped entirely, which is only safe when no pattern re-includes paths."""
+        return bool(self.__rules) and not any(negated for _, negated, _ in self.__rules)
+
+    def match(self, path: str, is_dir: bool = False) -> bool:
+        """Checks if the relative path is ignored by these patterns.
+
+        Args:
+            path: path relative to the root of the ignore file, using either / or the os separator.
+            is_dir: is the path a directory.
+
+        Returns:
+            bool
+        """
+        parts = [part for part in path.replace(os.path.sep, "/").split("/") if part and part != "."]
+        # Parent directories are checked as well since ignoring a directory ignores its contents
+        candidates = [("/".join(parts[:index]), True) for index in range(1, len(parts))]
+        candidates.append(("/".join(parts), is_dir))
+
+        ignored = False
+        for regex, negated, directory_only in self.__rules:
+            for candidate, candidate_is_dir in candidates:
+                if directory_only and not candidate_is_dir:
+                    continue
+                if regex.fullmatch(candidate):
+                    ignored = not negated
+                    break
+        return ignored
+
+
+class _WalkDirectory:
+    """Directory queued for scanning by walk."""
+
+    __slots__ = ("path", "relative", "depth", "ignores")
+
+    def __init__(self, path: str, relative: str, depth: int, ignores: tuple):
+        self.path = path
+        self.relative = relative
+        self.depth = depth
+        self.ignores = ignores
+
+
+def _is_ignored(relative: str, is_dir: bool, ignores: tuple) -> bool:
+    """Checks a path relative to the walked directory against the .gitignore files of its parent directories."""
+    for base, patterns in ignores:
+        if patterns.match(relative[len(base) + 1:] if base else relative, is_dir):
+            return True
+    return False
+
+
+def _scan_directory(directory: _WalkDirectory, max_depth: int | None, pruned: frozenset,
+                    gitignore: bool) -> tuple[list[str], list[_WalkDirectory]]:
+    """Scans a single directory, returning its sorted files and the subdirectories that should be walked."""
+    ignores = directory.ignores
+    if gitignore:
+        patterns = IgnorePatterns.from_file(os.path.join(directory.path, ".gitignore"))
+        if patterns:
+            ignores = ignores + ((directory.relative, patterns),)
+
+    files, subdirectories = [], []
+    try:
+        with os.scandir(directory.path) as iterator:
+            entries = sorted(iterator, key=lambda entry: entry.name)
+    except OSError as error:
+        logger.debug(f"Skipping {directory.path}: {error}")
+        return files, subdirectories
+
+    descend = max_depth is None or directory.depth < max_depth
+    for entry in entries:
+        relative = f"{directory.relative}/{entry.name}" if directory.relative else entry.name
+        try:
+            # Symlinked directories aren't followed to avoid walking in circles
+            is_dir = entry.is_dir(follow_symlinks=False)
+            is_file = not is_dir and entry.is_file()
+        except OSError:
+            continue
+        if is_dir:
+            if descend and entry.name not in pruned and not _is_ignored(relative, True, ignores):
+                subdirectories.append(_WalkDirectory(entry.path, relative, directory.depth + 1, ignores))
+        elif is_file and not _is_ignored(relative, False, ignores):
+            files.append(entry.path)
+    return files, subdirectories
+
+
+def walk(directory: str, max_depth: int | None = 0, pruned_directories=PRUNED_DIRECTORIES, gitignore: bool = True,
+         threads: int | None = None):
+    """Yields the files under a directory, skipping dependency and build output directories and gitignored paths.
+
+    Files are yielded in the same order regardless of the number of threads: the files of a directory sorted by
+    name followed by the files of each of its subdirectories.
+
+    Args:
+        directory: path to the directory to walk.
+        max_depth: how many levels of subdirectories to descend into, 0 only yields the direct children of the
+            directory and None walks the whole tree.
+        pruned_directories: names of the directories that are never descended into.
+        gitignore: skip the paths ignored by the .gitignore files found while walking.
+        threads: scan directories on this many threads, useful for very wide trees on network drives.
+
+    Yields:
+        str
+    """
+    pruned = frozenset(pruned_directories or ())
+    root = _WalkDirectory(directory, "", 0, ())
+    if not threads or threads < 2:
+        # Depth first so that files stream out as soon as their directory is scanned
+        stack = [root]
+        while stack:
+            files, subdirectories = _scan_directory(stack.pop(), max_depth, pruned, gitignore)
+            yield from files
+            stack.extend(reversed(subdirectories))
+        return
+
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = {executor.submit(_scan_directory, root, max_depth, pruned, gitignore): root}
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                scanned = pending.pop(future)
+                files, subdirectories = future.result()
+                results[scanned.relative] = files, [subdirectory.relative for subdirectory in subdirectories]
+                for subdirectory in subdirectories:
+                    pending[executor.submit(_scan_directory, subdirectory, max_depth, pruned, gitignore)] = subdirectory
+
+    # Replay the scans in depth first order so the output matches the single threaded walk
+    stack = [""]
+    while stack:
+        files, subdirectories = results[stack.pop()]
+        yield from files
+        stack.extend(reversed(subdirectories))
+
+
+def git_paths(directory: str, max_depth: int | None = 0, pruned_directories=PRUNED_DIRECTORIES):
+    """Yields the files under a directory that are tracked by git and have a file parser.
+
+    The candidates are read from the git index with a single git ls-files call and filtered by filename through the
+    parsers dispatch index, so the cost is proportional to the tracked files and no parser is instantiated for files
+    that can't be parsed. Files are yielded in the same order as walk.
+
+    Args:
+        directory: path to a directory inside of a git repository.
+        max_depth: how many levels of subdirectories to include, None includes the whole tree.
+        pruned_directories: names of the directories whose files are skipped.
+
+    Yields:
+        str
+    """
+    result = subprocess.run(["git", "ls-files", "-z"], cwd=directory, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to list the files tracked by git in {directory}: "
+                           f"{result.stderr.decode(errors='replace').strip()}")
+
+    pruned = frozenset(pruned_directories or ())
+    dispatch_index = factory.get_dispatch_index()
+    candidates = []
+    for relative in os.fsdecode(result.stdout).split("\0"):
+        if not relative:
+            continue
+        *parents, filename = relative.split("/")
+        if max_depth is not None and len(parents) > max_depth:
+            continue
+        if pruned.intersection(parents) or not dispatch_index.get(filename):
+            continue
+        # Files sort before the subdirectories of their directory like they do in walk
+        candidates.append(([(1, parent) for parent in parents] + [(0, filename)], relative))
+
+    for _, relative in sorted(candidates):
+        yield os.path.join(directory, *relative.split("/"))
+
 
-def yield_paths(directory=None, additional_paths=None):
+def yield_paths(directory=None, additional_paths=None, max_depth: int | None = 0, threads: int | None = None,
+                discovery: str = "filesystem"):
     """Yields the paths should be parsed by this cli command based on the contents of the args parser.
 
     Args:
         directory (str): path to directory to scan for files.
         additional_paths: additional files that should be returned even if they don't exist. 
                         This is intended to be used for ensuring files are present even when mising on disk. 
+        max_depth: how many levels of subdirectories to scan, None scans the whole tree. See walk
+        threads: number of threads to scan directories with. See walk
+        discovery: where to discover the files from, "filesystem" walks the directory and "git" lists the files
+                   tracked by git, falling back to walking the directory outside of a git repository.
 
     Yields:
         str
     """
-    # yield of files that are direct children of the given directory
     paths = []
     additional_paths = additional_paths or []
+    if discovery not in DISCOVERY_BACKENDS:
+        raise ValueError(f"Unknown discovery backend {discovery}, expected one of {DISCOVERY_BACKENDS}")
     logger.debug(f"Scanning {directory} for files")
-    for filename in os.listdir(directory):
-        if os.path.isfile(filename):
-            path = os.path.join(directory, filename)
-            yield path
-            paths.append(path)
+    discovered = None
+    if discovery == "git":
+        try:
+            discovered = list(git_paths(directory, max_depth=max_depth))
+        except (OSError, RuntimeError) as error:
+            logger.debug(f"Falling back to walking {directory}: {error}")
+    if discovered is None:
+        discovered = walk(directory, max_depth=max_depth, threads=threads)
+    for path in discovered:
+        yield path
+        paths.append(path)
 
     is_windows = platform.system() == "Windows"
     for path in additional_paths:
@@ -1,8 +1,9 @@
 """Module for holding the abstract file parser class"""
+import asyncio
 import os
 import logging
 
-from vega.packaging import commits, versions
+from vega.packaging import commits, contextmanagers, processes, sessions, versions
 
 
 logger = logging.getLogger(__name__)
@@ -34,6 +35,7 @@ class AbstractFileParser:
         self._registry = None
         self._registry_version = None
         self._package = None
+        self._context = None
 
     @property
     def path(self) -> str:
@@ -46,6 +48,18 @@ class AbstractFileParser:
         return os.path.basename(self.__path)
 
 
+    @property
+    def directory(self) -> str:
+        """Directory of the file being parsed, the commands of the parser run from it."""
+        return self.context.cwd
+
+    @property
+    def context(self) -> contextmanagers.ExecutionContext:
+        """The context the commands of this parser run in and that its relative paths resolve against."""
+        if self._context is None:
+            self._context = contextmanagers.ExecutionContext(self.__path, is_file=True)
+        return self._context
+
     @property
     def exists(self) -> bool:
         """ Does this file exist on disk"""
@@ -53,11 +67,24 @@ class AbstractFileParser:
 
     @property
     def content(self):
-        """The contents of this pyproject.toml file"""
-        if not self._content and self.exists:
-            self._content = self.read()
+        """The contents of this file, parsed once and shared with the other parsers of the file, see sessions"""
+        if self._content is None and self.exists:
+            self._content = sessions.read(self.path, self.read)
         return self._content
 
+    def prefetch(self, content=None):
+        """Parses the file ahead of time, so the content is ready once it's needed.
+
+        Args:
+            content: content of the file that was already parsed somewhere else, e.g. in another process.
+        """
+        if self._content is not None:
+            return
+        if content is not None:
+            self._content = content
+        elif self.exists:
+            self._content = sessions.read(self.path, self.read)
+
     @property
     def registry(self):
         """ The name of the registry where the package this file belongs to gets published to""" 
@@ -94,6 +121,44 @@ class AbstractFileParser:
     def version(self, value):
         self._version = value
 
+    def read_version(self) -> str:
+        """Reads the version of the file without parsing the rest of it when the format allows it.
+
+        Used to take an inventory of the versions of many files at once, see vega.packaging.inventory
+        """
+        return str(self.version)
+
+    @property
+    def local_dependencies(self) -> list[str]:
+        """Absolute paths this package depends on that belong to other local packages, e.g. path dependencies.
+
+        The package owning each path is the nearest build file above it, see vega.packaging.graph
+        """
+        return []
+
+    @property
+    def workspace_dependencies(self) -> list[str]:
+        """Names of the packages of the same workspace this package depends on without giving their path."""
+        return []
+
+    def pin_dependency(self, name: str, version: str) -> bool:
+        """Sets the version this package requires of a local package in the content of the file, the file is written
+        by the next update.
+
+        Args:
+            name: name of the package depended on.
+            version: the new version of the package depended on.
+
+        Returns:
+            bool: True if the requirement of the package was changed
+        """
+        return False
+
+    @classmethod
+    def normalize_package_name(cls, name: str) -> str:
+        """Normalizes a package name so the names used by dependencies compare equal to the name of the package."""
+        return name
+
     def reset(self):
         """Resets the values of the object so they get parsed again.
 
@@ -116,14 +181,53 @@ class AbstractFileParser:
             self._version = versions.SemanticVersion(semantic_version)
         self.version.bump(commit_message.semantic_version_bump)
 
-    def build(self, version=None, registry=None):
-        """Builds a package that uses this file"""
+    def build_steps(self, *args, **kwargs):
+        """Yields the processes.Command objects that build a package that uses this file.
+
+        Each yield receives the processes.CommandResult of the command, so the same steps run both with build and
+        build_async.
+        """
         raise NotImplementedError("This abstract method needs to be reimplemented")
-    
-    def publish(self, version=None, registry=None):
-        """Publishes this file to a repository"""
+
+    def publish_steps(self, *args, **kwargs):
+        """Yields the processes.Command objects that publish this file to a repository. See build_steps"""
+        raise NotImplementedError("This abstract method needs to be reimplemented")
+
+    def release_steps(self, *args, **kwargs):
+        """Yields the processes.Command objects that compile the release artifacts of this file. See build_steps"""
         raise NotImplementedError("This abstract method needs to be reimplemented")
 
-    def release(self, version=None, registry=None):
-        """Publishes this file to github as a release. Requires the build step to complete."""
-        raise NotImplementedError("This abstract method needs to be reimplemented")
\ No newline at end of file
+    def build(self, *args, **kwargs):
+        """Builds a package that uses this file"""
+        return processes.drive(self.build_steps(*args, **kwargs))
+
+    def publish(self, *args, **kwargs):
+        """Publishes this file to a repository"""
+        return processes.drive(self.publish_steps(*args, **kwargs))
+
+    def release(self, *args, **kwargs):
+        """Compiles the release artifacts of this file. Requires the build step to complete."""
+        return processes.drive(self.release_steps(*args, **kwargs))
+
+    async def __drive_async(self, name: str, args: tuple, kwargs: dict):
+        """Drives the steps of a workflow from the event loop."""
+        if getattr(type(self), f"{name}_steps") is getattr(AbstractFileParser, f"{name}_steps"):
+            # Parsers that only implement the blocking workflow run it on a thread
+            return await asyncio.to_thread(getattr(self, name), *args, **kwargs)
+        return await processes.drive_async(getattr(self, f"{name}_steps")(*args, **kwargs))
+
+    async def build_async(self, *args, **kwargs):
+        """Builds a package that uses this file from an event loop"""
+        return await self.__drive_async("build", args, kwargs)
+
+    async def publish_async(self, *args, **kwargs):
+        """Publishes this file to a repository from an event loop"""
+        return await self.__drive_async("publish", args, kwargs)
+
+    async def release_async(self, *args, **kwargs):
+        """Compiles the release artifacts of this file from an event loop"""
+        return await self.__drive_async("release", args, kwargs)
+
+    def promote(self, source_registry: str):
+        """Copies an already published package from another registry to the registry of this file"""
+        raise NotImplementedError("This abstract method needs to be reimplemented")
@@ -1,13 +1,12 @@
 """Module for holding the code for parsing the Cargo.toml files"""
+import copy
 import os
 import re
 import shutil
-import subprocess
 
 import toml
 
-from vega.packaging import commits, decorators, const, versions
-from vega.packaging import contextmanagers
+from vega.packaging import commits, decorators, const, factory, transactions, versions
 from vega.packaging.parsers import abstract_parser
 
 
@@ -34,6 +33,7 @@ class Cargo(abstract_parser.AbstractFileParser):
         "aarch64-apple-darwin":      "aarch64-macos",
         "x86_64-pc-windows-gnu":     "x86_64-windows",
     }
+    DEPENDENCY_TABLES = ("dependencies", "dev-dependencies", "build-dependencies")
 
     @property
     def version(self) -> str:
@@ -42,6 +42,14 @@ class Cargo(abstract_parser.AbstractFileParser):
             self._version = versions.SemanticVersion(self.content.get("package", {}).get("version", self.DEFAULT_VERSION))
         return self._version
 
+    def read_version(self) -> str:
+        """Reads the version of the package table without parsing the rest of the file"""
+        if self._version is None and self._content is None and self.exists:
+            version = versions.read_toml_version(self.path, "package")
+            if version is not None:
+                return version
+        return super(Cargo, self).read_version()
+
     @property
     def content(self) -> dict:
         """The contents of this Cargo.toml file"""
@@ -51,17 +59,75 @@ class Cargo(abstract_parser.AbstractFileParser):
     def package(self) -> str:
         """The name of the package that this file defines if it is file that defines a package build"""
         if not self._package:
-            self._package = self.read()["package"]["name"]
+            self._package = self.content["package"]["name"]
         return self._package
 
+    @property
+    def local_dependencies(self) -> list[str]:
+        """Paths of the path dependencies, including the ones inherited from the workspace"""
+        paths = []
+        workspace = None
+        for table in self.__get_dependency_tables():
+            for name, dependency in table.items():
+                if not isinstance(dependency, dict):
+                    continue
+                if dependency.get("path"):
+                    paths.append(self.context.resolve(dependency["path"]))
+                elif dependency.get("workspace"):
+                    workspace = workspace or self.__get_workspace()
+                    inherited = workspace[1].get(name) if workspace else None
+                    if isinstance(inherited, dict) and inherited.get("path"):
+                        paths.append(os.path.normpath(os.path.join(workspace[0], inherited["path"])))
+        return paths
+
+    def pin_dependency(self, name: str, version: str) -> bool:
+        """Sets the version of the dependencies on the crate that give both a path and a version"""
+        pinned = False
+        for table in self.__get_dependency_tables():
+            for key, dependency in table.items():
+                if not isinstance(dependency, dict) or dependency.get("package", key) != name:
+                    continue
+                if isinstance(dependency.get("version"), str):
+                    specifier = versions.replace_version(dependency["version"], version)
+                    if specifier is not None and specifier != dependency["version"]:
+                        dependency["version"] = specifier
+                        pinned = True
+        return pinned
+
+    def __get_dependency_tables(self) -> list[dict]:
+        """Gets the tables of dependencies, including the ones of specific targets."""
+        content = self.content
+        tables = [content.get(table, {}) for table in self.DEPENDENCY_TABLES]
+        for target in content.get("target", {}).values():
+            tables.extend(target.get(table, {}) for table in self.DEPENDENCY_TABLES)
+        return tables
+
+    def __get_workspace(self) -> tuple | None:
+        """Gets the directory and the dependencies of the workspace this crate belongs to."""
+        directory = self.directory
+        while True:
+            manifest = os.path.join(directory, "Cargo.toml")
+            try:
+                # The parser of the manifest is shared with the rest of the run when a session is active
+                workspace = self if manifest == os.path.abspath(self.path) else factory.get_parser_from_path(manifest)
+                content = workspace.content if workspace and workspace.exists else {}
+            except (OSError, toml.TomlDecodeError):
+                content = {}
+            if "workspace" in content:
+                return directory, content["workspace"].get("dependencies", {})
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return None
+            directory = parent
+
     def create(self):
         """Creates a Cargo.toml file with some default values."""
-        content = dict(self.TEMPLATE)
+        content = copy.deepcopy(self.TEMPLATE)
         content["package"]["name"] = os.path.split(os.path.dirname(self.path))[-1]
         content["package"]["version"] = self.DEFAULT_VERSION
-
-        with open(self.path, "w") as handle:
-            toml.dump(content, handle)
+        # The content is kept since the file is only on disk once the transaction exits
+        self._content = content
+        transactions.write(self.path, toml.dumps(content))
 
     def read(self) -> dict:
         """Reads the contents of the Cargo.toml file"""
@@ -80,62 +146,48 @@ class Cargo(abstract_parser.AbstractFileParser):
         self.content["package"]["version"] = str(self.version)
 
         # Update the file
-        with open(self.path, "w") as handle:
-            toml.dump(self.content, handle)
+        transactions.write(self.path, toml.dumps(self.content))
 
-    def build(self, commit_message=None):
+    def build_steps(self, commit_message=None):
         """Builds the Rust crate using cargo package."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            result = subprocess.run(
-                ["cargo", "package"],
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
-                raise RuntimeError(f"Build failed: {result.stderr}")
-            package_dir = os.path.join("target", "package")
-            for filename in os.listdir(package_dir):
-                if filename.endswith(".crate"):
-                    self._build = os.path.join(package_dir, filename)
-                    break
-
-    def publish(self, registry=None):
+        result = yield self.context.command(["cargo", "package"])
+        if result.returncode != 0:
+            raise RuntimeError(f"Build failed: {result.stderr}")
+        package_dir = os.path.join("target", "package")
+        for filename in os.listdir(self.context.resolve(package_dir)):
+            if filename.endswith(".crate"):
+                self._build = os.path.join(package_dir, filename)
+                break
+
+    def publish_steps(self, registry=None):
         """Publishes the Rust crate using cargo publish."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            registry = registry or self._registry
-            if not self._build:
-                raise RuntimeError("Must build before publishing")
-            cmd = ["cargo", "publish"]
-            if registry:
-                cmd.extend(["--registry", registry])
-            result = subprocess.run(cmd, capture_output=True, text=True)
+        registry = registry or self._registry
+        if not self._build:
+            raise RuntimeError("Must build before publishing")
+        cmd = ["cargo", "publish"]
+        if registry:
+            cmd.extend(["--registry", registry])
+        result = yield self.context.command(cmd)
+        if result.returncode != 0:
+            raise RuntimeError(f"Publish failed: {result.stderr}")
+
+    def release_steps(self):
+        """Cross-compiles the crate for all supported targets and stages binaries under bin/<arch>/."""
+        package_name = self.package
+
+        for target_triple, arch_dir in self.COMPILE_TARGETS.items():
+            result = yield self.context.command(["rustup", "target", "add", target_triple])
             if result.returncode != 0:
-                raise RuntimeError(f"Publish failed: {result.stderr}")
+                raise RuntimeError(f"rustup target add {target_triple} failed: {result.stderr}")
 
-    def release(self):
-        """Cross-compiles the crate for all supported targets and stages binaries under bin/<arch>/."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            package_name = self.package
-
-            for target_triple, arch_dir in self.COMPILE_TARGETS.items():
-                result = subprocess.run(
-                    ["rustup", "target", "add", target_triple],
-                    capture_output=True, text=True
-                )
-                if result.returncode != 0:
-                    raise RuntimeError(f"rustup target add {target_triple} failed: {result.stderr}")
-
-                result = subprocess.run(
-                    ["cargo", "build", "--release", "--target", target_triple],
-                    capture_output=True, text=True
-                )
-                if result.returncode != 0:
-                    raise RuntimeError(f"cargo build --target {target_triple} failed: {result.stderr}")
-
-                is_windows = "windows" in target_triple
-                binary_name = f"{package_name}.exe" if is_windows else package_name
-                src = os.path.join("target", target_triple, "release", binary_name)
-                dst_dir = os.path.join("bin", arch_dir)
-                os.makedirs(dst_dir, exist_ok=True)
-                dst = os.path.join(dst_dir, binary_name)
-                shutil.copy2(src, dst)
+            result = yield self.context.command(["cargo", "build", "--release", "--target", target_triple])
+            if result.returncode != 0:
+                raise RuntimeError(f"cargo build --target {target_triple} failed: {result.stderr}")
+
+            is_windows = "windows" in target_triple
+            binary_name = f"{package_name}.exe" if is_windows else package_name
+            src = self.context.resolve("target", target_triple, "release", binary_name)
+            dst_dir = self.context.resolve("bin", arch_dir)
+            os.makedirs(dst_dir, exist_ok=True)
+            dst = os.path.join(dst_dir, binary_name)
+            shutil.copy2(src, dst)
@@ -2,12 +2,13 @@
 import re
 import os
 
-from vega.packaging import commits, decorators, versions
+from vega.packaging import commits, decorators, transactions, versions
 from vega.packaging.parsers import abstract_parser
 
 
 class Changelog(abstract_parser.AbstractFileParser):
     """Parser for the changelog.md file."""
+    NAME = "Changelog"
     AUTOCREATE = True
     FILENAME_REGEX = re.compile("CHANGELOG.md", re.I)
     TEMPLATE = """# Changelog
@@ -39,6 +40,17 @@ and this project adheres to [Semantic Versioning](https://semver.org/spec/v2.0.0
             self.__get_insert_version_index()
         return self._version
 
+    def read_version(self) -> str:
+        """Reads the version of the latest entry, stopping at the first version header of the file"""
+        if self._version is None and self._content is None and self.exists:
+            with open(self.path, "r") as handle:
+                for line in handle:
+                    match = self.VERSION_REGEX.match(line)
+                    if match:
+                        return match.group("version")
+            return self.DEFAULT_VERSION
+        return super(Changelog, self).read_version()
+
     @property
     def package(self) -> str: 
         """ The name of the package that this file defines if it is file that defines a package build"""
@@ -69,8 +81,8 @@ and this project adheres to [Semantic Versioning](https://semver.org/spec/v2.0.0
 
     def create(self):
         """Creates a changelog file if it doesn't exist with some default values."""
-        with open(self.path, "w") as handle:
-            handle.write(self.TEMPLATE)
+        self._content = self.TEMPLATE.splitlines(keepends=True)
+        transactions.write(self.path, self.TEMPLATE)
 
     def read(self) -> list:
         """Reads the changelog.md file."""
@@ -93,8 +105,7 @@ and this project adheres to [Semantic Versioning](https://semver.org/spec/v2.0.0
             self.content.extend(["\n", commit_message.markdown(self.version)])
 
         # Update the file
-        with open(self.path, "w") as handle:
-            handle.writelines(self.content)
+        transactions.write(self.path, "".join(self.content))
 
     def changes(self, version=None, since=None) -> str:
         """Returns changelog content for a version range.
@@ -1,12 +1,17 @@
 """Module for holding the code for parsing the Dockerfile files"""
+import hashlib
 import json
 import os
 import re
-import subprocess
 import logging
 
 from vega.packaging import const
-from vega.packaging import contextmanagers
+from vega.packaging import io
+from vega.packaging import processes
+from vega.packaging import queries
+from vega.packaging import registries
+from vega.packaging import transactions
+from vega.packaging import versions
 from vega.packaging.parsers import abstract_parser
 
 logger = logging.getLogger(__name__)
@@ -19,33 +24,32 @@ class DockerFile(abstract_parser.AbstractFileParser):
     HAS_VERSION = False 
     IS_BUILD_FILE = True
     BUILD_TYPE=const.BuildTypes.DOCKER
+    # Label stamped on built images with the fingerprint of the build context they were built from
+    FINGERPRINT_LABEL = "style.vega.packaging.fingerprint"
+    # Alias tags that can be applied on top of the semantic version tag
+    TAG_ALIASES = ("latest", "major", "minor")
+    DIGEST_REGEX = re.compile(r"digest: (?P<digest>sha256:[a-f0-9]{64})")
+    COPY_REGEX = re.compile(r"^\s*(?:COPY|ADD)\s+(?P<arguments>.+)$", re.I | re.M)
 
     def __init__(self, path, version = None):
         super().__init__(path, version)
         # is this current file inside a folder structure that is versioned by git
         self.__in_git_repository = False
+        self._fingerprint = None
+        self._tag_policy = []
+        self._digest = None
 
     def __get_git_repository(self):
         """Get the git repository name if the Dockerfile is inside a Git repo."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            result = subprocess.run(
-                ["git", "rev-parse", "--show-toplevel"],
-                capture_output=True,
-                text=True,
-            )
+        result = queries.run(["git", "rev-parse", "--show-toplevel"], cwd=os.path.dirname(self.path) or None,
+                             env_keys=("GIT_DIR", "GIT_WORK_TREE"))
         if result.returncode != 0:
             return None
         return os.path.basename(result.stdout.strip())
 
     def __get_docker_repositories(self):
         """Get list of Docker registries the user is logged into from Docker config."""
-        config_path = os.path.expanduser("~/.docker/config.json")
-        if not os.path.exists(config_path):
-            return []
-
-        with open(config_path, "r", encoding="utf-8") as handle:
-            config = json.load(handle)
-
+        config = queries.read_json(os.path.expanduser("~/.docker/config.json")) or {}
         return sorted(config.get("auths", {}).keys())
 
     def __get_image_tags(self):
@@ -54,21 +58,37 @@ class DockerFile(abstract_parser.AbstractFileParser):
             return []
 
         try:
-            with contextmanagers.WorkingDirectory(self.path, is_file=True):
-                result = subprocess.run(
-                    ["docker", "images", "--format", "{{.Tag}}", f"{self.registry}/{self.package}"],
-                    capture_output=True,
-                    text=True,
-                )
+            result = processes.run(self.context.command(
+                ["docker", "images", "--format", "{{.Tag}}", f"{self.registry}/{self.package}"],
+                tail_lines=None
+            ))
             if result.returncode != 0:
                 return []
             return [tag.strip() for tag in result.stdout.strip().split("\n") if tag.strip()]
         except Exception:
             return []
 
+    def __get_fingerprint_image(self):
+        """Get the id of a local image that was built from a build context with the same fingerprint."""
+        try:
+            result = processes.run(self.context.command(
+                ["docker", "images", "--quiet", "--filter", f"label={self.FINGERPRINT_LABEL}={self.fingerprint}"],
+                tail_lines=None
+            ))
+            if result.returncode != 0:
+                return None
+            image_ids = [image_id.strip() for image_id in result.stdout.strip().split("\n") if image_id.strip()]
+            return image_ids[0] if image_ids else None
+        except Exception:
+            return None
+
     def __get_image_semantic_versions(self):
         """Get available semantic versions from the repository ordered from newest to oldest"""
-        tags = self.__get_image_tags()
+        return self.__sort_semantic_versions(self.__get_image_tags())
+
+    @staticmethod
+    def __sort_semantic_versions(tags: list[str]) -> list[str]:
+        """Keeps the semantic version tags ordered from newest to oldest"""
         versions = [
             tag for tag in tags
             if re.match(r"^[0-9]+\.[0-9]+\.[0-9]+$", tag)
@@ -105,6 +125,38 @@ class DockerFile(abstract_parser.AbstractFileParser):
     def package(self, value):
         self._package = value
 
+    @property
+    def local_dependencies(self) -> list[str]:
+        """Paths of the build context copied into the image, e.g. a wheel built by a package next to this file"""
+        # Join the instructions that continue on the next line
+        text = re.sub(r"\\[ \t]*\r?\n", " ", "".join(self.content or []))
+        paths = []
+        for match in self.COPY_REGEX.finditer(text):
+            arguments = match.group("arguments").strip()
+            options = []
+            while arguments.startswith("--"):
+                option, _, arguments = arguments.partition(" ")
+                options.append(option)
+                arguments = arguments.strip()
+            # Images and stages aren't part of the build context
+            if any(option.startswith("--from") for option in options):
+                continue
+            try:
+                arguments = json.loads(arguments) if arguments.startswith("[") else arguments.split()
+            except ValueError:
+                arguments = arguments.split()
+            for source in arguments[:-1]:
+                if "://" in source or source.startswith("<<"):
+                    continue
+                # Patterns are owned by the directory they match in
+                parts = []
+                for part in re.split(r"[\\/]", source):
+                    if any(character in part for character in "*?["):
+                        break
+                    parts.append(part)
+                paths.append(self.context.resolve("/".join(parts).lstrip("/")))
+        return paths
+
     @property
     def registry(self):
         """The name of the registry where the package this file belongs to gets published to"""
@@ -122,15 +174,85 @@ class DockerFile(abstract_parser.AbstractFileParser):
         self._registry = value
 
     @property
-    def tag(self):
+    def fingerprint(self) -> str:
+        """Hash of the files in the build context of this dockerfile, honoring the .dockerignore file.
+
+        Only the files sent to the docker daemon contribute to the fingerprint, so changes to ignored files such as
+        documentation don't require a new image to be built.
+        """
+        if not self._fingerprint:
+            context = self.directory
+            ignore_patterns = io.IgnorePatterns.from_file(os.path.join(context, ".dockerignore"), anchored=True)
+            # The dockerfile and .dockerignore are always sent to the daemon even when ignored
+            always_included = {os.path.basename(self.path), ".dockerignore"}
+
+            digest = hashlib.sha256()
+            for root, directories, files in os.walk(context):
+                relative_root = os.path.relpath(root, context)
+                directories.sort()
+                if ignore_patterns.can_prune:
+                    directories[:] = [directory for directory in directories
+                                      if not ignore_patterns.match(os.path.join(relative_root, directory), is_dir=True)]
+                for filename in sorted(files):
+                    relative_path = os.path.normpath(os.path.join(relative_root, filename))
+                    if relative_path not in always_included and ignore_patterns.match(relative_path):
+                        continue
+                    file_path = os.path.join(root, filename)
+                    digest.update(relative_path.replace(os.path.sep, "/").encode("utf-8") + b"\0")
+                    if os.path.islink(file_path):
+                        digest.update(os.readlink(file_path).encode("utf-8"))
+                    else:
+                        digest.update(str(os.stat(file_path).st_mode & 0o111).encode("utf-8"))
+                        with open(file_path, "rb") as handle:
+                            for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+                                digest.update(chunk)
+                    digest.update(b"\0")
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    @property
+    def tag_policy(self) -> list:
+        """The alias tags to apply to the image besides the semantic version, e.g. ["latest", "major", "minor"]"""
+        return self._tag_policy
+
+    @tag_policy.setter
+    def tag_policy(self, value):
+        invalid = [alias for alias in value or [] if alias not in self.TAG_ALIASES]
+        if invalid:
+            raise ValueError(f"Unknown tag aliases {invalid}. Available: {list(self.TAG_ALIASES)}")
+        self._tag_policy = list(value or [])
+
+    @property
+    def repository(self):
+        """The image repository in the registry/package format"""
         if not self.registry or not self.package:
             return None
-        return f"{self.registry}/{self.package}:{self.version}"
+        return f"{self.registry}/{self.package}"
+
+    @property
+    def tag(self):
+        if not self.repository:
+            return None
+        return f"{self.repository}:{self.version}"
+
+    @property
+    def tags(self) -> list:
+        """The semantic version tag followed by the alias tags of the tag policy"""
+        if not self.tag:
+            return []
+        major, minor = (versions.release(str(self.version)) + (0, 0))[:2]
+        aliases = {"latest": "latest", "major": major, "minor": f"{major}.{minor}"}
+        return [self.tag] + [f"{self.repository}:{aliases[alias]}" for alias in self._tag_policy]
+
+    @property
+    def digest(self) -> str | None:
+        """The digest of the image manifest that was pushed to the registry"""
+        return self._digest
     
     def create(self):
-        """Creates a changelog file if it doesn't exist with some default values."""
-        with open(self.path, "w") as handle:
-            handle.write(self.TEMPLATE)
+        """Creates a dockerfile if it doesn't exist with some default values."""
+        self._content = self.TEMPLATE.splitlines(keepends=True)
+        transactions.write(self.path, self.TEMPLATE)
 
     def read(self) -> list:
         """Reads the dockerfile file."""
@@ -141,29 +263,72 @@ class DockerFile(abstract_parser.AbstractFileParser):
         """Updates the dockerfile file."""
         logger.warning("Updating DockerFile is not supported")
 
-    def build(self, commit_message=None):
-        """Builds the Docker image."""
+    def build_steps(self, commit_message=None):
+        """Builds the Docker image.
+
+        Images are labeled with the fingerprint of their build context. If a local image was already built from an
+        identical build context it is tagged with the new tag instead of being rebuilt.
+        """
         if not self.tag:
             raise RuntimeError("Registry must be set before building")
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            result = subprocess.run(
-                ["docker", "build", "-t", self.tag, "."],
-                capture_output=True,
-                text=True
-            )
+        image_id = self.__get_fingerprint_image()
+        if image_id:
+            logger.info(f"Build context of {self.path} is unchanged, tagging image {image_id} as {self.tags}")
+            for tag in self.tags:
+                result = yield self.context.command(["docker", "tag", image_id, tag])
+                if result.returncode != 0:
+                    raise RuntimeError(f"Docker tag failed: {result.stderr}")
+        else:
+            tag_arguments = [argument for tag in self.tags for argument in ("-t", tag)]
+            result = yield self.context.command(
+                ["docker", "build", "--label", f"{self.FINGERPRINT_LABEL}={self.fingerprint}", *tag_arguments, "."])
             if result.returncode != 0:
                 raise RuntimeError(f"Docker build failed: {result.stderr}")
-            self._build = self.tag
+        self._build = self.tag
+
+    def publish_steps(self, registry=None):
+        """Pushes the Docker image to registry.
 
-    def publish(self, registry=None):
-        """Pushes the Docker image to registry."""
+        Every tag of the tag policy is pushed on its own, so older local tags of the repository are never pushed. The
+        layers are only uploaded by the first push, the next pushes only upload the manifest.
+        """
         if not self._build:
             raise RuntimeError("Must build before publishing")
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            result = subprocess.run(
-                ["docker", "push", self._build],
-                capture_output=True,
-                text=True
-            )
+        for tag in self.tags or [self._build]:
+            result = yield self.context.command(["docker", "push", tag])
             if result.returncode != 0:
                 raise RuntimeError(f"Docker push failed: {result.stderr}")
+            if tag == self._build:
+                self._digest = self.__get_pushed_digest(result.stdout, tag)
+
+    def __get_pushed_digest(self, output, tag: str) -> str | None:
+        """Gets the digest docker push printed for a tag, e.g. 1.2.0: digest: sha256:... size: 1570"""
+        if not isinstance(output, str):
+            return None
+        name = re.escape(tag.rsplit(":", 1)[-1])
+        match = re.search(rf"^\s*{name}: {self.DIGEST_REGEX.pattern}", output, re.M) or self.DIGEST_REGEX.search(output)
+        return match.group("digest") if match else None
+
+    def promote(self, source_registry: str, version: str | None = None):
+        """Copies the image for a version from another registry to the registry of this file without rebuilding it.
+
+        The images of the machine running the promotion aren't looked at, it usually never built them.
+
+        Args:
+            source_registry: registry the image was previously published to, e.g. a staging registry.
+            version: version of the image to promote. Defaults to the newest semantic version in the source registry.
+        """
+        if not self.registry or not self.package:
+            raise RuntimeError("Registry must be set before promoting")
+        if not version:
+            available = self.__sort_semantic_versions(registries.list_tags(f"{source_registry}/{self.package}"))
+            if not available:
+                raise RuntimeError(f"No semantic version of {self.package} found in {source_registry} to promote")
+            version = available[0]
+        self._version = version
+        source = f"{source_registry}/{self.package}:{self.version}"
+        self._digest = registries.promote(source, self.tag)
+        for tag in self.tags[1:]:
+            # The blobs already exist at this point so aliases only upload the manifest
+            registries.promote(source, tag)
+        self._build = self.tag
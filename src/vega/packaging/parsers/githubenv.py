@@ -1,7 +1,7 @@
 """Module for holding the parser for the github env file"""
 import re
 
-from vega.packaging import commits, decorators, versions
+from vega.packaging import commits, decorators, envfiles, transactions, versions
 from vega.packaging.parsers import abstract_parser
 
 
@@ -35,37 +35,35 @@ class GitEnv(abstract_parser.AbstractFileParser):
 
     def create(self):
         """Creates a GitHub env file if it doesn't exist with some default values."""
-        with open(self.path, "w") as handle:
-            handle.write(self.TEMPLATE)
+        self._content = {}
+        transactions.write(self.path, self.TEMPLATE)
 
     def read(self) -> dict:
         """Reads the content of the GitHub env file"""
-        content = {}
-        with open(self.path, "r") as handle:
-            # This code makes the assumption that the first = is the separator for the key value pair of the
-            # GitHub envs
-            for line in handle.readlines():
-                line = line.strip()
-                if line:
-                    key, value = line.split("=", 1)
-                    content[key] = value
-        return content
+        return envfiles.read(self.path)
 
     @decorators.autocreate
     def update(self, commit_message: commits.CommitMessage, semantic_version: versions.SemanticVersion|str):
         """Updates the content of the changelog.md file with data from the commit message.
 
+        Only the values that changed are appended to the file, the GitHub runner uses the last value set for a key.
+        Every value is also set as an output of the current step when running in a workflow, since the outputs of
+        each step start empty.
+
         Args:
             commit_message: The message to update the changelog with.
         """
         super(GitEnv, self).update(commit_message, semantic_version)
 
         # Add semantic version environment variable to the GitHub env
-        self.content["SEMANTIC_VERSION"] = str(self.version)
-        self.content["BUILD"] = ":".join(self.builds)
-        self.content["PUBLISH"] = str(commit_message.publish)
-        self.content["RELEASE"] = str(commit_message.release)
+        values = {"SEMANTIC_VERSION": str(self.version),
+                  "BUILD": ":".join(self.builds),
+                  "PUBLISH": str(commit_message.publish),
+                  "RELEASE": str(commit_message.release)}
+        changes = {key: value for key, value in values.items() if self.content.get(key) != value}
+        self.content.update(changes)
 
         # Update the file
-        with open(self.path, "w") as handle:
-            handle.writelines([f"\n{key}={value}" for key, value in self.content.items()])
+        envfiles.write(self.path, changes)
+        if envfiles.output_path():
+            envfiles.write(envfiles.output_path(), values)
@@ -1,12 +1,13 @@
 """Module for holding the code for parsing the pyproject.toml files"""
+import copy
 import os
 import re
-import subprocess
+import urllib.parse
+import urllib.request
 
 import toml
 
-from vega.packaging import commits, decorators, const, versions
-from vega.packaging import contextmanagers
+from vega.packaging import commits, decorators, const, transactions, versions
 from vega.packaging.parsers import abstract_parser
 
 
@@ -23,6 +24,11 @@ class PyProject(abstract_parser.AbstractFileParser):
     PRIORITY = 1
     IS_BUILD_FILE = True
     BUILD_TYPE = const.BuildTypes.PYTHON
+    # Direct references to local directories in PEP 508 requirements, e.g. "api @ file:///repo/api"
+    FILE_REFERENCE_REGEX = re.compile(r"@\s*(file:[^\s;]+)")
+    # PEP 508 requirement split into the name with its extras, the version specifier and the url or markers
+    REQUIREMENT_REGEX = re.compile(r"^(?P<name>\s*(?P<package>[A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*)"
+                                   r"(?P<specifier>[^;@]*)(?P<rest>.*)$", re.S)
 
     @property
     def version(self) -> str:
@@ -31,6 +37,14 @@ class PyProject(abstract_parser.AbstractFileParser):
             self._version = versions.SemanticVersion(self.content.get("project", {}).get("version", self.DEFAULT_VERSION))
         return self._version
 
+    def read_version(self) -> str:
+        """Reads the version of the project table without parsing the rest of the file"""
+        if self._version is None and self._content is None and self.exists:
+            version = versions.read_toml_version(self.path, "project")
+            if version is not None:
+                return version
+        return super(PyProject, self).read_version()
+
     @property
     def content(self) -> dict:
         """The contents of this pyproject.toml file"""
@@ -40,17 +54,84 @@ class PyProject(abstract_parser.AbstractFileParser):
     def package(self) -> str: 
         """ The name of the package that this file defines if it is file that defines a package build"""
         if not self._package:
-            self._package = self.read()["project"]["name"] 
+            self._package = self.content["project"]["name"]
         return self._package
     
+    @property
+    def local_dependencies(self) -> list[str]:
+        """Paths of the uv and poetry path sources and of the file references of the requirements"""
+        content = self.content
+        tool = content.get("tool", {})
+        sources = list(tool.get("uv", {}).get("sources", {}).values())
+        poetry = tool.get("poetry", {})
+        sources.extend(poetry.get("dependencies", {}).values())
+        for group in poetry.get("group", {}).values():
+            sources.extend(group.get("dependencies", {}).values())
+
+        paths = [source["path"] for source in sources if isinstance(source, dict) and source.get("path")]
+        project = content.get("project", {})
+        requirements = list(project.get("dependencies", []))
+        for extra in project.get("optional-dependencies", {}).values():
+            requirements.extend(extra)
+        for requirement in requirements:
+            match = self.FILE_REFERENCE_REGEX.search(requirement)
+            if match:
+                paths.append(urllib.request.url2pathname(urllib.parse.urlparse(match.group(1)).path))
+        return [self.context.resolve(path) for path in paths]
+
+    @property
+    def workspace_dependencies(self) -> list[str]:
+        """Names of the uv sources that come from the workspace"""
+        sources = self.content.get("tool", {}).get("uv", {}).get("sources", {})
+        return [name for name, source in sources.items() if isinstance(source, dict) and source.get("workspace")]
+
+    def pin_dependency(self, name: str, version: str) -> bool:
+        """Sets the version of the requirements and poetry dependencies on the package"""
+        name = self.normalize_package_name(name)
+        pinned = False
+        project = self.content.get("project", {})
+        for requirements in [project.get("dependencies", []), *project.get("optional-dependencies", {}).values()]:
+            for index, requirement in enumerate(requirements):
+                match = self.REQUIREMENT_REGEX.match(requirement)
+                if not match or self.normalize_package_name(match.group("package")) != name:
+                    continue
+                specifier = versions.replace_version(match.group("specifier"), version)
+                if specifier is not None and specifier != match.group("specifier"):
+                    requirements[index] = f"{match.group('name')}{specifier}{match.group('rest')}"
+                    pinned = True
+
+        poetry = self.content.get("tool", {}).get("poetry", {})
+        tables = [poetry.get("dependencies", {})]
+        tables.extend(group.get("dependencies", {}) for group in poetry.get("group", {}).values())
+        for table in tables:
+            for key, dependency in table.items():
+                if self.normalize_package_name(key) != name:
+                    continue
+                if isinstance(dependency, dict) and isinstance(dependency.get("version"), str):
+                    specifier = versions.replace_version(dependency["version"], version)
+                    if specifier is not None and specifier != dependency["version"]:
+                        dependency["version"] = specifier
+                        pinned = True
+                elif isinstance(dependency, str):
+                    specifier = versions.replace_version(dependency, version)
+                    if specifier is not None and specifier != dependency:
+                        table[key] = specifier
+                        pinned = True
+        return pinned
+
+    @classmethod
+    def normalize_package_name(cls, name: str) -> str:
+        """Normalizes the name the way python package indexes do, see PEP 503"""
+        return re.sub(r"[-_.]+", "-", name).lower()
+
     def create(self):
         """Creates a pyproject.toml file with some default values."""
-        content = dict(self.TEMPLATE)
+        content = copy.deepcopy(self.TEMPLATE)
         content["project"]["name"] = os.path.split(os.path.dirname(self.path))[-1]
         content["project"]["version"] = self.DEFAULT_VERSION
-
-        with open(self.path, "w") as handle:
-            toml.dump(content, handle)
+        # The content is kept since the file is only on disk once the transaction exits
+        self._content = content
+        transactions.write(self.path, toml.dumps(content))
 
     def read(self) -> dict:
         """Reads the contents of the pyproject.toml file"""
@@ -69,41 +150,35 @@ class PyProject(abstract_parser.AbstractFileParser):
         self.content["project"]["version"] = str(self.version)
 
         # Update the file
-        with open(self.path, "w") as handle:
-            toml.dump(self.content, handle)
+        transactions.write(self.path, toml.dumps(self.content))
 
-    def build(self, commit_message=None):
+    def build_steps(self, commit_message=None):
         """Builds the Python package."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            result = subprocess.run(
-                ["uv", "run", "--with", "build", "--with", "setuptools>=61.0", "python", "-m", "build", "--no-isolation"],
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
-                raise RuntimeError(f"Build failed: {result.stderr}")
-            # Find the built wheel in dist/
-            dist_dir = "dist"
-            for filename in os.listdir(dist_dir):
-                if filename.endswith(".whl"):
-                    self._build = os.path.join(dist_dir, filename)
-                    break
-
-    def publish(self, registry=None):
+        result = yield self.context.command(
+            ["uv", "run", "--with", "build", "--with", "setuptools>=61.0", "python", "-m", "build", "--no-isolation"])
+        if result.returncode != 0:
+            raise RuntimeError(f"Build failed: {result.stderr}")
+        # Find the built wheel in dist/
+        dist_dir = "dist"
+        for filename in os.listdir(self.context.resolve(dist_dir)):
+            if filename.endswith(".whl"):
+                self._build = os.path.join(dist_dir, filename)
+                break
+
+    def publish_steps(self, registry=None):
         """Publishes the Python package using twine."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            registry = registry or self._registry
-            if not self._build:
-                raise RuntimeError("Must build before publishing")
-            cmd = ["uv", "run", "--with", "twine", "python", "-m", "twine", "upload"]
-            if registry:
-                cmd.extend(["--repository-url", registry])
-            cmd.append(self._build)
-            result = subprocess.run(cmd, capture_output=True, text=True, env=os.environ.copy())
-            if result.returncode != 0:
-                error_parts = []
-                for part in (result.stderr, result.stdout):
-                    if isinstance(part, str) and part.strip():
-                        error_parts.append(part.strip())
-                error_output = "\n".join(error_parts) if error_parts else "unknown error"
-                raise RuntimeError(f"Publish failed: {error_output}")
+        registry = registry or self._registry
+        if not self._build:
+            raise RuntimeError("Must build before publishing")
+        cmd = ["uv", "run", "--with", "twine", "python", "-m", "twine", "upload"]
+        if registry:
+            cmd.extend(["--repository-url", registry])
+        cmd.append(self._build)
+        result = yield self.context.command(cmd, env=os.environ.copy())
+        if result.returncode != 0:
+            error_parts = []
+            for part in (result.stderr, result.stdout):
+                if isinstance(part, str) and part.strip():
+                    error_parts.append(part.strip())
+            error_output = "\n".join(error_parts) if error_parts else "unknown error"
+            raise RuntimeError(f"Publish failed: {error_output}")
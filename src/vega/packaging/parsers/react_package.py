@@ -1,12 +1,12 @@
 """Module for holding the code for parsing the package.json files of a React Project"""
+import copy
+import fnmatch
 import os
 import re
-import subprocess
 
 import json
 
-from vega.packaging import commits, decorators, const, versions
-from vega.packaging import contextmanagers
+from vega.packaging import commits, decorators, const, factory, transactions, versions
 from vega.packaging.parsers import abstract_parser
 
 
@@ -31,6 +31,11 @@ class ReactPackage(abstract_parser.AbstractFileParser):
     PRIORITY = 1
     IS_BUILD_FILE = True
     BUILD_TYPE = const.BuildTypes.NPM
+    DEPENDENCY_FIELDS = ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies")
+    # Peer dependencies keep their range since they're meant to accept many versions
+    PINNED_FIELDS = ("dependencies", "devDependencies", "optionalDependencies")
+    # Protocols of the dependencies installed from a local directory
+    PATH_PROTOCOLS = ("file:", "link:")
 
     @property
     def version(self) -> str:
@@ -47,12 +52,12 @@ class ReactPackage(abstract_parser.AbstractFileParser):
     def create(self):
         """Creates a package.jso file with some default values."""
         repository_name = os.environ.get("GITHUB_REPOSITORY", os.path.dirname(self.path))
-        content = dict(self.TEMPLATE)
+        content = copy.deepcopy(self.TEMPLATE)
         content["name"] = os.path.basename(repository_name)
         content["version"] = self.DEFAULT_VERSION
-
-        with open(self.path, "w") as handle:
-            json.dump(content, handle, indent=4)
+        # The content is kept since the file is only on disk once the transaction exits
+        self._content = content
+        transactions.write(self.path, json.dumps(content, indent=4))
 
     def read(self) -> dict:
         """Reads the contents of the package.json file"""
@@ -72,39 +77,92 @@ class ReactPackage(abstract_parser.AbstractFileParser):
         self.content["version"] = str(self.version)
 
         # Update the file
-        with open(self.path, "w") as handle:
-            json.dump(self.content, handle)
+        transactions.write(self.path, json.dumps(self.content))
 
     @property
     def package(self) -> str: 
         """ The name of the package that this file defines if it is file that defines a package build"""
         if not self._package:
-            self._package = self.read()["name"] 
+            self._package = self.content["name"]
         return self._package
+
+    @property
+    def dependencies(self) -> dict:
+        """Every dependency of the package with its version specifier"""
+        dependencies = {}
+        for field in self.DEPENDENCY_FIELDS:
+            dependencies.update(self.content.get(field) or {})
+        return dependencies
+
+    @property
+    def local_dependencies(self) -> list[str]:
+        """Paths of the file: and link: dependencies"""
+        paths = []
+        for specifier in self.dependencies.values():
+            if isinstance(specifier, str) and specifier.startswith(self.PATH_PROTOCOLS):
+                path = specifier.split(":", 1)[1]
+                paths.append(self.context.resolve(path))
+        return paths
+
+    @property
+    def workspace_dependencies(self) -> list[str]:
+        """Names of the workspace: dependencies, or of every dependency when the package is a workspace member
+        since npm links the members of a workspace by name"""
+        dependencies = self.dependencies
+        if self.__is_workspace_member():
+            return list(dependencies)
+        return [name for name, specifier in dependencies.items()
+                if isinstance(specifier, str) and specifier.startswith("workspace:")]
+
+    def pin_dependency(self, name: str, version: str) -> bool:
+        """Sets the version range of the dependencies on the package, keeping their range operator"""
+        pinned = False
+        for field in self.PINNED_FIELDS:
+            dependencies = self.content.get(field) or {}
+            specifier = dependencies.get(name)
+            if not isinstance(specifier, str) or specifier.startswith(self.PATH_PROTOCOLS):
+                continue
+            protocol = "workspace:" if specifier.startswith("workspace:") else ""
+            updated = versions.replace_version(specifier[len(protocol):], version)
+            if updated is not None and protocol + updated != specifier:
+                dependencies[name] = protocol + updated
+                pinned = True
+        return pinned
+
+    def __is_workspace_member(self) -> bool:
+        """Is this package listed in the workspaces of a package.json in a parent directory."""
+        directory = self.directory
+        while os.path.dirname(directory) != directory:
+            directory = os.path.dirname(directory)
+            try:
+                # The parser of the manifest is shared with the rest of the run when a session is active
+                manifest = factory.get_parser_from_path(os.path.join(directory, "package.json"))
+                if not manifest or not manifest.exists:
+                    continue
+                workspaces = manifest.content.get("workspaces")
+            except (OSError, ValueError, AttributeError):
+                continue
+            if isinstance(workspaces, dict):
+                workspaces = workspaces.get("packages")
+            if workspaces:
+                relative = os.path.relpath(self.directory, directory).replace(os.path.sep, "/")
+                return any(fnmatch.fnmatch(relative, pattern.rstrip("/").removeprefix("./"))
+                           for pattern in workspaces)
+        return False
     
-    def build(self, commit_message=None):
+    def build_steps(self, commit_message=None):
         """Builds the NPM package."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            result = subprocess.run(
-                ["npm", "run", "build"],
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
-                raise RuntimeError(f"Build failed: {result.stderr}")
-            self._build = "."
-
-    def publish(self, registry=None):
+        result = yield self.context.command(["npm", "run", "build"])
+        if result.returncode != 0:
+            raise RuntimeError(f"Build failed: {result.stderr}")
+        self._build = "."
+
+    def publish_steps(self, registry=None):
         """Publishes the NPM package."""
-        with contextmanagers.WorkingDirectory(self.path, is_file=True):
-            registry = registry or self._registry
-            cmd = ["npm", "publish"]
-            if registry:
-                cmd.extend(["--registry", registry])
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True
-            )
-            if result.returncode != 0:
-                raise RuntimeError(f"Publish failed: {result.stderr}")
\ No newline at end of file
+        registry = registry or self._registry
+        cmd = ["npm", "publish"]
+        if registry:
+            cmd.extend(["--registry", registry])
+        result = yield self.context.command(cmd)
+        if result.returncode != 0:
+            raise RuntimeError(f"Publish failed: {result.stderr}")
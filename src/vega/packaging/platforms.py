@@ -1,37 +1,46 @@
 """Module for platform-specific release providers."""
-import subprocess
-
 from vega.packaging import const
+from vega.packaging import processes
+from vega.packaging import queries
 
 
 class AbstractPlatform:
     def __init__(self, cwd: str):
         self._cwd = cwd
 
-    def create(self, version: str, notes: str, files: list[str] | None = None):
+    def create_steps(self, version: str, notes: str, files: list[str] | None = None):
+        """Yields the processes.Command objects that create a release."""
         raise NotImplementedError
 
+    def create(self, version: str, notes: str, files: list[str] | None = None):
+        return processes.drive(self.create_steps(version, notes, files))
+
+    async def create_async(self, version: str, notes: str, files: list[str] | None = None):
+        return await processes.drive_async(self.create_steps(version, notes, files))
+
     @property
     def last_release(self) -> str | None:
         raise NotImplementedError
 
 
 class Github(AbstractPlatform):
-    def create(self, version: str, notes: str, files: list[str] | None = None):
+    def create_steps(self, version: str, notes: str, files: list[str] | None = None):
         cmd = ["gh", "release", "create", f"v{version}",
                "--title", f"v{version}", "--notes", notes]
         if files:
             cmd.extend(files)
-        result = subprocess.run(cmd, cwd=self._cwd, capture_output=True, text=True)
+        result = yield processes.Command(cmd, cwd=self._cwd)
+        # The new release changes the result of querying the last release
+        queries.invalidate(["gh", "release"], cwd=self._cwd)
         if result.returncode != 0:
             raise RuntimeError(f"Release failed: {result.stderr}")
 
     @property
     def last_release(self) -> str | None:
-        result = subprocess.run(
+        result = queries.run(
             ["gh", "release", "list", "--limit", "1", "--json", "tagName",
              "--jq", ".[0].tagName"],
-            cwd=self._cwd, capture_output=True, text=True
+            cwd=self._cwd, env_keys=("GH_TOKEN", "GITHUB_TOKEN", "GH_REPO", "GH_HOST")
         )
         tag = result.stdout.strip()
         return tag.lstrip("v") if tag else None
@@ -0,0 +1,243 @@
+"""Module for running the toolchain commands of the parsers, either blocking or from an event loop.
+
+Parsers describe their build, publish and release workflows as generators of steps: each step yields a Command and
+receives its CommandResult, so the same workflow can be driven by blocking subprocesses or by asyncio subprocesses.
+
+Usage:
+```
+from vega.packaging import processes
+
+def build_steps():
+    result = yield processes.Command(["npm", "run", "build"], cwd="/path/to/package")
+    if result.returncode != 0:
+        raise RuntimeError(f"Build failed: {result.stderr}")
+
+processes.drive(build_steps())
+asyncio.run(processes.drive_async(build_steps()))
+```
+
+The output of the commands is logged line by line as it's written, and only the last lines of each stream are kept
+for the CommandResult, so a verbose build uses the same amount of memory as a quiet one.
+"""
+import asyncio
+import collections
+import logging
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Number of lines of each stream kept in a CommandResult by default
+TAIL_LINES = 200
+# Longer lines are logged and kept in chunks of this many characters
+MAX_LINE_LENGTH = 64 * 1024
+
+
+class Command:
+    """A command to run and how to run it."""
+
+    def __init__(self, argv: list[str], cwd: str | None = None, env: dict | None = None,
+                 timeout: float | None = None, tail_lines: int | None = TAIL_LINES):
+        """Constructor
+
+        Args:
+            argv: command and arguments to run.
+            cwd: directory to run the command from. Defaults to the current working directory.
+            env: environment of the command. Defaults to the environment of this process.
+            timeout: seconds after which the command is killed.
+            tail_lines: number of lines of each stream to keep in the result, None keeps the whole output for commands
+                whose output is parsed.
+        """
+        self.argv = list(argv)
+        self.cwd = cwd
+        self.env = env
+        self.timeout = timeout
+        self.tail_lines = tail_lines
+
+    def __repr__(self):
+        return f"Command({self.argv!r}, cwd={self.cwd!r})"
+
+
+class CommandResult:
+    """Outcome of a command that ran."""
+
+    def __init__(self, argv: list[str], returncode: int | None, stdout: str = "", stderr: str = "",
+                 duration: float = 0.0, timed_out: bool = False):
+        """Constructor
+
+        Args:
+            argv: command and arguments that ran.
+            returncode: exit code of the command, None if it was killed before exiting on its own.
+            stdout: last lines of the standard output of the command.
+            stderr: last lines of the standard error of the command.
+            duration: seconds the command ran for.
+            timed_out: was the command killed for running longer than its timeout.
+        """
+        self.argv = argv
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+        self.timed_out = timed_out
+
+    @property
+    def ok(self) -> bool:
+        """Did the command exit successfully"""
+        return self.returncode == 0
+
+    def __repr__(self):
+        return f"CommandResult({self.argv!r}, returncode={self.returncode!r}, duration={self.duration:.2f})"
+
+
+def _pump(stream, name: str, lines: collections.deque, on_output=None):
+    """Reads a stream of a process line by line as the process writes it."""
+    with stream:
+        for line in iter(lambda: stream.readline(MAX_LINE_LENGTH), ""):
+            lines.append(line)
+            logger.debug(f"[{name}] {line.rstrip()}")
+            if on_output:
+                on_output(name, line)
+
+
+def run(command: Command, on_output=None) -> CommandResult:
+    """Runs a command and waits for it to finish, streaming its output as it's written.
+
+    Args:
+        command: the command to run.
+        on_output: callable called with the name of the stream ("stdout" or "stderr") and each line of output.
+
+    Returns:
+        CommandResult
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command.argv, cwd=command.cwd, env=command.env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, errors="replace")
+    stdout, stderr = collections.deque(maxlen=command.tail_lines), collections.deque(maxlen=command.tail_lines)
+    readers = [threading.Thread(target=_pump, args=(process.stdout, "stdout", stdout, on_output), daemon=True),
+               threading.Thread(target=_pump, args=(process.stderr, "stderr", stderr, on_output), daemon=True)]
+    for reader in readers:
+        reader.start()
+    timed_out = False
+    try:
+        returncode = process.wait(timeout=command.timeout)
+    except subprocess.TimeoutExpired:
+        logger.warning(f"{command.argv} timed out after {command.timeout} seconds")
+        timed_out = True
+        returncode = None
+        process.kill()
+        process.wait()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        for reader in readers:
+            reader.join()
+    return CommandResult(command.argv, returncode, "".join(stdout), "".join(stderr), time.perf_counter() - start,
+                         timed_out=timed_out)
+
+
+async def _read_lines(stream: asyncio.StreamReader, name: str, lines: collections.deque, on_output=None):
+    """Reads a stream of a process line by line as the process writes it."""
+    while True:
+        try:
+            line = await stream.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            # The last line of the stream doesn't end with a new line
+            line = error.partial
+        except asyncio.LimitOverrunError as error:
+            line = await stream.read(error.consumed)
+        if not line:
+            break
+        text = line.decode("utf-8", errors="replace")
+        lines.append(text)
+        logger.debug(f"[{name}] {text.rstrip()}")
+        if on_output:
+            on_output(name, text)
+
+
+async def run_async(command: Command, on_output=None) -> CommandResult:
+    """Runs a command from an event loop, streaming its output as it's written.
+
+    The process is killed if it runs longer than the timeout of the command or if the awaiting task is cancelled.
+
+    Args:
+        command: the command to run.
+        on_output: callable called with the name of the stream ("stdout" or "stderr") and each line of output.
+
+    Returns:
+        CommandResult
+    """
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(*command.argv, cwd=command.cwd, env=command.env,
+                                                   stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                                                   limit=MAX_LINE_LENGTH)
+    stdout, stderr = collections.deque(maxlen=command.tail_lines), collections.deque(maxlen=command.tail_lines)
+    readers = asyncio.gather(_read_lines(process.stdout, "stdout", stdout, on_output),
+                             _read_lines(process.stderr, "stderr", stderr, on_output))
+    timed_out = False
+    try:
+        await asyncio.wait_for(asyncio.shield(readers), timeout=command.timeout)
+        returncode = await process.wait()
+    except asyncio.TimeoutError:
+        timed_out = True
+        returncode = None
+    except asyncio.CancelledError:
+        await _kill(process, readers)
+        raise
+    if timed_out:
+        logger.warning(f"{command.argv} timed out after {command.timeout} seconds")
+        await _kill(process, readers)
+    return CommandResult(command.argv, returncode, "".join(stdout), "".join(stderr), time.perf_counter() - start,
+                         timed_out=timed_out)
+
+
+async def _kill(process: asyncio.subprocess.Process, readers: asyncio.Future):
+    """Kills a process and waits for its output streams to close."""
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+    try:
+        await readers
+    except Exception:
+        pass
+
+
+def drive(steps, on_output=None):
+    """Runs every command yielded by a generator of steps, sending each result back to it.
+
+    Args:
+        steps: generator that yields Command objects.
+        on_output: callable called with the name of the stream and each line of output of the commands.
+
+    Returns:
+        The value returned by the generator.
+    """
+    try:
+        command = next(steps)
+        while True:
+            command = steps.send(run(command, on_output))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def drive_async(steps, on_output=None):
+    """Runs every command yielded by a generator of steps from an event loop, sending each result back to it.
+
+    Args:
+        steps: generator that yields Command objects.
+        on_output: callable called with the name of the stream and each line of output of the commands.
+
+    Returns:
+        The value returned by the generator.
+    """
+    try:
+        command = next(steps)
+        while True:
+            command = steps.send(await run_async(command, on_output))
+    except StopIteration as stop:
+        return stop.value
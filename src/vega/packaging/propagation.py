@@ -0,0 +1,99 @@
+"""Module for propagating version bumps to the local packages that depend on the bumped packages.
+
+When a package is bumped, every local package that depends on it, directly or through other local packages, needs at
+least a patch bump so it gets published with a requirement on the new version. The bumps are planned with a single
+breadth first traversal of the dependents in the PackageGraph, which visits every package and dependency once, and
+every manifest is written once by its update after the requirements of its dependencies are pinned in memory.
+
+Usage:
+```
+from vega.packaging import commits, graph, propagation
+
+packages = graph.PackageGraph(parsers)
+propagation.apply(packages, commits.CommitMessage("#minor #added new endpoint"), [api_parser])
+```
+"""
+import collections
+import logging
+
+from vega.packaging import commits, const, versions
+
+logger = logging.getLogger(__name__)
+
+
+def plan(package_graph, seeds: dict) -> dict:
+    """Finds the minimal bumps of the packages that depend on the bumped packages.
+
+    Args:
+        package_graph: graph.PackageGraph of the local packages.
+        seeds: dict of the parsers being bumped to their const.Versions bump.
+
+    Returns:
+        dict of parsers to the const.Versions bump they need, the seeds keep their own bump and the packages that
+        depend on them get a patch bump.
+    """
+    bumps = {file_parser: bump for file_parser, bump in seeds.items()
+             if bump is not None and file_parser in package_graph}
+    queue = collections.deque(bumps)
+    visited = set(bumps)
+    while queue:
+        for dependent in package_graph.dependents(queue.popleft()):
+            if dependent in visited:
+                continue
+            visited.add(dependent)
+            queue.append(dependent)
+            # Packages without a version, e.g. Dockerfiles, still pass the bump on to the packages depending on them
+            if dependent.HAS_VERSION:
+                bumps[dependent] = const.Versions.PATCH
+    return bumps
+
+
+def apply(package_graph, commit_message: commits.CommitMessage, seeds: list,
+          semantic_version: versions.SemanticVersion | str = None, messages: dict = None) -> dict:
+    """Updates the packages with the commit message and every local package that depends on them with a patch bump.
+
+    Args:
+        package_graph: graph.PackageGraph of the local packages.
+        commit_message: the message to update the seeds with.
+        seeds: parsers of the packages the commit message is for, the ones without a version are left out.
+        semantic_version: version to bump the seeds from instead of their own version.
+        messages: dict of seeds to the message to update them with instead of commit_message, e.g. the messages
+            scoped to each package.
+
+    Returns:
+        dict of the updated parsers to a tuple of their new version and the message they were updated with.
+    """
+    messages = messages or {}
+    seeds = {file_parser: messages.get(file_parser, commit_message) for file_parser in seeds if file_parser.HAS_VERSION}
+    bumps = plan(package_graph, {file_parser: message.semantic_version_bump for file_parser, message in seeds.items()})
+
+    updated = {}
+    for file_parser, bump in bumps.items():
+        base = semantic_version if semantic_version and file_parser in seeds else str(file_parser.version)
+        updated[file_parser] = versions.SemanticVersion(str(base)).bump(bump)
+
+    # Pin the new versions in the content of the dependents, so every file is only written once by its update
+    pinned = {}
+    for file_parser, version in updated.items():
+        try:
+            name = file_parser.package
+        except (KeyError, TypeError):
+            continue
+        for dependent in package_graph.dependents(file_parser):
+            if dependent.pin_dependency(name, version):
+                pinned.setdefault(dependent, []).append(f"{name} {version}")
+
+    results = {}
+    for file_parser in package_graph.parsers:
+        if file_parser not in updated:
+            continue
+        if file_parser in seeds:
+            message = seeds[file_parser]
+            file_parser.update(message, semantic_version)
+        else:
+            dependencies = ", ".join(pinned.get(file_parser, [])) or "local dependencies"
+            message = commits.CommitMessage(f"#patch #changed Updated {dependencies}")
+            file_parser.update(message, None)
+        results[file_parser] = updated[file_parser], message
+        logger.info(f"Updated {file_parser.path} with revision number {file_parser.version}")
+    return results
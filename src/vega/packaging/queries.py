@@ -0,0 +1,154 @@
+"""Module for memoizing idempotent external queries for the duration of a run.
+
+Facts like the root of the git repository, the registries the user is logged into or the last release of a project
+don't change while the cli commands run, so the subprocesses and files used to resolve them are only queried once
+and shared by every parser.
+
+Usage:
+```
+from vega.packaging import queries
+
+result = queries.run(["git", "rev-parse", "--show-toplevel"], cwd="/path/to/repo")
+result = queries.run(["git", "rev-parse", "--show-toplevel"], cwd="/path/to/repo")  # served from memory
+queries.invalidate(["git"])
+print(queries.stats())  # {"hits": 1, "misses": 1, "entries": 0}
+```
+"""
+import json
+import logging
+import os
+import subprocess
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """Cache of the results of idempotent external commands and files."""
+
+    def __init__(self):
+        """Constructor"""
+        self.__results = {}
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    @staticmethod
+    def key(argv: list[str], cwd: str | None = None, env_keys: tuple = ()) -> tuple:
+        """The key that identifies a query.
+
+        Args:
+            argv: command and arguments of the query.
+            cwd: directory the query runs from. Defaults to the current working directory.
+            env_keys: names of the environment variables that change the result of the query.
+
+        Returns:
+            tuple
+        """
+        cwd = os.path.abspath(cwd or os.getcwd())
+        env = tuple((name, os.environ.get(name)) for name in sorted(env_keys))
+        return tuple(argv), cwd, env
+
+    def __get(self, key, resolve):
+        """Gets the cached value for the key or resolves and stores it."""
+        with self.__lock:
+            if key in self.__results:
+                self.__hits += 1
+                return self.__results[key]
+        value = resolve()
+        with self.__lock:
+            self.__misses += 1
+            self.__results[key] = value
+        return value
+
+    def run(self, argv: list[str], cwd: str | None = None, env_keys: tuple = ()) -> subprocess.CompletedProcess:
+        """Runs the command unless it was already ran with the same arguments, directory and environment.
+
+        Args:
+            argv: command and arguments to run.
+            cwd: directory to run the command from. Defaults to the current working directory.
+            env_keys: names of the environment variables that change the output of the command.
+
+        Returns:
+            subprocess.CompletedProcess
+        """
+        key = self.key(argv, cwd, env_keys)
+        return self.__get(key, lambda: subprocess.run(list(argv), cwd=key[1], capture_output=True, text=True))
+
+    def read_json(self, path: str):
+        """Reads a json file unless it was already read and hasn't changed on disk since.
+
+        Args:
+            path: path to the json file.
+
+        Returns:
+            The parsed json data, or None if the file doesn't exist.
+        """
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        def read():
+            with open(path, "r", encoding="utf-8") as handle:
+                return json.load(handle)
+
+        # Keying by the stat values revalidates the cached data if the file is modified
+        key = ("read_json", path), os.path.dirname(path), (("mtime_ns", stat.st_mtime_ns), ("size", stat.st_size))
+        return self.__get(key, read)
+
+    def invalidate(self, argv: list[str] | None = None, cwd: str | None = None):
+        """Removes cached results so they get queried again.
+
+        Args:
+            argv: only remove the queries whose command starts with these arguments. Removes everything when None.
+            cwd: only remove the queries that ran from this directory.
+        """
+        prefix = tuple(argv or [])
+        cwd = os.path.abspath(cwd) if cwd else None
+        with self.__lock:
+            for key in list(self.__results):
+                if key[0][:len(prefix)] == prefix and (cwd is None or key[1] == cwd):
+                    del self.__results[key]
+
+    def clear(self):
+        """Removes every cached result and resets the statistics."""
+        with self.__lock:
+            self.__results.clear()
+            self.__hits = 0
+            self.__misses = 0
+
+    def stats(self) -> dict:
+        """Hit and miss counts of the cache, every hit is an external query that didn't have to run again."""
+        with self.__lock:
+            return {"hits": self.__hits, "misses": self.__misses, "entries": len(self.__results)}
+
+
+# Cache shared by the whole process
+CACHE = QueryCache()
+
+
+def run(argv: list[str], cwd: str | None = None, env_keys: tuple = ()) -> subprocess.CompletedProcess:
+    """Runs a command through the process wide query cache. See QueryCache.run"""
+    return CACHE.run(argv, cwd=cwd, env_keys=env_keys)
+
+
+def read_json(path: str):
+    """Reads a json file through the process wide query cache. See QueryCache.read_json"""
+    return CACHE.read_json(path)
+
+
+def invalidate(argv: list[str] | None = None, cwd: str | None = None):
+    """Removes results from the process wide query cache. See QueryCache.invalidate"""
+    CACHE.invalidate(argv, cwd=cwd)
+
+
+def clear():
+    """Clears the process wide query cache."""
+    CACHE.clear()
+
+
+def stats() -> dict:
+    """Hit and miss counts of the process wide query cache."""
+    return CACHE.stats()
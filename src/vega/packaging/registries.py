@@ -0,0 +1,292 @@
+"""Module for copying images between container registries through the registry HTTP API.
+
+This allows promoting an image that was already built and tested, e.g. from a staging registry to a production
+registry, without rebuilding or pulling it through the docker daemon.
+"""
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from vega.packaging import queries
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_LIST_TYPES = ("application/vnd.oci.image.index.v1+json",
+                       "application/vnd.docker.distribution.manifest.list.v2+json")
+MANIFEST_TYPES = MANIFEST_LIST_TYPES + ("application/vnd.oci.image.manifest.v1+json",
+                                        "application/vnd.docker.distribution.manifest.v2+json")
+INSECURE_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def get_credentials(registry: str) -> str | None:
+    """Gets the base64 encoded basic auth credentials for a registry from the docker config.
+
+    Args:
+        registry: host of the registry, e.g. ghcr.io
+
+    Returns:
+        str or None if the user isn't logged into the registry
+    """
+    config = queries.read_json(os.path.expanduser("~/.docker/config.json")) or {}
+    auths = config.get("auths", {})
+    for key in (registry, f"https://{registry}", f"http://{registry}"):
+        if auths.get(key, {}).get("auth"):
+            return auths[key]["auth"]
+    return None
+
+
+class ImageReference:
+    """Reference to an image in a registry in the registry/repository:tag or registry/repository@digest format."""
+
+    def __init__(self, reference: str):
+        """Constructor
+
+        Args:
+            reference: full image reference including the registry host.
+        """
+        registry, _, remainder = reference.partition("/")
+        if not remainder:
+            raise ValueError(f"{reference} does not include the registry of the image")
+        if "@" in remainder:
+            repository, self.reference = remainder.split("@", 1)
+        elif ":" in remainder.rsplit("/", 1)[-1]:
+            repository, self.reference = remainder.rsplit(":", 1)
+        else:
+            repository, self.reference = remainder, "latest"
+        self.registry = registry
+        self.repository = repository
+
+    def __str__(self):
+        separator = "@" if self.reference.startswith("sha256:") else ":"
+        return f"{self.registry}/{self.repository}{separator}{self.reference}"
+
+
+class RegistryClient:
+    """Minimal client for the parts of the OCI distribution API needed to copy images."""
+
+    def __init__(self, registry: str, credentials: str | None = None, scheme: str | None = None):
+        """Constructor
+
+        Args:
+            registry: host of the registry, e.g. ghcr.io or localhost:5000
+            credentials: base64 encoded basic auth credentials. Defaults to the credentials in the docker config.
+            scheme: http or https. Defaults to http for local registries and https for everything else.
+        """
+        self.registry = registry
+        self.__credentials = credentials or get_credentials(registry)
+        host = urllib.parse.urlsplit(f"//{registry}").hostname
+        self.__base_url = f"{scheme or ('http' if host in INSECURE_HOSTS else 'https')}://{registry}"
+        self.__tokens = {}
+        self.__authorizations = {}
+
+    def __authorization(self, challenge: str, scope: str | None) -> str | None:
+        """Resolves the authorization header for a WWW-Authenticate challenge."""
+        if challenge.lower().startswith("basic"):
+            return f"Basic {self.__credentials}" if self.__credentials else None
+        if not challenge.lower().startswith("bearer"):
+            return None
+
+        parameters = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+        if scope:
+            parameters["scope"] = scope
+        key = (parameters.get("realm"), parameters.get("service"), parameters.get("scope"))
+        if key not in self.__tokens:
+            query = urllib.parse.urlencode({name: value for name, value in parameters.items() if name != "realm"})
+            request = urllib.request.Request(f"{parameters['realm']}?{query}")
+            if self.__credentials:
+                request.add_header("Authorization", f"Basic {self.__credentials}")
+            with urllib.request.urlopen(request) as response:
+                token = json.load(response)
+            self.__tokens[key] = f"Bearer {token.get('token') or token.get('access_token')}"
+        return self.__tokens[key]
+
+    def request(self, method: str, path: str, scope: str | None = None, data=None, headers: dict | None = None,
+                expected: tuple = (200,)):
+        """Sends a request to the registry, authenticating when the registry asks for it.
+
+        Args:
+            method: http method
+            path: path of the url, or a full url as returned in Location headers
+            scope: token scope to request if the registry uses bearer tokens.
+            data: bytes or file-like object to send
+            headers: extra headers for the request
+            expected: status codes that are considered successful
+
+        Returns:
+            http.client.HTTPResponse, or None for 404 responses when 404 is expected
+        """
+        url = path if path.startswith("http") else urllib.parse.urljoin(self.__base_url, path)
+        authorization = self.__authorizations.get(scope)
+        for _ in range(2):
+            request = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+            if authorization:
+                # Unredirected so that credentials aren't forwarded to blob storage redirects
+                request.add_unredirected_header("Authorization", authorization)
+            try:
+                response = urllib.request.urlopen(request)
+            except urllib.error.HTTPError as error:
+                challenge = error.headers.get("WWW-Authenticate")
+                if error.code == 401 and challenge and not authorization:
+                    authorization = self.__authorization(challenge, scope)
+                    if authorization:
+                        self.__authorizations[scope] = authorization
+                        continue
+                if error.code in expected:
+                    return None
+                raise RuntimeError(f"Registry request failed: {method} {url} returned {error.code}: {error.read()!r}")
+            if response.status not in expected:
+                raise RuntimeError(f"Registry request failed: {method} {url} returned {response.status}")
+            return response
+        raise RuntimeError(f"Registry request failed: {method} {url} is not authorized")
+
+    def get_manifest(self, repository: str, reference: str) -> tuple[bytes, str, str]:
+        """Gets the manifest of an image.
+
+        Returns:
+            tuple of the manifest body, its media type and its digest
+        """
+        with self.request("GET", f"/v2/{repository}/manifests/{reference}", scope=f"repository:{repository}:pull",
+                          headers={"Accept": ", ".join(MANIFEST_TYPES)}) as response:
+            body = response.read()
+            media_type = response.headers.get("Content-Type", "").split(";")[0]
+            digest = response.headers.get("Docker-Content-Digest") or f"sha256:{hashlib.sha256(body).hexdigest()}"
+        return body, json.loads(body).get("mediaType") or media_type, digest
+
+    def put_manifest(self, repository: str, reference: str, body: bytes, media_type: str):
+        """Uploads a manifest to the registry under the given tag or digest."""
+        response = self.request("PUT", f"/v2/{repository}/manifests/{reference}", data=body,
+                                scope=f"repository:{repository}:pull,push",
+                                headers={"Content-Type": media_type}, expected=(200, 201, 202))
+        response.close()
+
+    def has_blob(self, repository: str, digest: str) -> bool:
+        """Checks if the blob already exists in the repository."""
+        response = self.request("HEAD", f"/v2/{repository}/blobs/{digest}", scope=f"repository:{repository}:pull",
+                                expected=(200, 404))
+        if response is None:
+            return False
+        response.close()
+        return True
+
+    def mount_blob(self, repository: str, digest: str, source_repository: str) -> bool:
+        """Mounts a blob from another repository of this registry without uploading it.
+
+        Returns:
+            bool: True if the blob was mounted, False if the registry requires the blob to be uploaded.
+        """
+        query = urllib.parse.urlencode({"mount": digest, "from": source_repository})
+        response = self.request("POST", f"/v2/{repository}/blobs/uploads/?{query}", data=b"",
+                                scope=f"repository:{repository}:pull,push repository:{source_repository}:pull",
+                                expected=(201, 202))
+        response.close()
+        return response.status == 201
+
+    def get_blob(self, repository: str, digest: str):
+        """Opens a stream to download a blob from the registry."""
+        return self.request("GET", f"/v2/{repository}/blobs/{digest}", scope=f"repository:{repository}:pull")
+
+    def upload_blob(self, repository: str, digest: str, stream, size: int):
+        """Uploads a blob to the registry in a single request."""
+        scope = f"repository:{repository}:pull,push"
+        response = self.request("POST", f"/v2/{repository}/blobs/uploads/", data=b"", scope=scope, expected=(202,))
+        location = urllib.parse.urljoin(response.url, response.headers["Location"])
+        response.close()
+        separator = "&" if "?" in location else "?"
+        response = self.request("PUT", f"{location}{separator}digest={urllib.parse.quote(digest)}", data=stream,
+                                scope=scope, expected=(201,),
+                                headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)})
+        response.close()
+
+    def list_tags(self, repository: str) -> list[str]:
+        """Lists the tags of a repository, following the pages of the registry."""
+        tags = []
+        path = f"/v2/{repository}/tags/list"
+        while path:
+            response = self.request("GET", path, scope=f"repository:{repository}:pull", expected=(200, 404))
+            if response is None:
+                break
+            with response:
+                tags.extend(json.load(response).get("tags") or [])
+                link = re.match(r"\s*<(?P<url>[^>]+)>\s*;\s*rel=\"?next\"?", response.headers.get("Link") or "")
+            path = urllib.parse.urljoin(response.url, link.group("url")) if link else None
+        return tags
+
+
+def list_tags(repository: str, client: RegistryClient | None = None) -> list[str]:
+    """Lists the tags of an image repository.
+
+    Args:
+        repository: repository including the registry host, e.g. registry-staging.example.com/app
+        client: client to use for the registry.
+
+    Returns:
+        list[str], empty if the repository doesn't exist
+    """
+    reference = ImageReference(repository)
+    client = client or RegistryClient(reference.registry)
+    return client.list_tags(reference.repository)
+
+
+def promote(source: str, target: str, max_workers: int = 4,
+            source_client: RegistryClient | None = None, target_client: RegistryClient | None = None) -> str:
+    """Copies an image and all of its platforms from one registry to another without rebuilding it.
+
+    Blobs that already exist in the target repository are skipped, blobs that live in another repository of the
+    same registry are mounted and the remaining blobs are streamed from the source concurrently.
+
+    Args:
+        source: full reference of the image to copy, e.g. registry-staging.example.com/app:1.0.0
+        target: full reference to copy the image to, e.g. registry.example.com/app:1.0.0
+        max_workers: number of blobs to upload at the same time.
+        source_client: client to use for the source registry.
+        target_client: client to use for the target registry.
+
+    Returns:
+        str: digest of the promoted manifest
+    """
+    source, target = ImageReference(source), ImageReference(target)
+    source_client = source_client or RegistryClient(source.registry)
+    if target_client is None:
+        target_client = source_client if target.registry == source.registry else RegistryClient(target.registry)
+    same_registry = source.registry == target.registry
+
+    # Resolve every manifest that makes up the image, multi-platform images have one manifest per platform
+    body, media_type, digest = source_client.get_manifest(source.repository, source.reference)
+    manifests = []
+    blobs = {}
+    for child in json.loads(body).get("manifests", []) if media_type in MANIFEST_LIST_TYPES else []:
+        child_body, child_type, child_digest = source_client.get_manifest(source.repository, child["digest"])
+        manifests.append((child_body, child_type, child_digest))
+    for manifest_body, _, _ in manifests or [(body, media_type, digest)]:
+        manifest = json.loads(manifest_body)
+        for descriptor in [manifest.get("config")] + manifest.get("layers", []):
+            if descriptor:
+                blobs[descriptor["digest"]] = descriptor.get("size", 0)
+
+    def copy_blob(blob_digest, size):
+        if target_client.has_blob(target.repository, blob_digest):
+            return "exists"
+        if same_registry and target_client.mount_blob(target.repository, blob_digest, source.repository):
+            return "mounted"
+        with source_client.get_blob(source.repository, blob_digest) as stream:
+            target_client.upload_blob(target.repository, blob_digest, stream,
+                                      int(stream.headers.get("Content-Length") or size))
+        return "uploaded"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(copy_blob, blob_digest, size): blob_digest for blob_digest, size in blobs.items()}
+        for future in concurrent.futures.as_completed(futures):
+            logger.debug(f"Blob {futures[future]} {future.result()} in {target.registry}/{target.repository}")
+
+    # Child manifests must exist before the index that references them
+    for child_body, child_type, child_digest in manifests:
+        target_client.put_manifest(target.repository, child_digest, child_body, child_type)
+    target_client.put_manifest(target.repository, target.reference, body, media_type)
+    logger.info(f"Promoted {source} to {target} ({digest})")
+    return digest
@@ -0,0 +1,255 @@
+"""Module for running the build, publish and release tasks of many packages concurrently.
+
+Tasks form a directed acyclic graph: a task starts once every task it depends on succeeded, as long as the global
+job limit and the limit of its resource, e.g. its BuildTypes, allow it. Stages can be connected with bounded queues
+so that a producer, e.g. a build, only starts while there is room for its output until a consumer, e.g. a publish,
+takes it.
+
+Usage:
+```
+from vega.packaging import const, scheduler
+
+jobs = scheduler.Scheduler(max_workers=4, limits={const.BuildTypes.DOCKER: 1}, queues={"publish": 2})
+jobs.add("build api", api_parser.build, resource=const.BuildTypes.PYTHON, produces="publish")
+jobs.add("publish api", api_parser.publish, dependencies=["build api"], consumes="publish")
+summary = jobs.run()
+print(summary)
+```
+"""
+import concurrent.futures
+import enum
+import logging
+import threading
+import time
+
+from vega.packaging import sessions
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStates(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    SKIPPED = "skipped"
+
+
+class Task:
+    """A unit of work of the scheduler."""
+
+    def __init__(self, name: str, function, dependencies: tuple = (), resource=None, produces: str | None = None,
+                 consumes: str | None = None):
+        """Constructor
+
+        Args:
+            name: unique name of the task.
+            function: callable that does the work, it's called without arguments.
+            dependencies: names of the tasks that must succeed before this task starts.
+            resource: key of the limit this task counts towards, e.g. a BuildTypes enum.
+            produces: name of the queue this task puts its output in.
+            consumes: name of the queue this task takes the output of its dependencies from.
+        """
+        self.name = name
+        self.function = function
+        self.dependencies = tuple(dependencies)
+        self.resource = resource
+        self.produces = produces
+        self.consumes = consumes
+        self.state = TaskStates.PENDING
+        self.result = None
+        self.error = None
+        self.duration = 0.0
+
+    def __repr__(self):
+        return f"Task({self.name!r}, {self.state.value})"
+
+
+class Summary:
+    """Outcome of every task of a run, in the order the tasks were added."""
+
+    def __init__(self, tasks: list[Task]):
+        """Constructor"""
+        self.tasks = list(tasks)
+
+    @property
+    def succeeded(self) -> bool:
+        """Did every task succeed"""
+        return all(task.state == TaskStates.SUCCESS for task in self.tasks)
+
+    @property
+    def failed(self) -> list[Task]:
+        """The tasks that raised an error"""
+        return [task for task in self.tasks if task.state == TaskStates.FAILED]
+
+    def raise_for_failures(self):
+        """Raises the error of the first failed task, in the order the tasks were added."""
+        for task in self.failed:
+            raise task.error
+
+    def __str__(self):
+        lines = []
+        for task in self.tasks:
+            line = f"{task.name}: {task.state.value}"
+            if task.state in (TaskStates.SUCCESS, TaskStates.FAILED):
+                line += f" in {task.duration:.2f}s"
+            if task.error is not None:
+                line += f" ({task.error})"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class Scheduler:
+    """Runs a graph of tasks on a thread pool with a global limit and per resource limits."""
+
+    def __init__(self, max_workers: int = 4, limits: dict | None = None, fail_fast: bool = True,
+                 queues: dict | None = None):
+        """Constructor
+
+        Args:
+            max_workers: number of tasks that can run at the same time.
+            limits: number of tasks of each resource that can run at the same time, e.g. {BuildTypes.DOCKER: 1}
+            fail_fast: stop starting new tasks and cancel the queued ones as soon as a task fails.
+            queues: number of outputs each queue between stages can hold, e.g. {"publish": 2}. A producer holds its
+                place in the queue from the moment it starts until every consumer of its output finished.
+        """
+        self.max_workers = max(1, max_workers or 1)
+        self.limits = dict(limits or {})
+        self.queues = dict(queues or {})
+        self.fail_fast = fail_fast
+        self.cancelled = threading.Event()
+        self.__tasks = {}
+
+    @property
+    def tasks(self) -> list[Task]:
+        """Tasks in the order they were added"""
+        return list(self.__tasks.values())
+
+    def add(self, name: str, function, dependencies: tuple = (), resource=None, produces: str | None = None,
+            consumes: str | None = None) -> Task:
+        """Adds a task to run.
+
+        Args:
+            name: unique name of the task.
+            function: callable that does the work, it's called without arguments.
+            dependencies: names of previously added tasks that must succeed before this task starts.
+            resource: key of the limit this task counts towards.
+            produces: name of the queue this task puts its output in.
+            consumes: name of the queue this task takes the output of its dependencies from.
+
+        Returns:
+            Task
+        """
+        for queue in filter(None, (produces, consumes)):
+            if queue not in self.queues:
+                raise ValueError(f"{name} uses the undeclared queue {queue}")
+        if name in self.__tasks:
+            raise ValueError(f"A task named {name} was already added")
+        missing = [dependency for dependency in dependencies if dependency not in self.__tasks]
+        if missing:
+            raise ValueError(f"{name} depends on unknown tasks: {', '.join(missing)}")
+        task = Task(name, function, dependencies, resource, produces=produces, consumes=consumes)
+        self.__tasks[name] = task
+        return task
+
+    def __run_task(self, task: Task):
+        """Runs a task on a worker thread, recording its outcome."""
+        start = time.perf_counter()
+        try:
+            task.result = task.function()
+            task.state = TaskStates.SUCCESS
+        except Exception as error:
+            task.error = error
+            task.state = TaskStates.FAILED
+        task.duration = time.perf_counter() - start
+        return task
+
+    def __cancel(self, pending: list[Task], futures: dict):
+        """Stops the queued work after a failure."""
+        self.cancelled.set()
+        for future, task in futures.items():
+            if future.cancel():
+                task.state = TaskStates.CANCELLED
+        for task in pending:
+            task.state = TaskStates.CANCELLED
+
+    def run(self) -> Summary:
+        """Runs every task and waits for them to finish.
+
+        Tasks whose dependencies failed or were skipped are skipped. Tasks are started in the order they were added
+        whenever they are ready, so runs with the same graph start the same tasks in the same order.
+
+        Returns:
+            Summary
+        """
+        pending = [task for task in self.__tasks.values() if task.state == TaskStates.PENDING]
+        running = {}
+        usage = {}
+        # Names of the producers holding a place in each queue and the tasks that consume their output
+        queued = {queue: set() for queue in self.queues}
+        consumers = {}
+        for task in pending:
+            for dependency in task.dependencies if task.consumes else ():
+                if self.__tasks[dependency].produces == task.consumes:
+                    consumers.setdefault(dependency, []).append(task)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Skip the tasks that can never run, repeating until dependents of dependents are skipped too
+                changed = True
+                while changed:
+                    changed = False
+                    for task in list(pending):
+                        states = [self.__tasks[dependency].state for dependency in task.dependencies]
+                        if any(state in (TaskStates.FAILED, TaskStates.SKIPPED, TaskStates.CANCELLED)
+                               for state in states):
+                            task.state = TaskStates.SKIPPED
+                            pending.remove(task)
+                            changed = True
+
+                # Free the places in the queues whose output every consumer is done with
+                for producers in queued.values():
+                    for name in list(producers):
+                        if self.__tasks[name].state != TaskStates.RUNNING and all(
+                                task.state not in (TaskStates.PENDING, TaskStates.RUNNING)
+                                for task in consumers.get(name, [])):
+                            producers.discard(name)
+
+                for task in list(pending):
+                    if len(running) >= self.max_workers:
+                        break
+                    if any(self.__tasks[dependency].state != TaskStates.SUCCESS for dependency in task.dependencies):
+                        continue
+                    limit = self.limits.get(task.resource)
+                    if limit is not None and usage.get(task.resource, 0) >= limit:
+                        continue
+                    if task.produces and len(queued[task.produces]) >= self.queues[task.produces]:
+                        continue
+                    if task.produces:
+                        queued[task.produces].add(task.name)
+                    pending.remove(task)
+                    task.state = TaskStates.RUNNING
+                    usage[task.resource] = usage.get(task.resource, 0) + 1
+                    logger.info(f"Starting {task.name}")
+                    # Tasks look up the parsers of other files in the session of the caller
+                    running[executor.submit(sessions.bind(self.__run_task), task)] = task
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Tasks depend on each other: {', '.join(t.name for t in pending)}")
+                    break
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    usage[task.resource] -= 1
+                    logger.debug(f"Finished {task.name}: {task.state.value}")
+                    if task.state == TaskStates.FAILED and self.fail_fast:
+                        self.__cancel(pending, running)
+                        pending = []
+                        # Cancelled futures never run, so they're done as well
+                        for cancelled in [f for f, t in running.items() if t.state == TaskStates.CANCELLED]:
+                            running.pop(cancelled)
+
+        return Summary(self.__tasks.values())
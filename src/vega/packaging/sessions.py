@@ -0,0 +1,177 @@
+"""Module for sharing the parsers and the parsed files of a run, so every file is parsed at most once.
+
+A session is an identity map of the parsers of a run: while it's active, factory.get_parser_from_path returns the
+same parser for the same path. The parsed content of the files is also cached for every parser, and reused for as
+long as the modification time, size and inode of the file stay the same.
+
+The active session is kept in a context variable, so a session opened on one thread isn't seen by the others. Work
+handed to a pool of threads is wrapped with bind to run in the session of the thread that handed it over.
+
+Usage:
+```
+from vega.packaging import factory, sessions
+
+with sessions.Session():
+    file_parser = factory.get_parser_from_path("pyproject.toml")
+    assert file_parser is factory.get_parser_from_path("./pyproject.toml")
+```
+"""
+import collections
+import contextvars
+import copy
+import functools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Number of parsed files kept by the content cache
+MAX_CONTENTS = 4096
+# Files modified more recently than this are not cached, a change within the resolution of the modification time of
+# the file system could otherwise keep the same size and time and go unnoticed
+RACY_NANOSECONDS = 2 * 10 ** 9
+
+
+def signature(path: str) -> tuple | None:
+    """Identifies the state of the file on disk, None if the file doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class ContentCache:
+    """Parsed content of files, reused until the file changes on disk.
+
+    Parsers change their content in memory before writing it, so every read gets its own copy of the cached content.
+    Files that were just modified aren't cached until their modification time is far enough in the past to tell apart
+    from a later change.
+    """
+
+    def __init__(self, max_entries: int = MAX_CONTENTS):
+        """Constructor
+
+        Args:
+            max_entries: number of files to keep, the least recently read files are dropped first.
+        """
+        self.__contents = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path: str, reader, key: str | None = None):
+        """Gets the parsed content of a file, parsing it again if it changed since it was last parsed.
+
+        Args:
+            path: path to the file.
+            reader: callable without arguments that parses the file.
+            key: identifies how the file is parsed. Defaults to the qualified name of the reader.
+
+        Returns:
+            The parsed content.
+        """
+        key = os.path.abspath(path), key or f"{getattr(reader, '__module__', '')}.{getattr(reader, '__qualname__', '')}"
+        state = signature(key[0])
+        with self.__lock:
+            cached = self.__contents.get(key)
+            if state is not None and cached and cached[0] == state:
+                self.hits += 1
+                self.__contents.move_to_end(key)
+                return copy.deepcopy(cached[1])
+        content = reader()
+        with self.__lock:
+            self.misses += 1
+            if state is not None and time.time_ns() - state[0] > RACY_NANOSECONDS:
+                self.__contents[key] = state, copy.deepcopy(content)
+                self.__contents.move_to_end(key)
+                while len(self.__contents) > self.max_entries:
+                    self.__contents.popitem(last=False)
+        return content
+
+    def clear(self):
+        """Removes every cached content and resets the statistics."""
+        with self.__lock:
+            self.__contents.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Hit and miss counts of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.__contents)}
+
+
+CONTENTS = ContentCache()
+_ACTIVE = contextvars.ContextVar("session", default=None)
+
+
+class Session:
+    """Identity map of the parsers of a run."""
+
+    def __init__(self):
+        """Constructor"""
+        self.__parsers = {}
+        self.__lock = threading.Lock()
+        self.__tokens = []
+
+    def get_parser(self, path: str, create):
+        """Gets the parser of the path, creating it the first time the path is seen.
+
+        Args:
+            path: path to the file to parse.
+            create: callable that creates the parser of a path, it may return None for unsupported files.
+
+        Returns:
+            vega.packaging.parser.abstract_parser.AbstractParser or None if the file isn't supported
+        """
+        key = os.path.abspath(path)
+        with self.__lock:
+            if key in self.__parsers:
+                return self.__parsers[key]
+        file_parser = create(path)
+        with self.__lock:
+            # Another thread may have created the parser of the path first
+            return self.__parsers.setdefault(key, file_parser)
+
+    def __len__(self):
+        return len(self.__parsers)
+
+    def __enter__(self):
+        self.__tokens.append(_ACTIVE.set(self))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _ACTIVE.reset(self.__tokens.pop())
+
+
+def current() -> Session | None:
+    """Gets the innermost session active in the current thread or context, None when no session is active."""
+    return _ACTIVE.get()
+
+
+def bind(func):
+    """Wraps a function so it runs in the session active when it was wrapped, e.g. on the threads of a pool.
+
+    Usage:
+    ```
+    executor.map(sessions.bind(load), paths)
+    ```
+    """
+    session = current()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _ACTIVE.set(session)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _ACTIVE.reset(token)
+    return wrapper
+
+
+def read(path: str, reader, key: str | None = None):
+    """Gets the parsed content of a file from the shared content cache. See ContentCache.read"""
+    return CONTENTS.read(path, reader, key)
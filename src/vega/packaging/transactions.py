@@ -0,0 +1,219 @@
+"""Module for writing the files of a run all at once, so a failure never leaves some files updated and others not.
+
+While a transaction is active, the files written by the parsers, including the files they create, are staged in
+memory and the appends to workflow command files are queued. When the outermost transaction exits, every file is
+written to a temporary file next to it and flushed to disk, and the temporary files are renamed over the files. The
+directories are synced once each so the renames are durable too. If anything fails, the files that were already
+replaced are restored from their backups and the appended files are truncated back to their size.
+
+Usage:
+```
+from vega.packaging import transactions
+
+with transactions.transaction():
+    transactions.write("pyproject.toml", content)
+    transactions.write("CHANGELOG.md", changelog)
+# Both files are replaced at once when the transaction exits
+```
+"""
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def sync_file(handle):
+    """Flushes the data of an open file to disk, without its metadata where the platform allows it."""
+    handle.flush()
+    getattr(os, "fdatasync", os.fsync)(handle.fileno())
+
+
+def sync_directory(directory: str):
+    """Makes the renames of the files of a directory durable, not supported on every platform."""
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        # Windows can't open or sync directories
+        pass
+    finally:
+        os.close(descriptor)
+
+
+class FileWriter:
+    """Stages the files written in a transaction and replaces them atomically when the transaction exits."""
+
+    def __init__(self):
+        """Constructor"""
+        self.__writes = {}
+        self.__appends = {}
+        self.__depth = 0
+        self.__lock = threading.RLock()
+
+    @property
+    def active(self) -> bool:
+        """Are writes being held until the end of a transaction"""
+        return self.__depth > 0
+
+    def write(self, path: str, content: str):
+        """Stages the new content of a file, replacing the content staged before."""
+        with self.__lock:
+            self.__writes[os.path.abspath(path)] = content
+
+    def staged(self, path: str) -> bool:
+        """Is a write of the file waiting for the transaction to exit"""
+        with self.__lock:
+            return os.path.abspath(path) in self.__writes
+
+    def append(self, path: str, content: str):
+        """Stages content to append to a file after the content staged before."""
+        with self.__lock:
+            self.__appends.setdefault(os.path.abspath(path), []).append(content)
+
+    def discard(self):
+        """Drops every staged write and append."""
+        with self.__lock:
+            self.__writes, self.__appends = {}, {}
+
+    def commit(self):
+        """Writes every staged file and append, restoring the files that were changed if any of them fails."""
+        with self.__lock:
+            writes, self.__writes = self.__writes, {}
+            appends, self.__appends = self.__appends, {}
+        if not writes and not appends:
+            return
+
+        staged, backups, replaced, appended = {}, [], [], {}
+        try:
+            # The data of every temporary file is on disk before any of them is renamed
+            for path, content in writes.items():
+                staged[path] = self.__stage(path, content)
+
+            for path, temporary in staged.items():
+                backup = None
+                if os.path.exists(path):
+                    backup = f"{temporary}.backup"
+                    try:
+                        os.link(path, backup)
+                    except OSError:
+                        shutil.copy2(path, backup)
+                    backups.append(backup)
+                os.replace(temporary, path)
+                replaced.append((path, backup))
+
+            for path, contents in appends.items():
+                appended[path] = os.path.getsize(path) if os.path.exists(path) else None
+                with open(path, "a", encoding="utf-8") as handle:
+                    handle.write("".join(contents))
+                    sync_file(handle)
+
+            for directory in {os.path.dirname(path) for path in [*staged, *appended]}:
+                sync_directory(directory)
+        except BaseException:
+            logger.error(f"Failed to write {len(writes)} files, restoring {len(replaced)} of them")
+            self.__rollback(replaced, appended)
+            raise
+        finally:
+            for temporary in staged.values():
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temporary)
+            for backup in backups:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(backup)
+        logger.debug(f"Wrote {len(writes)} files and appended to {len(appends)} files")
+
+    @staticmethod
+    def __stage(path: str, content: str) -> str:
+        """Writes the content to a temporary file next to the file and flushes it to disk, keeping the permissions of
+        the file."""
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.",
+                                                 suffix=".tmp")
+        with open(descriptor, "w", encoding="utf-8", newline="") as handle:
+            handle.write(content)
+            sync_file(handle)
+        if os.path.exists(path):
+            shutil.copymode(path, temporary)
+        return temporary
+
+    @staticmethod
+    def __rollback(replaced: list, appended: dict):
+        """Restores the replaced files from their backups and truncates the appended files."""
+        for path, backup in reversed(replaced):
+            try:
+                if backup:
+                    os.replace(backup, path)
+                else:
+                    os.remove(path)
+            except OSError as error:
+                logger.error(f"Failed to restore {path}: {error}")
+        for path, size in appended.items():
+            try:
+                if size is None:
+                    os.remove(path)
+                else:
+                    os.truncate(path, size)
+            except OSError as error:
+                logger.error(f"Failed to restore {path}: {error}")
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Holds every write until the outermost transaction exits, the writes are dropped if it raises."""
+        with self.__lock:
+            self.__depth += 1
+        succeeded = False
+        try:
+            yield self
+            succeeded = True
+        finally:
+            with self.__lock:
+                self.__depth -= 1
+                done = not self.__depth
+            if done and succeeded:
+                self.commit()
+            elif done:
+                self.discard()
+
+
+# Writer shared by the whole process
+WRITER = FileWriter()
+
+
+def write(path: str, content: str):
+    """Replaces the content of a file atomically, or stages it if a transaction is active.
+
+    Args:
+        path: path to the file.
+        content: the new content of the file.
+    """
+    WRITER.write(path, content)
+    if not WRITER.active:
+        WRITER.commit()
+
+
+def staged(path: str) -> bool:
+    """Is a write of the file waiting for the active transaction to exit, e.g. a file created in the transaction"""
+    return WRITER.staged(path)
+
+
+def append(path: str, content: str):
+    """Appends content to a file, or stages it if a transaction is active.
+
+    Args:
+        path: path to the file.
+        content: the content to add at the end of the file.
+    """
+    WRITER.append(path, content)
+    if not WRITER.active:
+        WRITER.commit()
+
+
+def transaction():
+    """Context manager that writes every file written within it to disk at once."""
+    return WRITER.transaction()
@@ -1,7 +1,109 @@
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Clause of a version specifier, e.g. ^1.2.0, >=1.2, <2 or v1.2.0, separated by commas in python and cargo requirements
+# and by spaces in npm ranges
+CLAUSE_REGEX = re.compile(r"(?P<operator>===|==|>=|<=|~=|!=|\^|~|=|>|<)?(?P<space>\s*)(?P<prefix>v?)"
+                          r"(?P<version>\d+(?:\.\d+)*)(?P<suffix>(?:[-+][0-9A-Za-z.-]+)?)(?![\d.*])")
+# Operators of the clauses that cap the versions from above or exclude a version
+UPPER_OPERATORS = ("<", "<=", "!=")
+
+
+def release(version: str) -> tuple[int, ...]:
+    """Numeric parts of the release of a version, e.g. (1, 2, 0) for 1.2.0-rc.1"""
+    return tuple(int(part) for part in re.match(r"\d+(?:\.\d+)*", version).group(0).split("."))
+
+
+def compare(left: str, right: str) -> int:
+    """Compares the releases of 2 versions padding them with zeros, returns -1, 0 or 1"""
+    left, right = release(left), release(right)
+    size = max(len(left), len(right))
+    left, right = left + (0,) * (size - len(left)), right + (0,) * (size - len(right))
+    return (left > right) - (left < right)
+
+
+def next_bound(bound: str, version: str) -> str:
+    """Moves an upper bound above a version keeping what it caps, e.g. <2 becomes <3 and <0.3 becomes <0.4 once the
+    version reaches the bound"""
+    parts = release(bound)
+    position = next((index for index, part in enumerate(parts) if part), len(parts) - 1)
+    new = release(version) + (0,) * len(parts)
+    return ".".join(str(part) for part in [*new[:position], new[position] + 1, *[0] * (len(parts) - position - 1)])
+
+
+def replace_version(specifier: str, version: str) -> str | None:
+    """Replaces the lower bound of a version specifier keeping its operator, e.g. ^1.2.0 becomes ^1.3.0
+
+    An exclusive lower bound becomes inclusive so the version itself is allowed, e.g. >1.0 becomes >=1.3.0, and the
+    upper bounds the version reaches are moved above it, e.g. >=1.0.0,<2 becomes >=2.0.0,<3 for 2.0.0.
+
+    Returns:
+        The new specifier, or None if the specifier has no lower bound, e.g. * or <2, or can't allow the version,
+        e.g. alternatives, wildcards or an excluded version
+    """
+    if specifier.strip() in ("", "*"):
+        return None
+    if "*" in specifier or "||" in specifier or re.search(r"\s-\s", specifier):
+        logger.warning(f"Not pinning {specifier!r} to {version}, wildcards and alternative ranges are not supported")
+        return None
+    clauses = list(CLAUSE_REGEX.finditer(specifier))
+    lower = next((clause for clause in clauses if clause.group("operator") not in UPPER_OPERATORS), None)
+    if lower is None:
+        return None
+
+    replacements = {}
+    for clause in clauses:
+        operator, bound = clause.group("operator") or "", clause.group("version")
+        if clause is lower:
+            operator = ">=" if operator == ">" else operator
+            replacements[clause] = f"{operator}{clause.group('space')}{clause.group('prefix')}{version}"
+        elif operator == "!=" and compare(bound, version) == 0:
+            logger.warning(f"Not pinning {specifier!r} to {version}, the version is excluded")
+            return None
+        elif operator in ("<", "<=") and compare(version, bound) >= (0 if operator == "<" else 1):
+            replacements[clause] = f"<{clause.group('space')}{clause.group('prefix')}{next_bound(bound, version)}"
+        elif operator not in UPPER_OPERATORS:
+            logger.warning(f"Not pinning {specifier!r} to {version}, it has more than one lower bound")
+            return None
+
+    result, position = [], 0
+    for clause, replacement in replacements.items():
+        result.extend([specifier[position:clause.start()], replacement])
+        position = clause.end()
+    return "".join(result) + specifier[position:]
+
+# Header of a toml table or array of tables, e.g. [project] or [[bin]]
+TOML_TABLE_REGEX = re.compile(r"^\s*\[\[?(?P<table>[^\[\]]+)\]\]?\s*(?:#.*)?$")
+# Version key of a toml table set to a plain string, e.g. version = "1.2.0"
+TOML_VERSION_REGEX = re.compile(r"""^\s*version\s*=\s*(?P<quote>["'])(?P<version>[^"']*)(?P=quote)\s*(?:#.*)?$""")
+
+
+def read_toml_version(path: str, table: str) -> str | None:
+    """Reads the version of a table of a toml file line by line, without parsing the rest of the file.
+
+    Args:
+        path: path to the toml file.
+        table: name of the table with the version, e.g. project or package.
+
+    Returns:
+        The version, or None if the table doesn't set it as a plain string, e.g. when it's inherited from a workspace
+    """
+    current = None
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            header = TOML_TABLE_REGEX.match(line)
+            if header:
+                if current == table:
+                    break
+                current = header.group("table").strip()
+            elif current == table:
+                match = TOML_VERSION_REGEX.match(line)
+                if match:
+                    return match.group("version")
+    return None
+
 
 class SemanticVersion:
 
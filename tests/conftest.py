@@ -2,8 +2,14 @@
 
 from __future__ import annotations
 
+import io
 import os
 from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from vega.packaging import queries
 
 
 def _parse_env_line(line: str) -> tuple[str, str] | None:
@@ -47,3 +53,31 @@ def _load_repo_env() -> None:
 def pytest_configure() -> None:
     """Load environment variables before tests are collected or executed."""
     _load_repo_env()
+
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    """Prevent memoized external queries, including mocked ones, from leaking between tests."""
+    queries.clear()
+    yield
+    queries.clear()
+
+
+@pytest.fixture
+def fake_popen():
+    """Creates stand-ins for subprocess.Popen whose processes write the given output and exit with the given code.
+
+    Usage: mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="Build error"))
+    """
+    def create(returncode: int = 0, stdout: str = "", stderr: str = ""):
+        def popen(argv, **kwargs):
+            process = mock.MagicMock(returncode=returncode)
+            process.stdout = io.StringIO(stdout)
+            process.stderr = io.StringIO(stderr)
+            process.wait.return_value = returncode
+            # subprocess.run communicates with the process instead of reading its streams
+            process.communicate.return_value = (stdout, stderr)
+            process.__enter__.return_value = process
+            return process
+        return popen
+    return create
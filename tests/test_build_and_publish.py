@@ -5,15 +5,30 @@ These tests are intended to be ran using pytest and use mocked subprocess calls
 actually running build/publish commands.
 """
 import os
+import re
 import tempfile
 import shutil
 import json
+import hashlib
+import functools
+import asyncio
+import sys
+import subprocess
+import http.server
+import threading
+import time
+import urllib.parse
+import uuid
 from unittest import mock
 
 import pytest
+import toml
 
 from vega.packaging import factory
 from vega.packaging import const
+from vega.packaging import registries
+from vega.packaging import scheduler
+from vega.packaging import processes
 from vega.packaging.bootstrappers import build_and_publish_package
 
 
@@ -107,7 +122,7 @@ def test_build_and_publish_filters_non_build_files(temp_python_project):
 # Tests for PyProject build/publish (mocked subprocess)
 # ============================================================================
 
-def test_pyproject_build_success(temp_python_project):
+def test_pyproject_build_success(temp_python_project, fake_popen):
     """Test PyProject.build() calls subprocess correctly within package directory."""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
     parser = factory.get_parser_from_path(pyproject_path)
@@ -119,57 +134,45 @@ def test_pyproject_build_success(temp_python_project):
     with open(wheel_path, "w") as f:
         f.write("fake wheel")
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.build()
 
         # Verify subprocess was called without cwd (parser handles it internally)
-        mock_run.assert_called_once()
-        call_args = mock_run.call_args
+        mock_popen.assert_called_once()
+        call_args = mock_popen.call_args
         assert call_args[0][0] == [
             "uv", "run", "--with", "build", "--with", "setuptools>=61.0",
             "python", "-m", "build", "--no-isolation"
         ]
-        assert call_args[1]["capture_output"] is True
+        assert call_args[1]["stdout"] == subprocess.PIPE
         assert call_args[1]["text"] is True
 
     # Verify _build was set to the wheel path (relative to package directory)
     assert parser._build == os.path.join("dist", "test_package-0.1.0-py3-none-any.whl")
 
 
-def test_pyproject_build_failure(temp_python_project):
+def test_pyproject_build_failure(temp_python_project, fake_popen):
     """Test PyProject.build() raises RuntimeError on failure"""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
     parser = factory.get_parser_from_path(pyproject_path)
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 1
-    mock_result.stderr = "Build error occurred"
-
-    with mock.patch("subprocess.run", return_value=mock_result):
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="Build error occurred")):
         with pytest.raises(RuntimeError, match="Build failed"):
             parser.build()
 
 
-def test_pyproject_publish_success(temp_python_project):
+def test_pyproject_publish_success(temp_python_project, fake_popen):
     """Test PyProject.publish() calls subprocess correctly"""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
     parser = factory.get_parser_from_path(pyproject_path)
     parser._build = "/path/to/package.whl"
     parser._registry = "https://test.pypi.org/legacy/"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.publish()
 
-        mock_run.assert_called_once()
-        call_args = mock_run.call_args
+        mock_popen.assert_called_once()
+        call_args = mock_popen.call_args
         assert call_args[0][0] == [
             "uv", "run", "--with", "twine", "python", "-m", "twine", "upload",
             "--repository-url", "https://test.pypi.org/legacy/",
@@ -186,17 +189,13 @@ def test_pyproject_publish_without_build(temp_python_project):
         parser.publish()
 
 
-def test_pyproject_publish_failure(temp_python_project):
+def test_pyproject_publish_failure(temp_python_project, fake_popen):
     """Test PyProject.publish() raises RuntimeError on failure"""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
     parser = factory.get_parser_from_path(pyproject_path)
     parser._build = "/path/to/package.whl"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 1
-    mock_result.stderr = "Upload failed"
-
-    with mock.patch("subprocess.run", return_value=mock_result):
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="Upload failed")):
         with pytest.raises(RuntimeError, match="Publish failed"):
             parser.publish()
 
@@ -205,70 +204,54 @@ def test_pyproject_publish_failure(temp_python_project):
 # Tests for ReactPackage build/publish (mocked subprocess)
 # ============================================================================
 
-def test_react_package_build_success(temp_react_project):
+def test_react_package_build_success(temp_react_project, fake_popen):
     """Test ReactPackage.build() calls subprocess correctly within package directory."""
     package_path = os.path.join(temp_react_project, "package.json")
     parser = factory.get_parser_from_path(package_path)
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.build()
 
-        mock_run.assert_called_once()
-        call_args = mock_run.call_args
+        mock_popen.assert_called_once()
+        call_args = mock_popen.call_args
         assert call_args[0][0] == ["npm", "run", "build"]
-        assert call_args[1]["capture_output"] is True
+        assert call_args[1]["stdout"] == subprocess.PIPE
         assert call_args[1]["text"] is True
 
     # Verify _build was set to current directory marker
     assert parser._build == "."
 
 
-def test_react_package_build_failure(temp_react_project):
+def test_react_package_build_failure(temp_react_project, fake_popen):
     """Test ReactPackage.build() raises RuntimeError on failure"""
     package_path = os.path.join(temp_react_project, "package.json")
     parser = factory.get_parser_from_path(package_path)
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 1
-    mock_result.stderr = "npm build error"
-
-    with mock.patch("subprocess.run", return_value=mock_result):
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="npm build error")):
         with pytest.raises(RuntimeError, match="Build failed"):
             parser.build()
 
 
-def test_react_package_publish_success(temp_react_project):
+def test_react_package_publish_success(temp_react_project, fake_popen):
     """Test ReactPackage.publish() calls subprocess correctly within package directory."""
     package_path = os.path.join(temp_react_project, "package.json")
     parser = factory.get_parser_from_path(package_path)
     parser._registry = "https://npm.pkg.github.com"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.publish()
 
-        mock_run.assert_called_once()
-        call_args = mock_run.call_args
+        mock_popen.assert_called_once()
+        call_args = mock_popen.call_args
         assert call_args[0][0] == ["npm", "publish", "--registry", "https://npm.pkg.github.com"]
 
 
-def test_react_package_publish_failure(temp_react_project):
+def test_react_package_publish_failure(temp_react_project, fake_popen):
     """Test ReactPackage.publish() raises RuntimeError on failure"""
     package_path = os.path.join(temp_react_project, "package.json")
     parser = factory.get_parser_from_path(package_path)
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 1
-    mock_result.stderr = "npm publish error"
-
-    with mock.patch("subprocess.run", return_value=mock_result):
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="npm publish error")):
         with pytest.raises(RuntimeError, match="Publish failed"):
             parser.publish()
 
@@ -277,7 +260,7 @@ def test_react_package_publish_failure(temp_react_project):
 # Tests for DockerFile build/publish (mocked subprocess)
 # ============================================================================
 
-def test_dockerfile_build_success(temp_docker_project):
+def test_dockerfile_build_success(temp_docker_project, fake_popen):
     """Test DockerFile.build() calls subprocess correctly"""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
     parser = factory.get_parser_from_path(dockerfile_path)
@@ -285,22 +268,61 @@ def test_dockerfile_build_success(temp_docker_project):
     parser.registry = "ghcr.io/testuser"
     parser.package = "test_docker_packaging"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
     with mock.patch.object(type(parser), "_DockerFile__get_image_tags", return_value=["1.0.0"]), \
-         mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+         mock.patch.object(type(parser), "_DockerFile__get_fingerprint_image", return_value=None), \
+         mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.build()
 
-        mock_run.assert_called_once()
-        call_args = mock_run.call_args
+        mock_popen.assert_called_once()
+        call_args = mock_popen.call_args
         assert call_args[0][0] == [
-            "docker", "build", "-t", "ghcr.io/testuser/test_docker_packaging:1.0.0", "."
+            "docker", "build", "--label", f"{parser.FINGERPRINT_LABEL}={parser.fingerprint}",
+            "-t", "ghcr.io/testuser/test_docker_packaging:1.0.0", "."
+        ]
+    assert parser._build == "ghcr.io/testuser/test_docker_packaging:1.0.0"
+
+
+def test_dockerfile_build_reuses_image_with_same_fingerprint(temp_docker_project, fake_popen):
+    """Test DockerFile.build() retags an existing image built from an identical build context."""
+    dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
+    parser = factory.get_parser_from_path(dockerfile_path)
+    parser.registry = "ghcr.io/testuser"
+    parser.package = "test_docker_packaging"
+
+    with mock.patch.object(type(parser), "_DockerFile__get_image_tags", return_value=["1.0.0"]), \
+         mock.patch.object(type(parser), "_DockerFile__get_fingerprint_image", return_value="0123456789ab"), \
+         mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
+        parser.build()
+
+        mock_popen.assert_called_once()
+        assert mock_popen.call_args[0][0] == [
+            "docker", "tag", "0123456789ab", "ghcr.io/testuser/test_docker_packaging:1.0.0"
         ]
     assert parser._build == "ghcr.io/testuser/test_docker_packaging:1.0.0"
 
 
+def test_dockerfile_fingerprint_honors_dockerignore(temp_docker_project):
+    """Test the build context fingerprint only changes when files sent to the docker daemon change."""
+    dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
+    with open(os.path.join(temp_docker_project, ".dockerignore"), "w") as handle:
+        handle.write("docs\n*.md\n")
+    os.makedirs(os.path.join(temp_docker_project, "docs"), exist_ok=True)
+    with open(os.path.join(temp_docker_project, "app.py"), "w") as handle:
+        handle.write("print('hello')\n")
+
+    fingerprint = factory.get_parser_from_path(dockerfile_path).fingerprint
+
+    with open(os.path.join(temp_docker_project, "docs", "index.html"), "w") as handle:
+        handle.write("<html></html>")
+    with open(os.path.join(temp_docker_project, "README.md"), "w") as handle:
+        handle.write("# Docs only change")
+    assert factory.get_parser_from_path(dockerfile_path).fingerprint == fingerprint
+
+    with open(os.path.join(temp_docker_project, "app.py"), "w") as handle:
+        handle.write("print('hello world')\n")
+    assert factory.get_parser_from_path(dockerfile_path).fingerprint != fingerprint
+
+
 def test_dockerfile_build_without_registry(temp_docker_project):
     """Test DockerFile.build() raises error without registry set"""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
@@ -310,23 +332,19 @@ def test_dockerfile_build_without_registry(temp_docker_project):
         parser.build()
 
 
-def test_dockerfile_build_failure(temp_docker_project):
+def test_dockerfile_build_failure(temp_docker_project, fake_popen):
     """Test DockerFile.build() raises RuntimeError on failure"""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
     parser = factory.get_parser_from_path(dockerfile_path)
     parser.registry = "ghcr.io/testuser"
     parser.registry_version = "1.0.0"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 1
-    mock_result.stderr = "docker build error"
-
-    with mock.patch("subprocess.run", return_value=mock_result):
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="docker build error")):
         with pytest.raises(RuntimeError, match="Docker build failed"):
             parser.build()
 
 
-def test_dockerfile_publish_success(temp_docker_project):
+def test_dockerfile_publish_success(temp_docker_project, fake_popen):
     """Test DockerFile.publish() calls subprocess correctly"""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
     parser = factory.get_parser_from_path(dockerfile_path)
@@ -335,18 +353,78 @@ def test_dockerfile_publish_success(temp_docker_project):
     with mock.patch.object(type(parser), "_DockerFile__get_image_tags", return_value=["1.0.0"]):
         parser._build = parser.tag
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.publish()
 
-        mock_run.assert_called_once()
-        call_args = mock_run.call_args
+        mock_popen.assert_called_once()
+        call_args = mock_popen.call_args
         assert call_args[0][0] == ["docker", "push", "ghcr.io/testuser/test_docker_packaging:1.0.0"]
 
 
+def test_dockerfile_build_applies_tag_policy(temp_docker_project, fake_popen):
+    """Test DockerFile.build() applies the alias tags of the tag policy in the same docker build."""
+    dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
+    parser = factory.get_parser_from_path(dockerfile_path)
+    parser.registry = "ghcr.io/testuser"
+    parser.package = "app"
+    parser.tag_policy = ["latest", "major", "minor"]
+
+    with mock.patch.object(type(parser), "_DockerFile__get_image_tags", return_value=["1.2.3"]), \
+         mock.patch.object(type(parser), "_DockerFile__get_fingerprint_image", return_value=None), \
+         mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
+        parser.build()
+
+        assert mock_popen.call_args[0][0][-9:] == [
+            "-t", "ghcr.io/testuser/app:1.2.3",
+            "-t", "ghcr.io/testuser/app:latest",
+            "-t", "ghcr.io/testuser/app:1",
+            "-t", "ghcr.io/testuser/app:1.2",
+            "."
+        ]
+
+
+@pytest.mark.parametrize("version,aliases", [("1.2", ["1", "1.2"]), ("1.2.3.4", ["1", "1.2"]), ("2", ["2", "2.0"])])
+def test_dockerfile_tags_of_versions_without_three_parts(temp_docker_project, version, aliases):
+    """Test DockerFile.tags takes the alias tags from versions with more or fewer than three parts."""
+    parser = factory.get_parser_from_path(os.path.join(temp_docker_project, "Dockerfile"))
+    parser.registry = "ghcr.io/testuser"
+    parser.package = "app"
+    parser.tag_policy = ["major", "minor"]
+    parser._version = version
+    assert parser.tags == [f"ghcr.io/testuser/app:{tag}" for tag in [version, *aliases]]
+
+
+def test_dockerfile_publish_all_tags_and_digest(temp_docker_project, fake_popen):
+    """Test DockerFile.publish() pushes only the tags of the tag policy and stores the digest of the version tag."""
+    dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
+    parser = factory.get_parser_from_path(dockerfile_path)
+    parser.registry = "ghcr.io/testuser"
+    parser.package = "app"
+    parser.tag_policy = ["latest"]
+    digest, other = f"sha256:{'a' * 64}", f"sha256:{'b' * 64}"
+    outputs = iter([f"0.9.0: digest: {other} size: 1570\n1.2.3: digest: {digest} size: 1570\n",
+                    f"latest: digest: {other} size: 1570\n"])
+
+    with mock.patch.object(type(parser), "_DockerFile__get_image_tags", return_value=["1.2.3", "0.9.0"]), \
+         mock.patch("subprocess.Popen",
+                    side_effect=lambda argv, **kwargs: fake_popen(stdout=next(outputs))(argv, **kwargs)) as mock_popen:
+        parser._build = parser.tag
+        parser.publish()
+
+        assert [call[0][0] for call in mock_popen.call_args_list] == [
+            ["docker", "push", "ghcr.io/testuser/app:1.2.3"],
+            ["docker", "push", "ghcr.io/testuser/app:latest"],
+        ]
+    assert parser.digest == digest
+
+
+def test_dockerfile_tag_policy_rejects_unknown_alias(temp_docker_project):
+    """Test DockerFile only accepts the supported alias tags."""
+    parser = factory.get_parser_from_path(os.path.join(temp_docker_project, "Dockerfile"))
+    with pytest.raises(ValueError, match="Unknown tag aliases"):
+        parser.tag_policy = ["nightly"]
+
+
 def test_dockerfile_publish_without_build(temp_docker_project):
     """Test DockerFile.publish() raises error if build() wasn't called first."""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
@@ -359,7 +437,7 @@ def test_dockerfile_publish_without_build(temp_docker_project):
         parser.publish()
 
 
-def test_dockerfile_publish_failure(temp_docker_project):
+def test_dockerfile_publish_failure(temp_docker_project, fake_popen):
     """Test DockerFile.publish() raises RuntimeError on failure"""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
     parser = factory.get_parser_from_path(dockerfile_path)
@@ -368,11 +446,7 @@ def test_dockerfile_publish_failure(temp_docker_project):
     parser.registry_version = "1.0.0"
     parser._build = parser.tag
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 1
-    mock_result.stderr = "docker push error"
-
-    with mock.patch("subprocess.run", return_value=mock_result):
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="docker push error")):
         with pytest.raises(RuntimeError, match="Docker push failed"):
             parser.publish()
 
@@ -514,7 +588,7 @@ def test_parser_package_property(temp_python_project, temp_react_project, temp_d
 # Integration tests for build_and_publish (mocked subprocess)
 # ============================================================================
 
-def test_build_and_publish_python_integration(temp_python_project):
+def test_build_and_publish_python_integration(temp_python_project, fake_popen):
     """Integration test: publish=True builds and publishes Python project."""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
 
@@ -527,73 +601,58 @@ def test_build_and_publish_python_integration(temp_python_project):
     paths = [pyproject_path]
     repositories = {const.BuildTypes.PYTHON: "https://test.pypi.org/legacy/"}
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         result = build_and_publish_package.build_and_publish(paths, repositories=repositories, publish=True)
 
         assert result is True
-        assert mock_run.call_count == 2
+        assert mock_popen.call_count == 2
 
 
-def test_build_and_publish_react_integration(temp_react_project):
+def test_build_and_publish_react_integration(temp_react_project, fake_popen):
     """Integration test: publish=True builds and publishes React project."""
     package_path = os.path.join(temp_react_project, "package.json")
 
     paths = [package_path]
     repositories = {const.BuildTypes.NPM: "https://npm.pkg.github.com"}
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         result = build_and_publish_package.build_and_publish(paths, repositories=repositories, publish=True)
 
         assert result is True
-        assert mock_run.call_count == 2
+        assert mock_popen.call_count == 2
 
 
-def test_build_and_publish_docker_skipped_without_registry(temp_docker_project):
+def test_build_and_publish_docker_skipped_without_registry(temp_docker_project, fake_popen):
     """Integration test: Docker is skipped without explicit registry."""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
 
     paths = [dockerfile_path]
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         result = build_and_publish_package.build_and_publish(paths, publish=True)
 
         assert result is True
-        assert mock_run.call_count == 0
+        assert mock_popen.call_count == 0
 
 
-def test_build_and_publish_docker_integration(temp_docker_project):
+def test_build_and_publish_docker_integration(temp_docker_project, fake_popen):
     """Integration test: Docker is included when explicit registry is provided."""
     dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
 
     paths = [dockerfile_path]
     repositories = {const.BuildTypes.DOCKER: "ghcr.io/testuser"}
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
     with mock.patch.object(factory.get_parser_from_path(dockerfile_path).__class__, "_DockerFile__get_image_semantic_versions", return_value=["1.0.0"]), \
          mock.patch.object(factory.get_parser_from_path(dockerfile_path).__class__, "_DockerFile__get_git_repository", return_value="test_docker_packaging"), \
-         mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+         mock.patch.object(factory.get_parser_from_path(dockerfile_path).__class__, "_DockerFile__get_fingerprint_image", return_value=None), \
+         mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         result = build_and_publish_package.build_and_publish(paths, repositories=repositories, publish=True)
 
         assert result is True
-        assert mock_run.call_count == 2
+        assert mock_popen.call_count == 2
 
 
-def test_build_and_publish_multiple_types(temp_python_project, temp_react_project):
+def test_build_and_publish_multiple_types(temp_python_project, temp_react_project, fake_popen):
     """Integration test: publish=True builds + publishes both Python and React projects."""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
     package_path = os.path.join(temp_react_project, "package.json")
@@ -610,18 +669,14 @@ def test_build_and_publish_multiple_types(temp_python_project, temp_react_projec
         const.BuildTypes.NPM: "https://npm.pkg.github.com"
     }
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         result = build_and_publish_package.build_and_publish(paths, repositories=repositories, publish=True)
 
         assert result is True
-        assert mock_run.call_count == 4
+        assert mock_popen.call_count == 4
 
 
-def test_build_and_publish_release_only(temp_python_project):
+def test_build_and_publish_release_only(temp_python_project, fake_popen):
     """Integration test: release=True builds and creates a GH release, no publish call."""
     pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
 
@@ -633,19 +688,437 @@ def test_build_and_publish_release_only(temp_python_project):
     paths = [pyproject_path]
     repositories = {const.BuildTypes.PYTHON: "https://test.pypi.org/legacy/"}
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-    mock_result.stdout = "v0.0.0\n"
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(stdout="v0.0.0\n")) as mock_popen:
         result = build_and_publish_package.build_and_publish(
             paths, repositories=repositories, release=True
         )
 
         assert result is True
-        calls = [c[0][0] for c in mock_run.call_args_list]
+        calls = [c[0][0] for c in mock_popen.call_args_list]
         # build called
         assert any(c[0] == "uv" for c in calls)
         # gh release create called
         assert any(c[0] == "gh" for c in calls)
+
+
+def test_build_and_publish_orders_local_dependencies(tmp_path, fake_popen):
+    """Integration test: packages build and publish after the local packages they depend on."""
+    projects = {"app": {"tool": {"uv": {"sources": {"lib": {"path": "../lib"}}}}}, "lib": {}, "other": {}}
+    for name, content in projects.items():
+        os.makedirs(tmp_path / name / "dist")
+        (tmp_path / name / "dist" / f"{name}-1.0.0-py3-none-any.whl").write_text("fake wheel")
+        (tmp_path / name / "pyproject.toml").write_text(
+            toml.dumps({"project": {"name": name, "version": "1.0.0"}, **content}))
+    paths = [str(tmp_path / name / "pyproject.toml") for name in projects]
+
+    commands = []
+    lock = threading.Lock()
+
+    def popen(argv, cwd=None, **kwargs):
+        with lock:
+            commands.append(("publish" if "twine" in argv else "build", os.path.basename(cwd)))
+        return fake_popen()(argv, cwd=cwd, **kwargs)
+
+    with mock.patch("subprocess.Popen", side_effect=popen):
+        build_and_publish_package.build_and_publish(
+            paths, repositories={const.BuildTypes.PYTHON: "https://test.pypi.org/legacy/"}, publish=True)
+
+    assert sorted(commands) == sorted((step, name) for step in ("build", "publish") for name in projects)
+    assert commands.index(("build", "lib")) < commands.index(("build", "app"))
+    assert commands.index(("publish", "lib")) < commands.index(("publish", "app"))
+
+
+def test_build_and_publish_overlaps_publishes_with_builds_of_the_same_type(tmp_path, fake_popen):
+    """Integration test: a publish runs while the next build of the same type runs, even with a limit of 1."""
+    for name in ("api", "web"):
+        os.makedirs(tmp_path / name / "dist")
+        (tmp_path / name / "dist" / f"{name}-1.0.0-py3-none-any.whl").write_text("fake wheel")
+        (tmp_path / name / "pyproject.toml").write_text(toml.dumps({"project": {"name": name, "version": "1.0.0"}}))
+    paths = [str(tmp_path / name / "pyproject.toml") for name in ("api", "web")]
+
+    builds = []
+    second_build = threading.Event()
+    overlapped = []
+
+    def popen(argv, cwd=None, **kwargs):
+        if "twine" in argv:
+            # The first publish only finishes once the other package started building
+            overlapped.append(second_build.wait(timeout=5))
+        else:
+            builds.append(cwd)
+            if len(builds) == 2:
+                second_build.set()
+        return fake_popen()(argv, cwd=cwd, **kwargs)
+
+    with mock.patch("subprocess.Popen", side_effect=popen):
+        build_and_publish_package.build_and_publish(
+            paths, repositories={const.BuildTypes.PYTHON: "https://test.pypi.org/legacy/"}, publish=True,
+            job_limits={const.BuildTypes.PYTHON: 1})
+
+    assert overlapped == [True, True]
+
+
+def test_build_and_publish_stops_publishing_when_builds_fail(temp_python_project, temp_react_project, fake_popen):
+    """Integration test: packages that fail to build aren't published and the error of the build is raised."""
+    pyproject_path = os.path.join(temp_python_project, "pyproject.toml")
+    package_path = os.path.join(temp_react_project, "package.json")
+    repositories = {const.BuildTypes.PYTHON: "https://test.pypi.org/legacy/",
+                    const.BuildTypes.NPM: "https://npm.pkg.github.com"}
+
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="error: no space left on device")) as mock_popen:
+        with pytest.raises(RuntimeError, match="no space left on device"):
+            build_and_publish_package.build_and_publish([pyproject_path, package_path], repositories=repositories,
+                                                        publish=True)
+
+    commands = [call[0][0] for call in mock_popen.call_args_list]
+    assert not any("twine" in command or "publish" in command for command in commands)
+
+
+# ============================================================================
+# Tests for the toolchain command runner
+# ============================================================================
+
+def test_run_async_streams_output_and_times_out(tmp_path):
+    """Async commands stream their output line by line and are killed when they run past their timeout."""
+    lines = []
+    script = "import sys, time; print('first', flush=True); print('oops', file=sys.stderr, flush=True); time.sleep(30)"
+    command = processes.Command([sys.executable, "-c", script], cwd=str(tmp_path), timeout=1)
+    result = asyncio.run(processes.run_async(command, on_output=lambda name, line: lines.append((name, line))))
+
+    assert result.timed_out and result.returncode is None and not result.ok
+    assert result.stdout == "first\n" and result.stderr == "oops\n"
+    assert sorted(lines) == [("stderr", "oops\n"), ("stdout", "first\n")]
+    assert result.duration < 10
+
+
+def test_run_keeps_a_bounded_tail_of_the_output(tmp_path):
+    """Every line is streamed while only the last lines of each stream are kept, in both runners."""
+    script = "import sys\nfor i in range(1000): print(i)\nprint('failed', file=sys.stderr)\nsys.exit(3)"
+    command = processes.Command([sys.executable, "-c", script], cwd=str(tmp_path), tail_lines=5)
+
+    lines = []
+    result = processes.run(command, on_output=lambda name, line: lines.append(line))
+    assert result.returncode == 3 and not result.timed_out
+    assert result.stdout == "".join(f"{i}\n" for i in range(995, 1000)) and result.stderr == "failed\n"
+    assert len(lines) == 1001
+
+    async_result = asyncio.run(processes.run_async(command))
+    assert (async_result.returncode, async_result.stdout, async_result.stderr) == (3, result.stdout, result.stderr)
+
+    timed_out = processes.run(processes.Command([sys.executable, "-c", "import time; time.sleep(30)"], timeout=1))
+    assert timed_out.timed_out and timed_out.returncode is None and timed_out.duration < 10
+
+
+def test_run_async_kills_cancelled_commands():
+    """Cancelling the task awaiting a command kills its process."""
+    async def cancel_command():
+        task = asyncio.ensure_future(processes.run_async(processes.Command([sys.executable, "-c",
+                                                                            "import time; time.sleep(30)"])))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.perf_counter()
+    asyncio.run(cancel_command())
+    assert time.perf_counter() - start < 10
+
+
+def test_parser_steps_run_blocking_and_async(temp_react_project, fake_popen):
+    """The same steps drive the blocking and the async variants of a parser workflow."""
+    package_path = os.path.join(temp_react_project, "package.json")
+    parser = factory.get_parser_from_path(package_path)
+    parser.registry = "https://npm.pkg.github.com"
+
+    async def fake_run_async(command, on_output=None):
+        return processes.CommandResult(command.argv, 0, "", "")
+
+    with mock.patch("vega.packaging.processes.run_async", side_effect=fake_run_async) as mock_popen_async:
+        async def build_and_publish():
+            await parser.build_async()
+            await parser.publish_async()
+        asyncio.run(build_and_publish())
+
+    commands = [call[0][0] for call in mock_popen_async.call_args_list]
+    assert [command.argv for command in commands] == [["npm", "run", "build"],
+                                                      ["npm", "publish", "--registry", "https://npm.pkg.github.com"]]
+    assert all(command.cwd == temp_react_project for command in commands)
+    assert parser._build == "."
+
+    with mock.patch("subprocess.Popen", side_effect=fake_popen(returncode=1, stderr="Build error")):
+        with pytest.raises(RuntimeError, match="Build failed: Build error"):
+            parser.build()
+
+
+# ============================================================================
+# Tests for the build scheduler
+# ============================================================================
+
+def test_parsers_build_concurrently_without_chdir(temp_python_project, temp_react_project, fake_popen):
+    """Parsers run their commands from their own directory without changing the working directory of the process."""
+    pyproject_parser = factory.get_parser_from_path(os.path.join(temp_python_project, "pyproject.toml"))
+    react_parser = factory.get_parser_from_path(os.path.join(temp_react_project, "package.json"))
+    os.makedirs(pyproject_parser.context.resolve("dist"))
+    with open(os.path.join(temp_python_project, "dist", "test_package-0.1.0-py3-none-any.whl"), "w") as handle:
+        handle.write("fake wheel")
+
+    cwd = os.getcwd()
+    barrier = threading.Barrier(2, timeout=5)
+    calls = []
+
+    def popen(argv, cwd=None, **kwargs):
+        # Both parsers are inside of a command at the same time
+        barrier.wait()
+        calls.append((argv[0], cwd, os.getcwd()))
+        return fake_popen()(argv, cwd=cwd, **kwargs)
+
+    jobs = scheduler.Scheduler(max_workers=2)
+    jobs.add("build pyproject", pyproject_parser.build)
+    jobs.add("build react", react_parser.build)
+    with mock.patch("subprocess.Popen", side_effect=popen):
+        jobs.run().raise_for_failures()
+
+    assert sorted(calls) == [("npm", temp_react_project, cwd), ("uv", temp_python_project, cwd)]
+    assert pyproject_parser.context.resolve("dist") == os.path.join(temp_python_project, "dist")
+    assert pyproject_parser._build == os.path.join("dist", "test_package-0.1.0-py3-none-any.whl")
+
+
+def test_scheduler_respects_job_limits():
+    """No more tasks than the global and per resource limits run at the same time."""
+    lock = threading.Lock()
+    running = {"total": 0, "docker": 0}
+    peaks = {"total": 0, "docker": 0}
+
+    def work(resource):
+        with lock:
+            running["total"] += 1
+            running[resource] = running.get(resource, 0) + 1
+            for key in peaks:
+                peaks[key] = max(peaks[key], running.get(key, 0))
+        time.sleep(0.02)
+        with lock:
+            running["total"] -= 1
+            running[resource] -= 1
+
+    jobs = scheduler.Scheduler(max_workers=3, limits={const.BuildTypes.DOCKER: 1})
+    for index in range(3):
+        jobs.add(f"docker {index}", lambda: work("docker"), resource=const.BuildTypes.DOCKER)
+        jobs.add(f"python {index}", lambda: work("python"), resource=const.BuildTypes.PYTHON)
+    summary = jobs.run()
+
+    assert summary.succeeded
+    assert peaks == {"total": 3, "docker": 1}
+
+
+def test_scheduler_queues_apply_backpressure():
+    """Producers wait for room in the queue, which frees up once the consumer of their output finishes."""
+    events = []
+    jobs = scheduler.Scheduler(max_workers=2, queues={"publish": 1})
+    for name in ("api", "web"):
+        jobs.add(f"build {name}", functools.partial(events.append, f"build {name}"), produces="publish")
+        jobs.add(f"publish {name}", functools.partial(events.append, f"publish {name}"),
+                 dependencies=[f"build {name}"], consumes="publish")
+    jobs.add("release", functools.partial(events.append, "release"),
+             dependencies=[task.name for task in jobs.tasks])
+
+    assert jobs.run().succeeded
+    assert events == ["build api", "publish api", "build web", "publish web", "release"]
+    with pytest.raises(ValueError):
+        jobs.add("build docs", lambda: None, produces="upload")
+
+
+def test_scheduler_fails_fast_with_deterministic_summary():
+    """A failure skips its dependents, cancels the queued tasks and reports every task in the order it was added."""
+    def fail():
+        raise RuntimeError("Build failed: broken")
+
+    jobs = scheduler.Scheduler(max_workers=1)
+    jobs.add("build api", fail)
+    jobs.add("build web", lambda: None)
+    jobs.add("publish api", lambda: None, dependencies=["build api"])
+    summary = jobs.run()
+
+    assert [(task.name, task.state) for task in summary.tasks] == [
+        ("build api", scheduler.TaskStates.FAILED),
+        ("build web", scheduler.TaskStates.CANCELLED),
+        ("publish api", scheduler.TaskStates.CANCELLED)]
+    assert jobs.cancelled.is_set()
+    assert str(summary).splitlines()[1:] == ["build web: cancelled", "publish api: cancelled"]
+    with pytest.raises(RuntimeError, match="broken"):
+        summary.raise_for_failures()
+    with pytest.raises(ValueError):
+        jobs.add("release", lambda: None, dependencies=["build missing"])
+
+
+# ============================================================================
+# Tests for promoting docker images between registries
+# ============================================================================
+
+class _RegistryHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in for the subset of the OCI distribution API used to promote images."""
+    MANIFEST_REGEX = re.compile("^/v2/(?P<repository>.+)/manifests/(?P<reference>[^/]+)$")
+    BLOB_REGEX = re.compile("^/v2/(?P<repository>.+)/blobs/(?P<digest>sha256:[a-f0-9]+)$")
+    UPLOADS_REGEX = re.compile("^/v2/(?P<repository>.+)/blobs/uploads/$")
+    TAGS_REGEX = re.compile("^/v2/(?P<repository>.+)/tags/list$")
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        state = self.server.state
+        manifest = self.MANIFEST_REGEX.match(url.path)
+        blob = self.BLOB_REGEX.match(url.path)
+        tags = self.TAGS_REGEX.match(url.path)
+        if tags:
+            names = [reference for repository, reference in state["manifests"] if repository == tags["repository"]]
+            body = json.dumps({"name": tags["repository"], "tags": names}).encode("utf-8")
+            return self._respond(200 if names else 404, body if names else b"")
+        if manifest and (manifest["repository"], manifest["reference"]) in state["manifests"]:
+            body, media_type = state["manifests"][(manifest["repository"], manifest["reference"])]
+            digest = f"sha256:{hashlib.sha256(body).hexdigest()}"
+            return self._respond(200, body, {"Content-Type": media_type, "Docker-Content-Digest": digest})
+        if blob and (blob["repository"], blob["digest"]) in state["blobs"]:
+            return self._respond(200, state["blobs"][(blob["repository"], blob["digest"])])
+        self._respond(404)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        state = self.server.state
+        repository = self.UPLOADS_REGEX.match(url.path)["repository"]
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "mount" in query and (query["from"], query["mount"]) in state["blobs"]:
+            state["blobs"][(repository, query["mount"])] = state["blobs"][(query["from"], query["mount"])]
+            state["mounts"] += 1
+            return self._respond(201)
+        upload_id = str(uuid.uuid4())
+        state["uploads"][upload_id] = repository
+        self._respond(202, headers={"Location": f"/upload/{upload_id}"})
+
+    def do_PUT(self):
+        url = urllib.parse.urlsplit(self.path)
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        manifest = self.MANIFEST_REGEX.match(url.path)
+        if manifest:
+            state["manifests"][(manifest["repository"], manifest["reference"])] = (body, self.headers["Content-Type"])
+            return self._respond(201)
+        digest = dict(urllib.parse.parse_qsl(url.query))["digest"]
+        assert digest == f"sha256:{hashlib.sha256(body).hexdigest()}"
+        repository = state["uploads"].pop(url.path.rsplit("/", 1)[-1])
+        state["blobs"][(repository, digest)] = body
+        state["uploaded"] += 1
+        self._respond(201)
+
+
+@pytest.fixture
+def stand_in_registries():
+    """Two local registries that speak enough of the registry API to promote images between them."""
+    servers = []
+    for _ in range(2):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RegistryHandler)
+        server.state = {"manifests": {}, "blobs": {}, "uploads": {}, "mounts": 0, "uploaded": 0}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _seed_image(server, repository, tag):
+    """Stores an image with a config and two layers in a stand-in registry."""
+    blobs = [b'{"architecture": "amd64"}', b"layer one", b"layer two"]
+    digests = [f"sha256:{hashlib.sha256(blob).hexdigest()}" for blob in blobs]
+    for digest, blob in zip(digests, blobs):
+        server.state["blobs"][(repository, digest)] = blob
+    media_type = "application/vnd.oci.image.manifest.v1+json"
+    manifest = json.dumps({
+        "schemaVersion": 2,
+        "mediaType": media_type,
+        "config": {"mediaType": "application/vnd.oci.image.config.v1+json", "digest": digests[0], "size": len(blobs[0])},
+        "layers": [{"mediaType": "application/vnd.oci.image.layer.v1.tar+gzip", "digest": digest, "size": len(blob)}
+                   for digest, blob in zip(digests[1:], blobs[1:])],
+    }).encode("utf-8")
+    server.state["manifests"][(repository, tag)] = (manifest, media_type)
+    return manifest
+
+
+def test_promote_copies_image_between_registries(stand_in_registries):
+    """Test promoting an image uploads its blobs and manifest to a different registry."""
+    staging, production = stand_in_registries
+    manifest = _seed_image(staging, "org/app", "1.0.0")
+    staging_host = f"127.0.0.1:{staging.server_address[1]}"
+    production_host = f"127.0.0.1:{production.server_address[1]}"
+
+    digest = registries.promote(f"{staging_host}/org/app:1.0.0", f"{production_host}/org/app:1.0.0")
+
+    assert digest == f"sha256:{hashlib.sha256(manifest).hexdigest()}"
+    assert production.state["manifests"][("org/app", "1.0.0")][0] == manifest
+    assert production.state["uploaded"] == 3
+    assert production.state["mounts"] == 0
+
+    # Promoting again only checks for the blobs that already exist
+    registries.promote(f"{staging_host}/org/app:1.0.0", f"{production_host}/org/app:1.0.0")
+    assert production.state["uploaded"] == 3
+
+
+def test_promote_mounts_blobs_within_the_same_registry(stand_in_registries):
+    """Test promoting between repositories of the same registry mounts blobs instead of uploading them."""
+    registry = stand_in_registries[0]
+    _seed_image(registry, "staging/app", "1.0.0")
+    host = f"127.0.0.1:{registry.server_address[1]}"
+
+    registries.promote(f"{host}/staging/app:1.0.0", f"{host}/production/app:1.0.0")
+
+    assert ("production/app", "1.0.0") in registry.state["manifests"]
+    assert registry.state["mounts"] == 3
+    assert registry.state["uploaded"] == 0
+
+
+def test_build_and_publish_promotes_docker_images(temp_docker_project):
+    """Test build_and_publish promotes docker images instead of building and pushing them."""
+    dockerfile_path = os.path.join(temp_docker_project, "Dockerfile")
+    repositories = {const.BuildTypes.DOCKER: "registry.example.com/org"}
+    docker_cls = factory.get_parser_from_path(dockerfile_path).__class__
+
+    with mock.patch.object(docker_cls, "_DockerFile__get_image_semantic_versions", return_value=[]), \
+         mock.patch.object(docker_cls, "_DockerFile__get_git_repository", return_value="app"), \
+         mock.patch("vega.packaging.registries.list_tags", return_value=["latest", "0.9.0", "1.0.0"]), \
+         mock.patch("vega.packaging.registries.promote") as mock_promote, \
+         mock.patch("subprocess.run") as mock_run:
+        result = build_and_publish_package.build_and_publish([dockerfile_path], repositories=repositories,
+                                                             publish=True, promote_from="staging.example.com/org")
+
+    assert result is True
+    mock_promote.assert_called_once_with("staging.example.com/org/app:1.0.0", "registry.example.com/org/app:1.0.0")
+    mock_run.assert_not_called()
+
+
+def test_dockerfile_promote_resolves_the_version_from_the_source_registry(stand_in_registries, temp_docker_project):
+    """Test promoting without local images copies the newest version of the source registry and fails without one."""
+    staging, production = stand_in_registries
+    for tag in ["0.9.0", "1.2.0", "latest"]:
+        _seed_image(staging, "org/app", tag)
+    parser = factory.get_parser_from_path(os.path.join(temp_docker_project, "Dockerfile"))
+    parser.registry = f"127.0.0.1:{production.server_address[1]}/org"
+    parser.package = "app"
+
+    parser.promote(f"127.0.0.1:{staging.server_address[1]}/org")
+
+    assert parser.version == "1.2.0"
+    assert ("org/app", "1.2.0") in production.state["manifests"]
+    with pytest.raises(RuntimeError, match="No semantic version"):
+        parser.promote(f"127.0.0.1:{staging.server_address[1]}/missing")
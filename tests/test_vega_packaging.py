@@ -10,6 +10,11 @@ import datetime
 import shutil
 import json
 import argparse
+import concurrent.futures
+import subprocess
+import sys
+import threading
+import time
 from unittest import mock
 
 import toml
@@ -19,7 +24,19 @@ from vega.packaging import commits
 from vega.packaging import factory
 from vega.packaging import const
 from vega.packaging import versions
+from vega.packaging import queries
+from vega.packaging import envfiles
+from vega.packaging import io
+from vega.packaging import affected
+from vega.packaging import graph
+from vega.packaging import propagation
+from vega.packaging import inventory
+from vega.packaging import sessions
+from vega.packaging import transactions
+from vega.packaging import daemon
 from vega.packaging.bootstrappers import update_semantic_version
+from vega.packaging.bootstrappers import batch_update_semantic_version
+from vega.packaging.bootstrappers import version_inventory
 
 
 @pytest.fixture
@@ -234,6 +251,500 @@ def test_semantic_version_start_value():
     assert str(sv) == "1.3.0"
 
 
+# ============================================================================
+# Tests for queries.py
+# ============================================================================
+
+def test_query_cache_memoizes_commands(tmp_path):
+    """Identical commands only run once per run and are reported as cache hits."""
+    mock_result = mock.MagicMock()
+    mock_result.returncode = 0
+    mock_result.stdout = "/repo\n"
+
+    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+        for _ in range(3):
+            assert queries.run(["git", "rev-parse", "--show-toplevel"], cwd=str(tmp_path)) is mock_result
+        queries.run(["git", "rev-parse", "--show-toplevel"], cwd=os.path.dirname(str(tmp_path)))
+        assert mock_run.call_count == 2
+
+        queries.invalidate(["git", "rev-parse"], cwd=str(tmp_path))
+        queries.run(["git", "rev-parse", "--show-toplevel"], cwd=str(tmp_path))
+        assert mock_run.call_count == 3
+
+    assert queries.stats() == {"hits": 2, "misses": 3, "entries": 2}
+
+
+def test_query_cache_keys_on_environment(monkeypatch):
+    """Commands are queried again when one of their relevant environment variables changes."""
+    with mock.patch("subprocess.run") as mock_run:
+        monkeypatch.setenv("GH_REPO", "org/one")
+        queries.run(["gh", "release", "list"], env_keys=("GH_REPO",))
+        queries.run(["gh", "release", "list"], env_keys=("GH_REPO",))
+        monkeypatch.setenv("GH_REPO", "org/two")
+        queries.run(["gh", "release", "list"], env_keys=("GH_REPO",))
+        assert mock_run.call_count == 2
+
+
+def test_query_cache_revalidates_json_files(tmp_path):
+    """Json files are only parsed again when they change on disk."""
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"auths": {"ghcr.io": {}}}))
+
+    assert queries.read_json(str(path)) == {"auths": {"ghcr.io": {}}}
+    assert queries.read_json(str(path)) == {"auths": {"ghcr.io": {}}}
+    assert queries.stats()["hits"] == 1
+
+    path.write_text(json.dumps({"auths": {"ghcr.io": {}, "registry.example.com": {}}}))
+    assert "registry.example.com" in queries.read_json(str(path))["auths"]
+    assert queries.read_json(str(tmp_path / "missing.json")) is None
+
+
+# ============================================================================
+# Tests for io.py
+# ============================================================================
+
+@pytest.fixture
+def temp_monorepo(tmp_path):
+    """Monorepo with nested packages, dependency folders and gitignored build outputs."""
+    files = ["pyproject.toml",
+             ".gitignore",
+             "packages/api/pyproject.toml",
+             "packages/api/build/pyproject.toml",
+             "packages/web/package.json",
+             "packages/web/node_modules/left-pad/package.json",
+             "crates/core/Cargo.toml",
+             "crates/core/target/package/Cargo.toml",
+             ".venv/lib/pyproject.toml",
+             "logs/debug.log"]
+    for name in files:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    (tmp_path / ".gitignore").write_text("build/\n*.log\n")
+    return tmp_path
+
+
+def test_yield_paths_scans_the_given_directory(temp_monorepo, monkeypatch):
+    """Files are found relative to the scanned directory rather than the current working directory."""
+    monkeypatch.chdir(os.path.dirname(str(temp_monorepo)))
+    paths = list(io.yield_paths(str(temp_monorepo), ["CHANGELOG.md"]))
+    assert paths == [str(temp_monorepo / ".gitignore"),
+                     str(temp_monorepo / "pyproject.toml"),
+                     str(temp_monorepo / "CHANGELOG.md")]
+
+
+def test_walk_prunes_dependencies_and_gitignored_paths(temp_monorepo):
+    """Recursive walks skip dependency folders, build outputs and gitignored paths in a stable order."""
+    relative = [os.path.relpath(path, str(temp_monorepo)) for path in io.walk(str(temp_monorepo), max_depth=None)]
+    assert relative == [".gitignore",
+                        "pyproject.toml",
+                        os.path.join("crates", "core", "Cargo.toml"),
+                        os.path.join("packages", "api", "pyproject.toml"),
+                        os.path.join("packages", "web", "package.json")]
+
+    assert list(io.walk(str(temp_monorepo), max_depth=None, threads=4)) == \
+        list(io.walk(str(temp_monorepo), max_depth=None))
+    assert not any("crates" in path for path in io.walk(str(temp_monorepo), max_depth=1))
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_yield_paths_discovers_git_tracked_files(temp_monorepo):
+    """The git backend only yields tracked files that have a parser, and falls back to walking outside of git."""
+    subprocess.run(["git", "init", "-q"], cwd=str(temp_monorepo), check=True)
+    subprocess.run(["git", "add", "-f", "pyproject.toml", "packages", "crates/core/Cargo.toml", "logs"],
+                   cwd=str(temp_monorepo), check=True)
+    (temp_monorepo / "packages" / "untracked").mkdir()
+    (temp_monorepo / "packages" / "untracked" / "pyproject.toml").write_text("")
+
+    paths = list(io.yield_paths(str(temp_monorepo), max_depth=None, discovery="git"))
+    assert paths == [str(temp_monorepo / "pyproject.toml"),
+                     str(temp_monorepo / "crates" / "core" / "Cargo.toml"),
+                     str(temp_monorepo / "packages" / "api" / "pyproject.toml"),
+                     str(temp_monorepo / "packages" / "api" / "build" / "pyproject.toml"),
+                     str(temp_monorepo / "packages" / "web" / "package.json")]
+    assert list(io.yield_paths(str(temp_monorepo / "packages" / "api"), discovery="git")) == \
+        [str(temp_monorepo / "packages" / "api" / "pyproject.toml")]
+
+    shutil.rmtree(str(temp_monorepo / ".git"))
+    assert list(io.yield_paths(str(temp_monorepo), discovery="git")) == \
+        list(io.yield_paths(str(temp_monorepo)))
+
+
+# ============================================================================
+# Tests for affected.py
+# ============================================================================
+
+def test_path_trie_finds_nearest_directory(tmp_path):
+    """Paths are owned by the deepest stored directory that contains them."""
+    trie = affected.PathTrie()
+    trie.insert(str(tmp_path))
+    trie.insert(str(tmp_path / "packages" / "api"))
+
+    assert trie.nearest(str(tmp_path / "packages" / "api" / "src" / "main.py")) == str(tmp_path / "packages" / "api")
+    assert trie.nearest(str(tmp_path / "packages" / "api")) == str(tmp_path / "packages" / "api")
+    assert trie.nearest(str(tmp_path / "packages" / "apis" / "main.py")) == str(tmp_path)
+    assert trie.nearest(os.path.dirname(str(tmp_path))) is None
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_affected_paths_from_commit_range(temp_monorepo):
+    """Only the packages owning a file changed in the commit range are kept."""
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run(git + ["init", "-q"], cwd=str(temp_monorepo), check=True)
+    (temp_monorepo / "CHANGELOG.md").write_text("")
+    subprocess.run(git + ["add", "-A"], cwd=str(temp_monorepo), check=True)
+    subprocess.run(git + ["commit", "-qm", "initial"], cwd=str(temp_monorepo), check=True)
+    (temp_monorepo / "packages" / "api" / "app.py").write_text("")
+    subprocess.run(git + ["add", "-A"], cwd=str(temp_monorepo), check=True)
+    subprocess.run(git + ["commit", "-qm", "api change"], cwd=str(temp_monorepo), check=True)
+
+    changed = affected.changed_paths("HEAD~1..HEAD", str(temp_monorepo))
+    assert [os.path.realpath(path) for path in changed] == \
+        [os.path.realpath(str(temp_monorepo / "packages" / "api" / "app.py"))]
+
+    paths = list(io.yield_paths(str(temp_monorepo), ["/tmp/github_env"], max_depth=None))
+    assert affected.filter_paths(paths, changed) == [str(temp_monorepo / "packages" / "api" / "app.py"),
+                                                     str(temp_monorepo / "packages" / "api" / "pyproject.toml"),
+                                                     "/tmp/github_env"]
+
+    changed = [str(temp_monorepo / "README.md")]
+    assert affected.filter_paths(paths, changed) == [str(temp_monorepo / ".gitignore"),
+                                                     str(temp_monorepo / "CHANGELOG.md"),
+                                                     str(temp_monorepo / "pyproject.toml"),
+                                                     "/tmp/github_env"]
+
+    # The directory given through a symbolic link still owns the paths git reports
+    link = temp_monorepo.parent / f"{temp_monorepo.name}-link"
+    link.symlink_to(temp_monorepo, target_is_directory=True)
+    changed = affected.changed_paths("HEAD~1..HEAD", str(link))
+    paths = list(io.yield_paths(str(link), max_depth=None))
+    with mock.patch("os.path.realpath", wraps=os.path.realpath) as realpath:
+        assert affected.filter_paths(paths, changed) == [str(link / "packages" / "api" / "app.py"),
+                                                         str(link / "packages" / "api" / "pyproject.toml")]
+    # Links are resolved once per directory, the lookups in the trie don't touch the file system
+    assert realpath.call_count == len({os.path.dirname(path) for path in paths}) + len(changed)
+
+
+# ============================================================================
+# Tests for graph.py
+# ============================================================================
+
+def test_package_graph_levels_from_local_dependencies(tmp_path):
+    """Path, workspace and docker build context dependencies order the packages into levels."""
+    files = {
+        "pyproject.toml": {"project": {"name": "monorepo", "version": "1.0.0"},
+                           "tool": {"uv": {"workspace": {"members": ["libs/*", "services/*"]}}}},
+        "libs/models/pyproject.toml": {"project": {"name": "models", "version": "1.0.0"}},
+        "libs/core/pyproject.toml": {"project": {"name": "Core_Lib", "version": "1.0.0",
+                                                 "dependencies": ["models @ file:../models"]}},
+        "services/api/pyproject.toml": {"project": {"name": "api", "version": "1.0.0", "dependencies": ["core-lib"]},
+                                        "tool": {"uv": {"sources": {"core-lib": {"workspace": True},
+                                                                    "requests": {"index": "pypi"}}}}},
+        "crates/Cargo.toml": {"workspace": {"members": ["a", "b", "c"], "dependencies": {"b": {"path": "b"}}}},
+        "crates/a/Cargo.toml": {"package": {"name": "a", "version": "1.0.0"},
+                                "dependencies": {"b": {"path": "../b"}, "serde": "1"}},
+        "crates/b/Cargo.toml": {"package": {"name": "b", "version": "1.0.0"}},
+        "crates/c/Cargo.toml": {"package": {"name": "c", "version": "1.0.0"},
+                                "dev-dependencies": {"b": {"workspace": True}}},
+    }
+    for relative, content in files.items():
+        os.makedirs(tmp_path / os.path.dirname(relative), exist_ok=True)
+        (tmp_path / relative).write_text(toml.dumps(content))
+    packages = {
+        "web/package.json": {"name": "web", "version": "1.0.0", "workspaces": ["packages/*"]},
+        "web/packages/ui/package.json": {"name": "@acme/ui", "version": "1.0.0"},
+        "web/packages/app/package.json": {"name": "app", "version": "1.0.0", "dependencies": {"@acme/ui": "^1.0.0",
+                                                                                           "react": "^19.0.0"}},
+        "web/docs/package.json": {"name": "docs", "version": "1.0.0", "devDependencies": {"app": "file:../packages/app"}},
+    }
+    for relative, content in packages.items():
+        os.makedirs(tmp_path / os.path.dirname(relative), exist_ok=True)
+        (tmp_path / relative).write_text(json.dumps(content))
+    (tmp_path / "services" / "api" / "Dockerfile").write_text(
+        "FROM python:3.12-slim\nCOPY --from=builder /src /src\nCOPY --chown=app:app dist/*.whl \\\n  /tmp/\n")
+
+    parsers = [factory.get_parser_from_path(str(tmp_path / relative))
+               for relative in [*files, *packages, "services/api/Dockerfile"]]
+    packages = graph.PackageGraph(parsers)
+    levels = [[os.path.relpath(file_parser.path, tmp_path) for file_parser in level] for level in packages.levels()]
+
+    assert levels == [
+        ["pyproject.toml", "libs/models/pyproject.toml", "crates/Cargo.toml", "crates/b/Cargo.toml",
+         "web/package.json", "web/packages/ui/package.json"],
+        ["libs/core/pyproject.toml", "crates/a/Cargo.toml", "crates/c/Cargo.toml", "web/packages/app/package.json"],
+        ["services/api/pyproject.toml", "web/docs/package.json"],
+        ["services/api/Dockerfile"],
+    ]
+    api = parsers[list(files).index("services/api/pyproject.toml")]
+    assert [os.path.relpath(p.path, tmp_path) for p in packages.dependents(api)] == ["services/api/Dockerfile"]
+
+
+def test_package_graph_puts_cycles_last(tmp_path, caplog):
+    """Packages that depend on each other in a cycle can't be ordered and end up together in the last level."""
+    for name, other in (("a", "b"), ("b", "a"), ("c", None)):
+        os.makedirs(tmp_path / name)
+        content = {"package": {"name": name, "version": "1.0.0"}}
+        if other:
+            content["dependencies"] = {other: {"path": f"../{other}"}}
+        (tmp_path / name / "Cargo.toml").write_text(toml.dumps(content))
+
+    parsers = [factory.get_parser_from_path(str(tmp_path / name / "Cargo.toml")) for name in "abc"]
+    levels = graph.PackageGraph(parsers).levels()
+    assert levels == [[parsers[2]], [parsers[0], parsers[1]]]
+    assert "cycle" in caplog.text
+
+
+# ============================================================================
+# Tests for propagation.py
+# ============================================================================
+
+def test_propagation_bumps_and_pins_dependents(tmp_path):
+    """A minor bump of a package gives a patch bump and an updated requirement to every package depending on it."""
+    files = {
+        "models": {"project": {"name": "models", "version": "1.0.0"}},
+        "core": {"project": {"name": "core", "version": "2.0.0", "dependencies": ["models>=1.0.0,<2"]},
+                 "tool": {"uv": {"sources": {"models": {"path": "../models"}}}}},
+        "api": {"project": {"name": "api", "version": "3.0.0",
+                            "dependencies": ["Core [fast]~=2.0.0 ; python_version >= '3.11'"]},
+                "tool": {"uv": {"sources": {"core": {"path": "../core"}}}}},
+        "other": {"project": {"name": "other", "version": "4.0.0"}},
+    }
+    for name, content in files.items():
+        os.makedirs(tmp_path / name)
+        (tmp_path / name / "pyproject.toml").write_text(toml.dumps(content))
+    parsers = {name: factory.get_parser_from_path(str(tmp_path / name / "pyproject.toml")) for name in files}
+    packages = graph.PackageGraph(parsers.values())
+
+    assert propagation.plan(packages, {parsers["models"]: const.Versions.MINOR}) == {
+        parsers["models"]: const.Versions.MINOR, parsers["core"]: const.Versions.PATCH,
+        parsers["api"]: const.Versions.PATCH}
+
+    parsers_dict = {"ordered": [parsers["models"]], "builds": {}, "graph": packages}
+    assert update_semantic_version.update_semantic_version("#minor #added new model", parsers=parsers_dict)
+
+    content = {name: toml.load(tmp_path / name / "pyproject.toml")["project"] for name in files}
+    assert [content[name]["version"] for name in files] == ["1.1.0", "2.0.1", "3.0.1", "4.0.0"]
+    assert content["core"]["dependencies"] == ["models>=1.1.0,<2"]
+    assert content["api"]["dependencies"] == ["Core [fast]~=2.0.1 ; python_version >= '3.11'"]
+
+    # A major bump moves the upper bounds the new version reaches so the requirements still allow it
+    parsers = {name: factory.get_parser_from_path(str(tmp_path / name / "pyproject.toml")) for name in files}
+    parsers_dict = {"ordered": [parsers["models"]], "builds": {}, "graph": graph.PackageGraph(parsers.values())}
+    assert update_semantic_version.update_semantic_version("#major #changed new models", parsers=parsers_dict)
+    content = {name: toml.load(tmp_path / name / "pyproject.toml")["project"] for name in files}
+    assert content["core"]["dependencies"] == ["models>=2.0.0,<3"]
+
+
+@pytest.mark.parametrize("specifier,version,expected", [
+    (">=1.0.0, <2.0.0", "2.0.0", ">=2.0.0, <3.0.0"),
+    ("~=1.2.0,<2", "2.0.0", "~=2.0.0,<3"),
+    (">1.0", "2.0.0", ">=2.0.0"),
+    (">=0.2 <0.3", "0.3.0", ">=0.3.0 <0.4"),
+    ("(~=1.2.0,<2)", "1.3.0", "(~=1.3.0,<2)"),
+    ("<2", "2.0.0", None),
+    (">=1,!=2.0.0", "2.0.0", None),
+    ("1.2.*", "1.3.0", None),
+])
+def test_replace_version_keeps_the_specifier_satisfiable(specifier, version, expected):
+    """The lower bound is replaced and the upper bounds reached by the new version are moved above it."""
+    assert versions.replace_version(specifier, version) == expected
+
+
+def test_pin_dependency_keeps_the_range_operator(tmp_path):
+    """Cargo and npm requirements keep their operator and protocol, path only requirements are left alone."""
+    (tmp_path / "Cargo.toml").write_text(toml.dumps({
+        "package": {"name": "a", "version": "1.0.0"},
+        "dependencies": {"b": {"path": "../b", "version": "1.0"}, "c": {"path": "../c"}}}))
+    cargo = factory.get_parser_from_path(str(tmp_path / "Cargo.toml"))
+    assert cargo.pin_dependency("b", "1.1.0")
+    assert not cargo.pin_dependency("c", "1.1.0")
+    assert cargo.content["dependencies"] == {"b": {"path": "../b", "version": "1.1.0"}, "c": {"path": "../c"}}
+
+    (tmp_path / "package.json").write_text(json.dumps({
+        "name": "app", "version": "1.0.0",
+        "dependencies": {"ui": "workspace:^1.0.0", "docs": "file:../docs", "core": "*"},
+        "devDependencies": {"ui": "~1.0.0"}, "peerDependencies": {"ui": "^1.0.0"}}))
+    react = factory.get_parser_from_path(str(tmp_path / "package.json"))
+    assert react.pin_dependency("ui", "1.1.0")
+    assert not react.pin_dependency("docs", "1.1.0")
+    assert not react.pin_dependency("core", "1.1.0")
+    assert react.content["dependencies"]["ui"] == "workspace:^1.1.0"
+    assert react.content["devDependencies"]["ui"] == "~1.1.0"
+    assert react.content["peerDependencies"]["ui"] == "^1.0.0"
+
+
+def test_propagation_plan_visits_every_package_once():
+    """Planning the bumps of thousands of packages looks up the dependents of every package once."""
+    class Package:
+        HAS_VERSION = True
+
+        def __init__(self, index):
+            self.index = index
+
+    class Graph:
+        def __init__(self, size):
+            self.packages = [Package(index) for index in range(size)]
+            self.calls = 0
+
+        def __contains__(self, package):
+            return True
+
+        def dependents(self, package):
+            # Every package depends on the 3 packages before it
+            self.calls += 1
+            return self.packages[package.index + 1:package.index + 4]
+
+    package_graph = Graph(5000)
+    bumps = propagation.plan(package_graph, {package_graph.packages[0]: const.Versions.MAJOR})
+    assert len(bumps) == 5000
+    assert bumps[package_graph.packages[0]] == const.Versions.MAJOR
+    assert set(list(bumps.values())[1:]) == {const.Versions.PATCH}
+    assert package_graph.calls == 5000
+
+
+# ============================================================================
+# Tests for inventory.py
+# ============================================================================
+
+def test_inventory_reports_drift_between_files_of_a_unit(tmp_path):
+    """The versions are read without parsing the whole files and units whose files disagree are reported."""
+    changelog = "# Changelog\n\n## [Unreleased]\n\n## [1.2.0] - 2024/01/01\n\n## [1.1.0] - 2023/01/01\n"
+    files = {
+        "api/pyproject.toml": '[build-system]\nrequires = ["setuptools"]\n\n[project]\nname = "api"\n'
+                              'version = "1.2.0"  # bumped by ci\n\n[tool.other]\nversion = "9.9.9"\n',
+        "api/CHANGELOG.md": changelog,
+        "crate/Cargo.toml": "[[bin]]\nname = 'cli'\n\n[package]\nname = 'crate'\nversion = '0.3.0'\n",
+        "web/package.json": json.dumps({"name": "web", "version": "2.0.0"}),
+        "web/CHANGELOG.md": changelog,
+    }
+    for relative, content in files.items():
+        os.makedirs(tmp_path / os.path.dirname(relative), exist_ok=True)
+        (tmp_path / relative).write_text(content)
+
+    with mock.patch("toml.load", side_effect=AssertionError("parsed the whole file")):
+        assert factory.get_parser_from_path(str(tmp_path / "api" / "pyproject.toml")).read_version() == "1.2.0"
+
+    entries = inventory.collect([str(tmp_path / relative) for relative in files], max_workers=4)
+    assert [(os.path.relpath(entry.path, tmp_path), entry.version) for entry in entries] == [
+        ("api/pyproject.toml", "1.2.0"), ("api/CHANGELOG.md", "1.2.0"), ("crate/Cargo.toml", "0.3.0"),
+        ("web/package.json", "2.0.0"), ("web/CHANGELOG.md", "1.2.0")]
+    assert list(inventory.get_drift(entries)) == [str(tmp_path / "web")]
+
+    table = inventory.format_table(entries, root=str(tmp_path))
+    assert [line.startswith("!") for line in table.splitlines()[1:6]] == [False, False, False, True, True]
+
+    args = version_inventory.parse_args(["--directory", str(tmp_path), "--recursive", "--format", "json", "--check"])
+    with open(tmp_path / "inventory.json", "w") as output:
+        assert version_inventory.run(args, output=output) == 1
+    assert json.loads((tmp_path / "inventory.json").read_text())["drift"] == {str(tmp_path / "web"): ["1.2.0", "2.0.0"]}
+
+
+# ============================================================================
+# Tests for sessions.py
+# ============================================================================
+
+def test_session_shares_parsers_and_parsed_content(tmp_path):
+    """A session gives a single parser per path and files are only parsed again when they change on disk."""
+    pyproject_path = tmp_path / "pyproject.toml"
+    pyproject_path.write_text(toml.dumps({"project": {"name": "api", "version": "1.0.0"}}))
+    # Files modified within the resolution of the file system clock aren't cached
+    os.utime(pyproject_path, ns=(0, time.time_ns() - 10 * sessions.RACY_NANOSECONDS))
+
+    with sessions.Session() as session:
+        file_parser = factory.get_parser_from_path(str(pyproject_path))
+        assert factory.get_parser_from_path(os.path.join(str(tmp_path), ".", "pyproject.toml")) is file_parser
+        assert len(session) == 1
+        with mock.patch("toml.load", wraps=toml.load) as load:
+            assert file_parser.package == "api"
+            assert str(file_parser.version) == "1.0.0"
+            file_parser.content["project"]["name"] = "changed in memory"
+            other = factory.create_parser(str(pyproject_path))
+            assert other.package == "api"
+            assert load.call_count == 1
+
+            pyproject_path.write_text(toml.dumps({"project": {"name": "api", "version": "1.10.0"}}))
+            assert factory.create_parser(str(pyproject_path)).content["project"]["version"] == "1.10.0"
+            assert load.call_count == 2
+    assert factory.get_parser_from_path(str(pyproject_path)) is not file_parser
+
+    # Empty content is only read once
+    changelog_path = tmp_path / "CHANGELOG.md"
+    changelog_path.write_text("")
+    changelog = factory.get_parser_from_path(str(changelog_path))
+    with mock.patch.object(type(changelog), "read", return_value=[]) as read:
+        assert changelog.content == [] and changelog.content == []
+        assert read.call_count == 1
+
+
+def test_session_is_only_seen_by_its_thread_and_bound_work(tmp_path):
+    """A session opened on a thread isn't active on the others unless the work is bound to it."""
+    path = str(tmp_path / "pyproject.toml")
+    opened, closed = threading.Event(), threading.Event()
+
+    def hold_session():
+        with sessions.Session():
+            opened.set()
+            closed.wait(timeout=5)
+
+    thread = threading.Thread(target=hold_session)
+    thread.start()
+    try:
+        opened.wait(timeout=5)
+        assert sessions.current() is None
+        assert factory.get_parser_from_path(path) is not factory.get_parser_from_path(path)
+    finally:
+        closed.set()
+        thread.join(timeout=5)
+
+    with sessions.Session() as session:
+        file_parser = factory.get_parser_from_path(path)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            assert executor.submit(sessions.current).result() is None
+            found = list(executor.map(sessions.bind(factory.get_parser_from_path), [path] * 4))
+    assert found == [file_parser] * 4 and len(session) == 1
+    assert sessions.current() is None
+
+
+# ============================================================================
+# Tests for daemon.py
+# ============================================================================
+
+@pytest.mark.skipif(not hasattr(daemon.socket, "AF_UNIX"), reason="Unix sockets are not supported")
+def test_daemon_runs_update_semantic_version(temp_python_project, tmp_path):
+    """The daemon runs the cli command for its clients with new parsers and reuses the content of unchanged files."""
+    socket_path = str(tmp_path / "daemon.sock")
+    assert daemon.request({"command": "ping"}, socket_path) is None
+
+    with open(os.path.join(temp_python_project, "notes.txt"), "w") as handle:
+        handle.write("")
+    # A file that's parsed but never updated, old enough to be cached
+    dockerfile_path = os.path.join(temp_python_project, "Dockerfile")
+    with open(dockerfile_path, "w") as handle:
+        handle.write("FROM python:3.11\n")
+    os.utime(dockerfile_path, ns=(0, time.time_ns() - 10 * sessions.RACY_NANOSECONDS))
+    server = daemon.DaemonServer(socket_path)
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    sessions.CONTENTS.clear()
+    try:
+        for expected_version in ("0.1.0", "0.2.0"):
+            response = daemon.request({"argv": ["--subject", "#minor #added daemon support"],
+                                       "cwd": temp_python_project, "env": dict(os.environ)}, socket_path)
+            assert response["exit_code"] == 0
+            with open(os.path.join(temp_python_project, "pyproject.toml"), "r") as handle:
+                assert toml.load(handle)["project"]["version"] == expected_version
+
+        response = daemon.request({"argv": []}, socket_path)
+        assert response["exit_code"] == 2 and "--subject" in response["output"]
+        # The second request reused the content of the unchanged Dockerfile parsed by the first one
+        stats = daemon.request({"command": "stats"}, socket_path)["contents"]
+        assert stats["hits"] > 0 and stats["misses"] >= 2
+    finally:
+        daemon.request({"command": "shutdown"}, socket_path)
+        thread.join(timeout=5)
+    assert not os.path.exists(socket_path)
+
+
 # ============================================================================
 # Tests for commits.py
 # ============================================================================
@@ -260,6 +771,20 @@ def test_commit_message_breakdown():
     assert message.semantic_version_bump == const.Versions.MAJOR
 
 
+def test_commit_message_scoped_bumps():
+    """Hashtags scoped to a package only bump that package, the other packages get the bump without a scope."""
+    message = commits.CommitMessage("#patch #minor(API) #major(@acme/ui) #fixed fixed the api")
+    assert message.changes == {"FIXED": ["fixed the api"]}
+    assert message.scoped_bumps == {"api": const.Versions.MINOR, "@acme/ui": const.Versions.MAJOR}
+    assert message.semantic_version_bump == const.Versions.MAJOR
+    assert message.scoped({"api", "services"}).semantic_version_bump == const.Versions.MINOR
+    assert message.scoped({"web"}).semantic_version_bump == const.Versions.PATCH
+
+    message = commits.CommitMessage("#minor(api) #added new endpoint")
+    assert message.scoped({"web"}).semantic_version_bump is None
+    assert message.scoped({"api"}).changes == {"ADDED": ["new endpoint"]}
+
+
 def test_message_markdown():
     """Tests that the markdown string gets generated as expected from the changelog dict"""
     message = commits.CommitMessage("testing in pytest", "06/24/2024 12:02:11", auto_parse=False)
@@ -282,6 +807,125 @@ def test_parser_factory():
     assert changelog_cls.FILENAME_REGEX.pattern == "pyproject.toml"
 
 
+def test_builtin_parser_entries_match_parser_classes(caplog):
+    """The declared builtin parsers must stay in sync with the FILENAME_REGEX of their classes, and every parser
+    module that ships with the package must be declared."""
+    for entry in factory.BUILTIN_PARSERS:
+        parser_cls = entry.load()
+        assert parser_cls.FILENAME_REGEX.pattern == entry.pattern
+        assert parser_cls.FILENAME_REGEX.flags == entry.regex.flags
+
+    directory = os.path.dirname(sys.modules[factory.BUILTIN_PARSERS[0].module].__file__)
+    modules = {f"vega.packaging.parsers.{name[:-3]}" for name in os.listdir(directory)
+               if name.endswith(".py") and name not in ("__init__.py", "abstract_parser.py")}
+    assert modules == {entry.module for entry in factory.BUILTIN_PARSERS}
+
+    # A declaration that drifted from its class is reported when the class is loaded
+    factory.ParserEntry("PyProject", "setup.toml", "vega.packaging.parsers.pyproject", "PyProject").load()
+    assert "'setup.toml' but PyProject.FILENAME_REGEX is 'pyproject.toml'" in caplog.text
+
+
+def test_parser_registry_imports_lazily(tmp_path):
+    """Parser modules are only imported once a file that they parse is found."""
+    code = ("import sys; from vega.packaging import factory; "
+            "assert factory.get_parser_cls_by_filename('README.md') is None; "
+            "assert factory.get_parser_cls_by_filename('CHANGELOG.md').__name__ == 'Changelog'; "
+            "print(sorted(name for name in sys.modules if name.startswith('vega.packaging.parsers.')))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=str(tmp_path))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "['vega.packaging.parsers.abstract_parser', 'vega.packaging.parsers.changelog']"
+
+
+def test_parser_plugin_directories(tmp_path, monkeypatch):
+    """Plugin directories are loaded from their manifest, or imported once including nested modules."""
+    plugin_code = """import re
+from vega.packaging.parsers import abstract_parser
+
+class {name}(abstract_parser.AbstractFileParser):
+    FILENAME_REGEX = re.compile("{pattern}", re.I)
+"""
+    monkeypatch.setenv("PACKAGING_PARSERS_CACHE", "")
+    manifest_dir = tmp_path / "manifest_plugins"
+    manifest_dir.mkdir()
+    (manifest_dir / "plugin.py").write_text(plugin_code.format(name="ManifestParser", pattern="manifest.txt"))
+    (manifest_dir / "parsers.json").write_text(json.dumps([
+        {"name": "ManifestParser", "pattern": "manifest.txt", "module": "plugin.py", "class": "ManifestParser"}]))
+
+    legacy_dir = tmp_path / "legacy_plugins"
+    (legacy_dir / "nested").mkdir(parents=True)
+    imports_log = tmp_path / "imports.log"
+    (legacy_dir / "nested" / "plugin.py").write_text(
+        plugin_code.format(name="NestedParser", pattern="nested.txt") +
+        f"\nwith open({str(imports_log)!r}, 'a') as handle:\n    handle.write(__name__ + '\\n')\n")
+
+    manifest_entries = factory.get_directory_parsers(str(manifest_dir))
+    assert [entry.name for entry in manifest_entries] == ["ManifestParser"]
+    assert manifest_entries[0].regex.match("manifest.txt")
+    assert manifest_entries[0].load().__name__ == "ManifestParser"
+
+    legacy_entries = factory.get_directory_parsers(str(legacy_dir))
+    assert [entry.name for entry in legacy_entries] == ["NestedParser"]
+    assert len(imports_log.read_text().splitlines()) == 1
+
+
+def test_parser_discovery_cache(tmp_path, monkeypatch):
+    """Unchanged plugin directories are loaded from the discovery cache without being walked or imported."""
+    monkeypatch.setenv("PACKAGING_PARSERS_CACHE", str(tmp_path / "cache" / "parsers.json"))
+    plugin_dir = tmp_path / "cached_plugins"
+    plugin_dir.mkdir()
+    imports_log = tmp_path / "imports.log"
+    plugin_path = plugin_dir / "cached_plugin.py"
+    plugin_path.write_text(f"""import re
+from vega.packaging.parsers import abstract_parser
+
+with open({str(imports_log)!r}, "a") as handle:
+    handle.write(__name__ + "\\n")
+
+class CachedParser(abstract_parser.AbstractFileParser):
+    FILENAME_REGEX = re.compile("cached.txt", re.I)
+""")
+
+    assert [entry.name for entry in factory.get_directory_parsers(str(plugin_dir))] == ["CachedParser"]
+    assert len(imports_log.read_text().splitlines()) == 1
+
+    with mock.patch("os.walk", side_effect=AssertionError("plugin directory was walked again")):
+        entries = factory.get_directory_parsers(str(plugin_dir))
+    assert [(entry.name, entry.pattern, entry.module) for entry in entries] == [
+        ("CachedParser", "cached.txt", str(plugin_path))]
+    assert len(imports_log.read_text().splitlines()) == 1
+
+    # Modified plugins are discovered again
+    plugin_path.write_text(plugin_path.read_text().replace("cached.txt", "cached.cfg"))
+    assert [entry.pattern for entry in factory.get_directory_parsers(str(plugin_dir))] == ["cached.cfg"]
+    assert len(imports_log.read_text().splitlines()) == 2
+
+
+def test_dispatch_index_matches_whole_filenames():
+    """Filenames must fully match a parser pattern, regardless of casing for case insensitive parsers."""
+    assert factory.get_parser_cls_by_filename("PACKAGE.JSON").__name__ == "ReactPackage"
+    assert factory.get_parser_cls_by_filename("set_env_86bd2d54-09b3").__name__ == "GitEnv"
+    assert factory.get_parser_cls_by_filename("package.json.bak") is None
+    assert factory.get_parser_cls_by_filename("pyproject.toml~") is None
+    assert factory.get_parser_cls_by_filename("README.md") is None
+
+
+def test_dispatch_index_precedence():
+    """When several parsers match a filename the one declared first wins, whether it is exact or a pattern."""
+    entries = [factory.ParserEntry("Logs", ".*[.]log", "logs", "Logs"),
+               factory.ParserEntry("BuildLog", "build.log", "build_log", "BuildLog"),
+               factory.ParserEntry("Env", "(?i)env_[0-9]+", "env", "Env"),
+               factory.ParserEntry("Numbered", "env_[0-9]+", "numbered", "Numbered")]
+    index = factory.DispatchIndex(entries)
+    assert index.get("build.log").name == "Logs"
+    assert index.get("ENV_1").name == "Env"
+    assert index.get("env_1").name == "Env"
+    assert index.get("env_a") is None
+
+    index = factory.DispatchIndex(list(reversed(entries)))
+    assert index.get("build.log").name == "BuildLog"
+    assert index.get("env_1").name == "Numbered"
+
+
 # ============================================================================
 # Tests for parsers
 # ============================================================================
@@ -375,6 +1019,81 @@ def test_github_env_parser(githubenv_path):
         assert re.search("RELEASE=False", content) is not None
 
 
+def test_github_env_parser_appends_changed_keys(tmp_path, monkeypatch):
+    """The GitHub env file is only appended to with the values that changed, multiline values are supported, and
+    every value is an output of the step."""
+    path = tmp_path / "set_env_0f1e2d3c"
+    path.write_text("NOTES<<EOF\nline one\nline two\nEOF\nSEMANTIC_VERSION=1.0.0\nBUILD=\nPUBLISH=False\nRELEASE=False")
+    monkeypatch.setenv("GITHUB_OUTPUT", str(tmp_path / "output"))
+
+    githubenv_parser = factory.get_parser_from_path(str(path))
+    assert githubenv_parser.content["NOTES"] == "line one\nline two"
+
+    githubenv_parser.update(commits.CommitMessage("#patch #publish #fixed a bug"), None)
+    assert path.read_text().endswith("RELEASE=False\nSEMANTIC_VERSION=1.0.1\nPUBLISH=True\n")
+    assert envfiles.read(str(tmp_path / "output")) == {"SEMANTIC_VERSION": "1.0.1", "BUILD": "", "PUBLISH": "True",
+                                                       "RELEASE": "False"}
+    assert envfiles.read(str(path))["SEMANTIC_VERSION"] == "1.0.1"
+
+
+def test_env_files_batch_flushes_once(tmp_path):
+    """Writes to the workflow command files are held until the batch exits."""
+    env_path, output_path = tmp_path / "env", tmp_path / "output"
+    with envfiles.batch():
+        envfiles.write(str(env_path), {"SEMANTIC_VERSION": "1.0.0"})
+        envfiles.write(str(env_path), {"SEMANTIC_VERSION": "1.1.0", "NOTES": "- added\n- fixed"})
+        envfiles.write(str(output_path), {"SEMANTIC_VERSION": "1.1.0"})
+        assert not env_path.exists() and not output_path.exists()
+
+    assert envfiles.read(str(env_path)) == {"SEMANTIC_VERSION": "1.1.0", "NOTES": "- added\n- fixed"}
+    assert output_path.read_text() == "SEMANTIC_VERSION=1.1.0\n"
+
+
+def test_transaction_replaces_files_at_once_and_rolls_back(tmp_path):
+    """Files are only replaced when the transaction exits, and a failure restores the files that were replaced."""
+    paths = [tmp_path / name for name in ("pyproject.toml", "CHANGELOG.md", "env")]
+    for path in paths:
+        path.write_text("old\n")
+
+    with transactions.transaction():
+        transactions.write(str(paths[0]), "new\n")
+        with envfiles.batch():
+            envfiles.write(str(paths[2]), {"SEMANTIC_VERSION": "1.1.0"})
+        assert [path.read_text() for path in paths] == ["old\n"] * 3
+    assert [path.read_text() for path in paths] == ["new\n", "old\n", "old\nSEMANTIC_VERSION=1.1.0\n"]
+
+    with pytest.raises(ValueError):
+        with transactions.transaction():
+            transactions.write(str(paths[1]), "discarded\n")
+            raise ValueError("failed before writing")
+    assert paths[1].read_text() == "old\n"
+
+    replace = os.replace
+    def fail_on_changelog(source, destination):
+        if destination.endswith("CHANGELOG.md"):
+            raise OSError("disk full")
+        replace(source, destination)
+
+    with mock.patch("os.replace", side_effect=fail_on_changelog), pytest.raises(OSError):
+        with transactions.transaction():
+            transactions.write(str(paths[0]), "newer\n")
+            transactions.write(str(paths[1]), "newer\n")
+            transactions.append(str(paths[2]), "PUBLISH=True\n")
+    assert [path.read_text() for path in paths] == ["new\n", "old\n", "old\nSEMANTIC_VERSION=1.1.0\n"]
+    assert sorted(os.listdir(tmp_path)) == ["CHANGELOG.md", "env", "pyproject.toml"]
+
+    # Files created in a transaction are only on disk once it exits
+    os.makedirs(tmp_path / "api")
+    changelog = factory.get_parser_from_path(str(tmp_path / "api" / "CHANGELOG.md"))
+    with pytest.raises(ValueError):
+        with transactions.transaction():
+            changelog.update(commits.CommitMessage("#minor #added discarded"), "1.0.0")
+            changelog.update(commits.CommitMessage("#patch #fixed discarded"), "1.1.0")
+            assert "## [1.1.1]" in "".join(changelog.content) and "## [1.1.0]" in "".join(changelog.content)
+            raise ValueError("failed before writing")
+    assert os.listdir(tmp_path / "api") == []
+
+
 def test_react_package_parser(react_package_path):
     """Tests that the react package parser works as expected"""
     message = commits.CommitMessage("#major #added added hello_world.py"
@@ -387,7 +1106,6 @@ def test_react_package_parser(react_package_path):
     assert react_package_parser.exists
     react_package_parser.update(message, None)
 
-
     with open(react_package_parser.path, "r+", encoding="utf-8") as handle:
         content = json.load(handle)
         assert content["version"] == "1.0.0"
@@ -509,6 +1227,15 @@ def test_update_semantic_version_main_applies_docker_registry(temp_docker_projec
         dockerfile_path=dockerfile_path,
         docker_registry="ghcr.io/testuser",
         cargo_path=None,
+        max_depth=0,
+        recursive=False,
+        walk_threads=None,
+        discovery="filesystem",
+        affected=None,
+        propagate=False,
+        independent=False,
+        parse_workers=None,
+        large_file_size=None,
         github_env=False,
         verbose=False,
         log_to_disk=False,
@@ -522,7 +1249,7 @@ def test_update_semantic_version_main_applies_docker_registry(temp_docker_projec
         return ["2.3.4"]
 
     monkeypatch.setattr(update_semantic_version, "parse_args", lambda: args)
-    monkeypatch.setattr(update_semantic_version, "get_parsers_dict", lambda paths: parsers)
+    monkeypatch.setattr(update_semantic_version, "get_parsers_dict", lambda paths, **kwargs: parsers)
     monkeypatch.setattr(update_semantic_version.log, "setup", lambda *args, **kwargs: None)
 
     with mock.patch.object(docker_cls, "_DockerFile__get_image_tags", fake_get_image_tags), \
@@ -552,6 +1279,15 @@ def test_update_semantic_version_main_sets_github_env_builds(temp_python_project
         dockerfile_path=dockerfile_path,
         docker_registry="ghcr.io/testuser",
         cargo_path=None,
+        max_depth=0,
+        recursive=False,
+        walk_threads=None,
+        discovery="filesystem",
+        affected=None,
+        propagate=False,
+        independent=False,
+        parse_workers=None,
+        large_file_size=None,
         github_env=True,
         verbose=False,
         log_to_disk=False,
@@ -574,6 +1310,82 @@ def test_update_semantic_version_main_sets_github_env_builds(temp_python_project
     assert "RELEASE=True" in content
 
 
+def test_get_parsers_dict_parses_files_ahead_of_time(tmp_path):
+    """Files are parsed before they're updated, large files in other processes, and keep their priority order."""
+    files = {"CHANGELOG.md": "# Changelog\n\n## [1.0.0] - 2024/01/01\n",
+             "package.json": json.dumps({"name": "web", "version": "1.0.0"}),
+             "pyproject.toml": toml.dumps({"project": {"name": "api", "version": "1.0.0"}}) + "# padding\n" * 1000,
+             "Cargo.toml": toml.dumps({"package": {"name": "crate", "version": "1.0.0"}})}
+    for filename, content in files.items():
+        (tmp_path / filename).write_text(content)
+    paths = [str(tmp_path / filename) for filename in [*files, "missing.toml"]]
+
+    with mock.patch.object(update_semantic_version, "prefetch", wraps=update_semantic_version.prefetch) as prefetch:
+        parsers = update_semantic_version.get_parsers_dict(paths, max_workers=4, large_file_size=8192)
+    assert sorted(os.path.basename(call.args[0].path) for call in prefetch.call_args_list) == \
+        ["CHANGELOG.md", "Cargo.toml", "package.json"]
+    assert [os.path.basename(p.path) for p in parsers["ordered"]] == \
+        ["package.json", "pyproject.toml", "Cargo.toml", "CHANGELOG.md"]
+
+    with mock.patch("toml.load", side_effect=AssertionError("parsed again")), \
+         mock.patch("json.load", side_effect=AssertionError("parsed again")):
+        assert [str(file_parser.version) for file_parser in parsers["ordered"]] == ["1.0.0"] * 4
+
+
+def test_update_semantic_version_independent(tmp_path):
+    """Every manifest and the changelog next to it are bumped on their own and every file is written once."""
+    changelog = factory.get_parser_from_path(str(tmp_path / "CHANGELOG.md")).TEMPLATE
+    manifests = {"api/pyproject.toml": toml.dumps({"project": {"name": "api", "version": "1.0.0"}}),
+                 "web/package.json": json.dumps({"name": "web", "version": "2.0.0"})}
+    for relative, content in manifests.items():
+        os.makedirs(tmp_path / os.path.dirname(relative))
+        (tmp_path / relative).write_text(content)
+        (tmp_path / os.path.dirname(relative) / "CHANGELOG.md").write_text(changelog)
+
+    args = update_semantic_version.parse_args(["--directory", str(tmp_path), "--recursive", "--independent",
+                                               "--subject", "#patch #minor(api) #fixed fixed the api",
+                                               "--description", "#added more docs"])
+    with mock.patch("os.replace", wraps=os.replace) as replaced, mock.patch("os.sync") as sync, \
+            mock.patch("os.fdatasync", wraps=os.fdatasync) as fdatasync:
+        assert update_semantic_version.run(args)
+    written = [call.args[1] for call in replaced.call_args_list]
+    # Only the written files are flushed, not every file system of the host
+    assert not sync.called and fdatasync.call_count == len(written)
+    assert sorted(written) == sorted(str(tmp_path / relative) for relative in
+                                     [*manifests, "api/CHANGELOG.md", "web/CHANGELOG.md"])
+
+    assert toml.load(tmp_path / "api" / "pyproject.toml")["project"]["version"] == "1.1.0"
+    assert json.loads((tmp_path / "web" / "package.json").read_text())["version"] == "2.0.1"
+    api_changelog = (tmp_path / "api" / "CHANGELOG.md").read_text()
+    assert "## [1.1.0]" in api_changelog and "- fixed the api" in api_changelog and "- more docs" in api_changelog
+    assert "## [2.0.1]" in (tmp_path / "web" / "CHANGELOG.md").read_text()
+
+
+def test_update_semantic_version_independent_propagates_to_changelogs(tmp_path):
+    """A unit bumped only because it depends on an updated package gets its changelog bumped to the same version."""
+    changelog = factory.get_parser_from_path(str(tmp_path / "CHANGELOG.md")).TEMPLATE
+    files = {
+        "models": {"project": {"name": "models", "version": "1.0.0"}},
+        "api": {"project": {"name": "api", "version": "3.0.0", "dependencies": ["models>=1.0.0"]},
+                "tool": {"uv": {"sources": {"models": {"path": "../models"}}}}},
+        "other": {"project": {"name": "other", "version": "4.0.0"}},
+    }
+    for name, content in files.items():
+        os.makedirs(tmp_path / name)
+        (tmp_path / name / "pyproject.toml").write_text(toml.dumps(content))
+        (tmp_path / name / "CHANGELOG.md").write_text(changelog)
+
+    args = update_semantic_version.parse_args(["--directory", str(tmp_path), "--recursive", "--independent",
+                                               "--propagate", "--subject", "#minor(models) #added new model"])
+    assert update_semantic_version.run(args)
+
+    assert toml.load(tmp_path / "api" / "pyproject.toml")["project"]["version"] == "3.0.1"
+    api_changelog = (tmp_path / "api" / "CHANGELOG.md").read_text()
+    assert "## [3.0.1]" in api_changelog and "Updated models 1.1.0" in api_changelog
+    assert "## [1.1.0]" in (tmp_path / "models" / "CHANGELOG.md").read_text()
+    assert (tmp_path / "other" / "CHANGELOG.md").read_text() == changelog
+
+
 # ============================================================================
 # Tests for Cargo parser
 # ============================================================================
@@ -592,6 +1404,41 @@ def temp_cargo_project():
         shutil.rmtree(path)
 
 
+def test_batch_update_semantic_version(temp_python_project, temp_react_project, tmp_path):
+    """Jobs run in a process pool and stream one json result per job."""
+    jobs = [{"id": "python", "directory": temp_python_project, "subject": "#minor #added batch jobs"},
+            {"directory": temp_react_project, "message": "#major #removed legacy api",
+             "options": {"github_env": False, "max_depth": 0}},
+            {"id": "invalid", "directory": temp_react_project, "subject": "#patch", "options": {"max_depth": "x"}}]
+    lines = "\n".join(json.dumps(job) for job in jobs).splitlines()
+
+    with open(tmp_path / "results.ndjson", "w") as output:
+        results = batch_update_semantic_version.run_jobs(batch_update_semantic_version.read_jobs(lines), output,
+                                                         max_workers=2)
+    with open(tmp_path / "results.ndjson", "r") as handle:
+        streamed = {result["id"]: result for result in map(json.loads, handle)}
+    assert streamed == {result["id"]: result for result in results}
+    assert streamed["python"]["status"] == "success" and streamed["python"]["updated"]
+    assert streamed[1]["status"] == "success" and streamed[1]["duration"] >= 0
+    assert streamed["invalid"]["status"] == "failed"
+
+    with open(os.path.join(temp_python_project, "pyproject.toml"), "r") as handle:
+        assert toml.load(handle)["project"]["version"] == "0.1.0"
+    with open(os.path.join(temp_react_project, "package.json"), "r") as handle:
+        assert json.load(handle)["version"] == "1.0.0"
+
+    # A malformed line fails on its own, the jobs around it still run
+    lines = [json.dumps({"id": "python", "directory": temp_python_project, "subject": "#patch #fixed a bug"}),
+             '{"directory": ',
+             json.dumps({"id": "react", "directory": temp_react_project, "subject": "#patch #fixed a bug"})]
+    with open(tmp_path / "malformed.ndjson", "w") as output:
+        results = batch_update_semantic_version.run_jobs(batch_update_semantic_version.read_jobs(lines), output,
+                                                         max_workers=2)
+    assert {result["id"]: result["status"] for result in results} == {"python": "success", 1: "failed",
+                                                                      "react": "success"}
+    assert "JSONDecodeError" in next(result for result in results if result["id"] == 1)["error"]
+
+
 def test_cargo_parser_update(temp_cargo_project):
     """Test that Cargo.update() bumps the version under [package]."""
     from unittest import mock
@@ -606,7 +1453,7 @@ def test_cargo_parser_update(temp_cargo_project):
     assert content["package"]["version"] == "0.1.0"
 
 
-def test_cargo_build_success(temp_cargo_project):
+def test_cargo_build_success(temp_cargo_project, fake_popen):
     """Test Cargo.build() calls cargo package and sets _build to .crate path."""
     from unittest import mock
     cargo_path = os.path.join(temp_cargo_project, "Cargo.toml")
@@ -618,36 +1465,28 @@ def test_cargo_build_success(temp_cargo_project):
     with open(crate_path, "w") as f:
         f.write("fake crate")
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.build()
-        call_args = mock_run.call_args
+        call_args = mock_popen.call_args
         assert call_args[0][0] == ["cargo", "package"]
 
     assert parser._build.endswith(".crate")
 
 
-def test_cargo_publish_success(temp_cargo_project):
+def test_cargo_publish_success(temp_cargo_project, fake_popen):
     """Test Cargo.publish() calls cargo publish without --registry when none set."""
     from unittest import mock
     cargo_path = os.path.join(temp_cargo_project, "Cargo.toml")
     parser = factory.get_parser_from_path(cargo_path)
     parser._build = "/fake/path/test_crate-0.0.0.crate"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.publish()
-        call_args = mock_run.call_args
+        call_args = mock_popen.call_args
         assert call_args[0][0] == ["cargo", "publish"]
 
 
-def test_cargo_publish_with_registry(temp_cargo_project):
+def test_cargo_publish_with_registry(temp_cargo_project, fake_popen):
     """Test Cargo.publish() includes --registry when a registry is set."""
     from unittest import mock
     cargo_path = os.path.join(temp_cargo_project, "Cargo.toml")
@@ -655,13 +1494,9 @@ def test_cargo_publish_with_registry(temp_cargo_project):
     parser._build = "/fake/path/test_crate-0.0.0.crate"
     parser._registry = "my-registry"
 
-    mock_result = mock.MagicMock()
-    mock_result.returncode = 0
-    mock_result.stderr = ""
-
-    with mock.patch("subprocess.run", return_value=mock_result) as mock_run:
+    with mock.patch("subprocess.Popen", side_effect=fake_popen()) as mock_popen:
         parser.publish()
-        call_args = mock_run.call_args
+        call_args = mock_popen.call_args
         assert call_args[0][0] == ["cargo", "publish", "--registry", "my-registry"]
 
 